@@ -0,0 +1,163 @@
+"""
+Admission control for server.py.
+
+Every request is put in one of three route classes:
+  cheap     static files and /api/* except /api/weather; answered from local state
+  upstream  /feed-proxy, /snapshot-frame, /snapshot-proxy, /thumbnail, /ipinfo, /api/weather; one
+            camera or third-party fetch each
+  stream    /stream-proxy, /replay; long-lived relays
+
+Each client IP gets a token bucket per class (ClientLimiter), so one client cannot flood a
+route class. Upstream and stream requests also pass a Gate that caps how many run at once
+server-wide. When a gate is full, requests queue for a slot for a few seconds and are then
+rejected with 503. Cheap routes never pass a gate, so they are served at once even while
+every upstream slot is busy. EgressShaper is a global bytes/second budget for relayed
+frames: streams drop frames (or slow down) instead of failing when it runs out.
+"""
+import threading
+import time
+
+STREAM_ROUTES = ("/stream-proxy", "/replay")
+UPSTREAM_ROUTES = ("/feed-proxy", "/snapshot-frame", "/snapshot-proxy", "/thumbnail", "/ipinfo", "/api/weather")
+# Idle per-client buckets are dropped after this many seconds (a refilled bucket holds no state).
+CLIENT_IDLE = 300.0
+
+
+def route_class(path):
+    """'stream', 'upstream' or 'cheap' for a normalized request path."""
+    if path in STREAM_ROUTES:
+        return "stream"
+    if path in UPSTREAM_ROUTES:
+        return "upstream"
+    return "cheap"
+
+
+def parse_rates(spec):
+    """{"cheap": (rate, burst), ...} from "cheap=50/200,upstream=5/40"; rate is per second, 0 means unlimited."""
+    rates = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        rate, _, burst = value.partition("/")
+        rates[name.strip()] = (float(rate), float(burst or rate))
+    return rates
+
+
+class TokenBucket:
+    """rate tokens per second up to burst. Not locked; callers hold their own lock."""
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def take(self, n=1.0, now=None):
+        """0.0 if n tokens were taken, else the seconds until they would be available (nothing taken)."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= n:
+            self.tokens -= n
+            return 0.0
+        return (n - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class ClientLimiter:
+    """Token bucket per (client IP, route class)."""
+
+    def __init__(self, rates):
+        self.rates = rates
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.swept = time.monotonic()
+        self.rejected = 0
+
+    def check(self, client, cls):
+        """0.0 if the request may proceed, else seconds to wait (for Retry-After)."""
+        rate, burst = self.rates.get(cls, (0.0, 0.0))
+        if rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get((client, cls))
+            if bucket is None:
+                bucket = self.buckets[(client, cls)] = TokenBucket(rate, burst, now)
+            wait = bucket.take(1.0, now)
+            if wait:
+                self.rejected += 1
+            if now - self.swept > CLIENT_IDLE:
+                self.swept = now
+                for key in [k for k, b in self.buckets.items() if now - b.updated > CLIENT_IDLE]:
+                    del self.buckets[key]
+        return wait
+
+
+class Gate:
+    """At most `limit` holders; enter() waits up to `timeout` for a slot. limit 0 means unlimited."""
+
+    def __init__(self, limit, timeout):
+        self.limit = limit
+        self.timeout = timeout
+        self.cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def enter(self):
+        """True once a slot is held (call leave() after), False if none freed up within timeout."""
+        with self.cond:
+            if self.limit <= 0:
+                self.active += 1
+                return True
+            self.waiting += 1
+            try:
+                ok = self.cond.wait_for(lambda: self.active < self.limit, timeout=self.timeout)
+            finally:
+                self.waiting -= 1
+            if not ok:
+                self.rejected += 1
+                return False
+            self.active += 1
+            return True
+
+    def leave(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify()
+
+    def stats(self):
+        with self.cond:
+            return {"active": self.active, "waiting": self.waiting, "limit": self.limit, "rejected": self.rejected}
+
+
+class EgressShaper:
+    """Global bytes/second budget for relayed frames, with up to one second of burst. rate 0 disables it."""
+
+    def __init__(self, bytes_per_sec):
+        self.lock = threading.Lock()
+        self.bucket = TokenBucket(bytes_per_sec, bytes_per_sec) if bytes_per_sec > 0 else None
+        self.dropped = 0
+
+    def try_send(self, n):
+        """True if n bytes fit the budget now (and are charged); False means drop this frame."""
+        if self.bucket is None:
+            return True
+        with self.lock:
+            # A frame bigger than the whole burst is let through once the bucket is full.
+            ok = not self.bucket.take(min(n, self.bucket.burst))
+            if not ok:
+                self.dropped += 1
+            return ok
+
+    def send(self, n):
+        """Charge n bytes, sleeping until the budget allows them (for byte streams that cannot drop frames)."""
+        if self.bucket is None:
+            return
+        while True:
+            with self.lock:
+                wait = self.bucket.take(min(n, self.bucket.burst))
+            if not wait:
+                return
+            time.sleep(min(wait, 1.0))
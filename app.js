@@ -11,6 +11,9 @@
   let feedCams = []; // only cams with thumbnails (signal); no-signal feeds excluded
   let countryFilter = null; // null = All, or country name string
   let thumbnailIds = new Set();
+  // Reliability weights from /api/cam-order (cam id -> weight); cams it does not list get camWeightDefault.
+  let camWeights = {};
+  let camWeightDefault = 0.3;
   let currentIndex = 0;
   let currentHudCamId = "";
   let feedRefreshTimer = null;
@@ -21,6 +24,18 @@
   let feedAmbientGain = null;
   let feedAmbientUserMuted = false;
   let feedMatrixOpen = false;
+  const HEALTH_HINT_AHEAD = 8;
+  const HEALTH_HINT_REPEAT_MS = 10 * 60 * 1000;
+  let healthHintedAt = {}; // cam id -> last time we asked the server to health-check it
+  let camWeather = {}; // cam id -> { at, text } from /api/weather (shared server-side cache)
+  const WEATHER_FRESH_MS = 10 * 60 * 1000;
+  // One EventSource (/api/live) for the current cam and the next few; the server pushes their stats as they change.
+  const LIVE_WATCH_AHEAD = 8;
+  let liveSource = null;
+  let liveCamIds = [];
+  let liveStats = {}; // cam id -> { visits, up, down, viewers, status, last_seen }
+  // Last cams.json we loaded and its catalog version; returning visitors fetch only /api/cams/changes.
+  const CATALOG_CACHE_KEY = "uplink_catalog";
 
   // Approximate lat/long for map (city/country or country fallback)
   const LOC_TO_COORDS = {
@@ -461,7 +476,6 @@
     const localTimeEl = document.getElementById("local-time");
     const netIspEl = document.getElementById("net-isp");
     const netAsnEl = document.getElementById("net-asn");
-    const nodeUptimeEl = document.getElementById("node-uptime");
     const ip = extractIP(cam.url);
 
     if (ipLink) {
@@ -474,7 +488,7 @@
       mapLink.href = "https://www.google.com/maps/search/?api=1&query=" +
         encodeURIComponent(cam.locationShort || "");
     }
-    updateWeather(cam.locationShort);
+    updateWeather(cam.locationShort, null, cam.id);
     if (localTimeEl)
       localTimeEl.textContent = "LOCAL_TIME: " + formatLocalTimeForCam(cam);
 
@@ -501,9 +515,15 @@
     }
     var thumbsUpEl = document.getElementById("thumbs-up-count");
     var thumbsDownEl = document.getElementById("thumbs-down-count");
+    var liveViewersEl = document.getElementById("live-viewers-count");
     if (thumbsUpEl) thumbsUpEl.textContent = "…";
     if (thumbsDownEl) thumbsDownEl.textContent = "…";
-    if (camId) {
+    if (liveViewersEl) liveViewersEl.textContent = "—";
+    if (camId && liveActive()) {
+      // Thumbs and live viewers arrive over /api/live (already, or with the subscription's first batch).
+      updateThumbsButtonState(camId);
+      if (liveStats[camId]) renderLiveStats(camId, false);
+    } else if (camId) {
       // Restore voted state from localStorage immediately so "already liked" shows when returning to a feed
       updateThumbsButtonState(camId);
       fetch("/api/cam-thumbs?cam_id=" + encodeURIComponent(camId))
@@ -538,7 +558,7 @@
           mapLink.textContent = "LOC: " + (cam.locationShort || "—");
           mapLink.href = "https://www.google.com/maps/search/?api=1&query=" + encodeURIComponent(cam.locationShort || "");
         }
-        updateWeather(cam.locationShort);
+        updateWeather(cam.locationShort, null, cam.id);
         return;
       }
       const org = data.org || data.organisation || "";
@@ -568,12 +588,18 @@
         }
       }
       if (latLon) {
-        updateWeather(ipinfoLoc || cam.locationShort, latLon);
+        updateWeather(ipinfoLoc || cam.locationShort, latLon, cam.id);
       } else if (ipinfoLoc) {
-        updateWeather(ipinfoLoc);
+        updateWeather(ipinfoLoc, null, cam.id);
       }
     });
 
+    renderNodeUptime(cam);
+    updateReportLink(ip, cam.id);
+  }
+
+  function renderNodeUptime(cam) {
+    const nodeUptimeEl = document.getElementById("node-uptime");
     const uptimeMs = getUptimeMs(cam);
     const lastSeenMs = getLastSeenMs(cam);
     const lastSeenRaw = cam.last_seen ? String(cam.last_seen).trim() : null;
@@ -587,8 +613,52 @@
         nodeUptimeEl.textContent = "NODE_UPTIME: —";
       }
     }
+  }
 
-    updateReportLink(ip, cam.id);
+  function liveActive() {
+    return !!(liveSource && liveSource.readyState !== 2);
+  }
+
+  // Show pushed stats for the cam in the HUD; withVisits is false right after a visit (its own response is newer).
+  function renderLiveStats(camId, withVisits) {
+    var s = liveStats[camId];
+    if (!s || currentHudCamId !== camId) return;
+    var visitsEl = document.getElementById("viewers-count");
+    var upEl = document.getElementById("thumbs-up-count");
+    var downEl = document.getElementById("thumbs-down-count");
+    var liveViewersEl = document.getElementById("live-viewers-count");
+    if (withVisits && visitsEl) visitsEl.textContent = s.visits;
+    if (upEl) upEl.textContent = s.up;
+    if (downEl) downEl.textContent = s.down;
+    if (liveViewersEl) liveViewersEl.textContent = s.viewers;
+    var cam = cams.find(function (c) { return String(c.id) === camId; });
+    if (cam && s.status && (cam.status !== s.status || (s.last_seen && cam.last_seen !== s.last_seen))) {
+      cam.status = s.status;
+      if (s.last_seen) cam.last_seen = s.last_seen;
+      renderNodeUptime(cam);
+    }
+  }
+
+  // Subscribe to the current cam and the next LIVE_WATCH_AHEAD; reconnect only once the carousel leaves that window.
+  function watchLiveStats(visible, fromIndex) {
+    if (typeof EventSource === "undefined" || !visible.length) return;
+    var current = String(visible[fromIndex].id);
+    if (liveActive() && liveCamIds.indexOf(current) >= 0) return;
+    var ids = [];
+    for (var k = 0; k <= LIVE_WATCH_AHEAD && k < visible.length; k++) {
+      ids.push(String(visible[(fromIndex + k) % visible.length].id));
+    }
+    if (liveSource) liveSource.close();
+    liveCamIds = ids;
+    liveSource = new EventSource("/api/live?cam_ids=" + ids.map(encodeURIComponent).join(","));
+    liveSource.addEventListener("stats", function (e) {
+      var data;
+      try { data = JSON.parse(e.data); } catch (err) { return; }
+      Object.keys(data.cams || {}).forEach(function (id) {
+        liveStats[id] = data.cams[id];
+        renderLiveStats(id, true);
+      });
+    });
   }
 
   function updateReportLink(ip, id) {
@@ -618,10 +688,61 @@
     return map[code] || "CODE_" + code;
   }
 
+  function formatWeather(c) {
+    const temp = c.temperature_2m != null ? Math.round(c.temperature_2m) : (c.temperature != null ? Math.round(c.temperature) : "—");
+    const cond = weatherCodeToLabel(c.weather_code);
+    const windVal = c.wind_speed_10m != null ? c.wind_speed_10m : (c.windspeed != null ? c.windspeed : null);
+    const wind = windVal != null ? Math.round(windVal) + "" : "—";
+    const hum = c.relative_humidity_2m != null ? c.relative_humidity_2m : "—";
+    return "TEMP: " + temp + "°F | COND: " + cond + " | WIND: " + wind + " mph | HUM: " + hum + "%";
+  }
+
+  /** Weather for cam ids from the server's shared cache (/api/weather); fills camWeather. */
+  function fetchCamWeather(ids) {
+    return fetch("/api/weather?cam_ids=" + ids.join(","))
+      .then(function (r) {
+        if (!r.ok) throw new Error(r.status);
+        return r.json();
+      })
+      .then(function (data) {
+        var now = Date.now();
+        ids.forEach(function (id) {
+          var c = data.weather && data.weather[id];
+          if (c) camWeather[id] = { at: now, text: formatWeather(c) };
+        });
+      });
+  }
+
+  /** One batch request for the weather of the next cams in the carousel. */
+  function prefetchWeather(visible, fromIndex) {
+    var now = Date.now();
+    var ids = [];
+    for (var k = 1; k <= HEALTH_HINT_AHEAD && k < visible.length; k++) {
+      var id = String(visible[(fromIndex + k) % visible.length].id);
+      if (!camWeather[id] || now - camWeather[id].at > WEATHER_FRESH_MS) ids.push(id);
+    }
+    if (ids.length >= Math.min(HEALTH_HINT_AHEAD / 2, visible.length - 1) && ids.length) {
+      fetchCamWeather(ids).catch(function () {});
+    }
+  }
+
   var weatherCache = {};
-  async function updateWeather(locationName, directCoords) {
+  async function updateWeather(locationName, directCoords, camId) {
     const el = document.getElementById("weather-display");
     if (!el) return;
+    if (camId != null) {
+      camId = String(camId);
+      if (!camWeather[camId] || Date.now() - camWeather[camId].at > WEATHER_FRESH_MS) {
+        try {
+          await fetchCamWeather([camId]);
+        } catch (e) {}
+      }
+      if (camWeather[camId]) {
+        el.textContent = camWeather[camId].text;
+        return;
+      }
+    }
+    // No server (static hosting) or no coordinates for this cam: ask Open-Meteo directly.
     let lat, lon;
     var cacheKey = "";
     if (directCoords && typeof directCoords.lat === "number" && typeof directCoords.lon === "number") {
@@ -671,12 +792,7 @@
       const data = await res.json();
       const c = data.current || data.current_weather;
       if (!c) throw new Error("No current data");
-      const temp = c.temperature_2m != null ? Math.round(c.temperature_2m) : (c.temperature != null ? Math.round(c.temperature) : "—");
-      const cond = weatherCodeToLabel(c.weather_code);
-      const windVal = c.wind_speed_10m != null ? c.wind_speed_10m : (c.windspeed != null ? c.windspeed : null);
-      const wind = windVal != null ? Math.round(windVal) + "" : "—";
-      const hum = c.relative_humidity_2m != null ? c.relative_humidity_2m : "—";
-      const text = "TEMP: " + temp + "°F | COND: " + cond + " | WIND: " + wind + " mph | HUM: " + hum + "%";
+      const text = formatWeather(c);
       el.textContent = text;
       weatherCache[cacheKey] = text;
     } catch (e) {
@@ -699,7 +815,80 @@
     return arr;
   }
 
+  function saveCatalog(version, data) {
+    if (!version) return;
+    try {
+      localStorage.setItem(CATALOG_CACHE_KEY, JSON.stringify({ version: version, cams: data }));
+    } catch (e) {}
+  }
+
+  function fetchFullCatalog() {
+    return fetch("cams.json").then((r) => {
+      const version = Number(r.headers.get("X-Catalog-Version")) || 0;
+      return r.json().then((data) => {
+        saveCatalog(version, data);
+        return data;
+      });
+    });
+  }
+
+  /** cams.json contents: the cached copy plus the changes since its version, or a full download. */
+  function loadCatalog() {
+    let cached = null;
+    try {
+      cached = JSON.parse(localStorage.getItem(CATALOG_CACHE_KEY) || "null");
+    } catch (e) {}
+    if (!cached || !cached.version || !Array.isArray(cached.cams)) return fetchFullCatalog();
+    const byId = new Map(cached.cams.map((c) => [String(c.id), c]));
+    function step(version) {
+      return fetch("/api/cams/changes?since=" + version)
+        .then((r) => {
+          if (!r.ok) throw new Error("changes " + r.status);
+          return r.json();
+        })
+        .then((delta) => {
+          if (delta.resync) return fetchFullCatalog();
+          (delta.changes || []).forEach((ch) => {
+            if (ch.op === "remove") byId.delete(String(ch.id));
+            else if (ch.cam) byId.set(String(ch.id), ch.cam);
+          });
+          if (delta.more) return step(delta.version);
+          const data = Array.from(byId.values());
+          if (delta.version !== cached.version) saveCatalog(delta.version, data);
+          return data;
+        });
+    }
+    return step(cached.version).catch(() => fetchFullCatalog());
+  }
+
+  /**
+   * Put cams in the server's reliability-weighted order (/api/cam-order) so the carousel mostly
+   * starts on cams that load quickly. Cams the server does not list go in at random positions;
+   * without the endpoint the order is a plain shuffle.
+   */
+  function applyCamOrder(order) {
+    shuffleArray(cams);
+    if (!order || !Array.isArray(order.order)) return;
+    camWeights = order.weights || {};
+    if (typeof order.default === "number") camWeightDefault = order.default;
+    const rank = new Map(order.order.map((id, i) => [String(id), i]));
+    const ordered = cams.filter((c) => rank.has(String(c.id)));
+    ordered.sort((a, b) => rank.get(String(a.id)) - rank.get(String(b.id)));
+    cams.forEach((c) => {
+      if (!rank.has(String(c.id))) ordered.splice(Math.floor(Math.random() * (ordered.length + 1)), 0, c);
+    });
+    cams = ordered;
+  }
+
+  function camWeight(cam) {
+    const w = camWeights[String(cam.id)];
+    return typeof w === "number" ? w : camWeightDefault;
+  }
+
   function loadCams() {
+    const loadOrder = fetch("/api/cam-order")
+      .then((r) => (r.ok ? r.json() : null))
+      .catch(() => null);
     const loadList = fetch("/api/thumbnail-ids")
       .then((r) => (r.ok ? r.json() : []))
       .then((ids) => {
@@ -708,15 +897,14 @@
       })
       .catch(() => (thumbnailIds = new Set()));
     return Promise.all([
-      fetch("cams.json")
-        .then((r) => r.json())
+      loadCatalog()
         .then((data) => {
-          cams = (data || []).map((c) => ({
+          // dedupe_cams.py --flag marks repeat listings of one physical camera; show it once.
+          cams = (data || []).filter((c) => !c.duplicate_of).map((c) => ({
             ...c,
             url: normalizeUrl(c.embed_url || c.url || ""),
             locationShort: parseLocation(c.location),
           }));
-          shuffleArray(cams);
           return cams;
         })
         .catch((e) => {
@@ -725,7 +913,11 @@
           return cams;
         }),
       loadList,
-    ]).then(([c]) => c);
+      loadOrder,
+    ]).then(([, , order]) => {
+      applyCamOrder(order);
+      return cams;
+    });
   }
 
   function setFeedErrorHandlers(img) {
@@ -754,6 +946,19 @@
     showFeed(nextIdx);
   }
 
+  /** Tell the server which cams the carousel shows next so its health monitor checks them first (batched). */
+  function hintUpcomingCams(visible, fromIndex) {
+    var now = Date.now();
+    var ids = [];
+    for (var k = 1; k <= HEALTH_HINT_AHEAD && k < visible.length; k++) {
+      var id = String(visible[(fromIndex + k) % visible.length].id);
+      if (!healthHintedAt[id] || now - healthHintedAt[id] > HEALTH_HINT_REPEAT_MS) ids.push(id);
+    }
+    if (!ids.length || ids.length < Math.min(HEALTH_HINT_AHEAD / 2, visible.length - 1)) return;
+    ids.forEach(function (id) { healthHintedAt[id] = now; });
+    fetch("/api/health-hint?cam_ids=" + ids.join(",")).catch(function () {});
+  }
+
   function showFeed(index) {
     var visible = getVisibleFeedCams();
     if (!visible.length) return;
@@ -766,6 +971,9 @@
 
     visibleFeedEl = mainFeed;
     preloadFeedEl = nextFeed;
+    hintUpcomingCams(visible, currentIndex);
+    prefetchWeather(visible, currentIndex);
+    watchLiveStats(visible, currentIndex);
 
     if (!cam.url) {
       mainFeed.classList.add("hidden");
@@ -831,6 +1039,9 @@
     preloadFeedEl.classList.remove("hidden");
 
     var nextIdx = (currentIndex + 1) % visible.length;
+    hintUpcomingCams(visible, currentIndex);
+    prefetchWeather(visible, currentIndex);
+    watchLiveStats(visible, currentIndex);
     visibleFeedEl.src = feedDisplayUrl(visible[nextIdx].url, true);
     setFeedErrorHandlers(visibleFeedEl);
 
@@ -1022,7 +1233,10 @@
    * Matrix shows only cams with a thumbnail. Each tile shows the snapshot for that cam (thumbnails/{id}.jpg).
    * Click sets main feed to that cam's stream.
    */
-  /** Only cams that have a thumbnail file; matrix shows only these so every tile loads. */
+  /**
+   * Only cams that have a thumbnail file; matrix shows only these so every tile loads.
+   * Random pick weighted by reliability (camWeight) and snapshotScore: key = u ^ (1 / weight), largest first.
+   */
   function getRandomMatrixSlice() {
     if (!cams.length) return [];
     const pool = thumbnailIds.size > 0
@@ -1030,13 +1244,12 @@
       : [];
     if (pool.length === 0) return [];
     const size = Math.min(MATRIX_SIZE, pool.length);
-    const shuffled = pool.slice().sort((a, b) => {
-      const scoreA = snapshotScore(a.url);
-      const scoreB = snapshotScore(b.url);
-      if (scoreB !== scoreA) return scoreB - scoreA;
-      return Math.random() - 0.5;
-    });
-    return shuffled.slice(0, size);
+    const keyed = pool.map((c) => ({
+      cam: c,
+      key: Math.pow(Math.random(), 1 / (camWeight(c) * (1 + snapshotScore(c.url)))),
+    }));
+    keyed.sort((a, b) => b.key - a.key);
+    return keyed.slice(0, size).map((k) => k.cam);
   }
 
   function openMatrix() {
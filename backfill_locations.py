@@ -2,23 +2,40 @@
 Backfill camera locations in cams.json using ipinfo.io for each cam that has an IP in its URL.
 Corrects wrong or misspelled scraper locations (e.g. Filadelfiya → Philadelphia).
 
+--batch resolves the unique IPs of the whole catalog through ip-api.com's batch endpoint instead
+(100 IPs per POST). Several batches run in parallel under a rate limiter, which also honours
+ip-api's X-Rl / X-Ttl headers. The free tier allows 15 batches (1500 IPs) per minute; raise
+--rate with a paid key or a local stub (IPAPI_BATCH_URL).
+
 Usage:
   python3 backfill_locations.py              # update all cams with IPs, write cams.json
   python3 backfill_locations.py --dry-run   # only print what would change
   python3 backfill_locations.py --delay 1.2 # seconds between ipinfo requests (default 1.0)
+  python3 backfill_locations.py --batch [--rate 15] [--workers 4]
 """
+import concurrent.futures
 import json
 import os
 import re
 import sys
-import urllib.request
+import threading
 import time
+import urllib.error
+import urllib.request
+
+import http_pool
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CAMS_PATH = os.path.join(SCRIPT_DIR, "cams.json")
 IPINFO_URL = "https://ipinfo.io/{ip}/json"
 USER_AGENT = "Mozilla/5.0 (compatible; UPLINK_SITE/1.0)"
 TIMEOUT = 10
+IPAPI_BATCH_URL = os.environ.get("IPAPI_BATCH_URL", "http://ip-api.com/batch")
+IPAPI_FIELDS = "status,message,query,city,regionName,countryCode"
+BATCH_SIZE = 100
+DEFAULT_BATCH_RATE = 15.0  # batch requests per minute (ip-api.com free tier)
+DEFAULT_BATCH_WORKERS = 4
+BATCH_RETRIES = 3
 
 
 def extract_ip(url):
@@ -33,8 +50,7 @@ def fetch_ipinfo(ip):
     """Return dict with city, region, country (and optionally loc, org, etc.) or None on failure."""
     url = IPINFO_URL.format(ip=ip)
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
-        with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
+        with http_pool.urlopen(url, headers={"User-Agent": USER_AGENT}, timeout=TIMEOUT) as resp:
             data = json.loads(resp.read().decode("utf-8"))
             if data.get("error"):
                 return None
@@ -55,13 +71,90 @@ def location_from_ipinfo(data):
     return ", ".join(parts)
 
 
+class RateLimiter:
+    """Spaces acquire() calls 60/per_minute seconds apart across threads; pause() holds everyone back."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+
+def fetch_ipapi_batch(ips, limiter):
+    """{ip: ip-api result} for up to BATCH_SIZE IPs in one POST; retries on 429 / errors. Missing IPs failed."""
+    body = json.dumps(list(ips)).encode("utf-8")
+    url = IPAPI_BATCH_URL + "?fields=" + IPAPI_FIELDS
+    for attempt in range(BATCH_RETRIES):
+        limiter.acquire()
+        req = urllib.request.Request(url, data=body, headers={"User-Agent": USER_AGENT, "Content-Type": "application/json"})
+        try:
+            with http_pool.NO_PROXY_OPENER.open(req, timeout=TIMEOUT * 3) as resp:
+                results = json.loads(resp.read().decode("utf-8"))
+                remaining, ttl = resp.headers.get("X-Rl"), resp.headers.get("X-Ttl")
+            if remaining is not None and ttl is not None and int(remaining) <= 0:
+                limiter.pause(int(ttl) + 1)  # window used up: everyone waits for the reset
+            return {r.get("query"): r for r in results if isinstance(r, dict)}
+        except urllib.error.HTTPError as e:
+            ttl = e.headers.get("X-Ttl") if e.headers else None
+            limiter.pause(int(ttl) + 1 if ttl and ttl.isdigit() else 2 ** attempt * 5)
+            print("  ip-api batch HTTP {} (attempt {})".format(e.code, attempt + 1), file=sys.stderr)
+        except Exception as e:
+            print("  ip-api batch error: {} (attempt {})".format(e, attempt + 1), file=sys.stderr)
+            time.sleep(2 ** attempt)
+    return {}
+
+
+def location_from_ipapi(data):
+    """Same shape as location_from_ipinfo: 'City, Region, CC'."""
+    if not data or data.get("status") != "success":
+        return None
+    parts = [data.get("city"), data.get("regionName"), data.get("countryCode")]
+    parts = [p for p in parts if p and str(p).strip()]
+    return ", ".join(parts) if parts else None
+
+
+def resolve_batch(ips, rate=DEFAULT_BATCH_RATE, workers=DEFAULT_BATCH_WORKERS):
+    """{ip: location or None} for unique IPs, BATCH_SIZE per request, `workers` requests in flight."""
+    ips = sorted(set(ips))
+    batches = [ips[i : i + BATCH_SIZE] for i in range(0, len(ips), BATCH_SIZE)]
+    limiter = RateLimiter(rate)
+    out = {}
+    started = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for n, results in enumerate(ex.map(lambda b: fetch_ipapi_batch(b, limiter), batches), 1):
+            for ip, data in results.items():
+                out[ip] = location_from_ipapi(data)
+            print("  batch {}/{} ({:.1f}s)".format(n, len(batches), time.time() - started))
+    return out
+
+
 def main():
     dry_run = "--dry-run" in sys.argv
+    batch = "--batch" in sys.argv
     delay = 1.0
+    rate = DEFAULT_BATCH_RATE
+    workers = DEFAULT_BATCH_WORKERS
     for i, arg in enumerate(sys.argv[1:]):
-        if arg == "--delay" and i + 2 < len(sys.argv):
-            delay = float(sys.argv[i + 2])
+        if i + 2 >= len(sys.argv):
             break
+        if arg == "--delay":
+            delay = float(sys.argv[i + 2])
+        elif arg == "--rate":
+            rate = float(sys.argv[i + 2])
+        elif arg == "--workers":
+            workers = int(sys.argv[i + 2])
 
     if not os.path.isfile(CAMS_PATH):
         print("cams.json not found.", file=sys.stderr)
@@ -75,6 +168,11 @@ def main():
         sys.exit(1)
 
     ip_to_location = {}  # cache: fetch each IP only once
+    if batch:
+        ips = [extract_ip(c.get("url") or c.get("embed_url") or "") for c in cams if isinstance(c, dict)]
+        ips = [ip for ip in ips if ip]
+        print("Resolving {} unique IPs in batches of {}...".format(len(set(ips)), BATCH_SIZE))
+        ip_to_location = resolve_batch(ips, rate, workers)
     updated = 0
     skipped_no_ip = 0
     skipped_same = 0
@@ -89,8 +187,11 @@ def main():
             skipped_no_ip += 1
             continue
 
-        if ip in ip_to_location:
-            new_loc = ip_to_location[ip]
+        if ip in ip_to_location or batch:
+            new_loc = ip_to_location.get(ip)
+            if not new_loc:
+                failed += 1
+                continue
         else:
             time.sleep(delay)
             data = fetch_ipinfo(ip)
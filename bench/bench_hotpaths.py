@@ -0,0 +1,201 @@
+"""
+Microbenchmarks for the hot pure-Python paths: frame scanning, URL classification and
+location normalization. Reports per-call time (min/median over repeats) and allocations
+(tracemalloc peak and blocks per call) so optimisations to these paths can be proven.
+
+Inputs:
+  frame scan      MJPEG captures in bench/fixtures/*.mjpeg (record one with --capture URL);
+                  falls back to a synthetic multipart stream built from thumbnails/ frames
+                  (no capture is committed; the output says which input was used)
+  URLs            every url in cams.json
+  locations       bench/fixtures/locations.json (cams.json locations, raw Insecam strings, Cyrillic)
+
+Usage (from the repo root):
+  python3 bench/bench_hotpaths.py                      # all benchmarks, table on stdout
+  python3 bench/bench_hotpaths.py --json bench.json    # also write results as JSON (compare between commits)
+  python3 bench/bench_hotpaths.py --only normalize     # benchmarks whose name contains "normalize"
+  python3 bench/bench_hotpaths.py --capture http://cam/mjpg/video.mjpg --seconds 5
+"""
+import gc
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+sys.path.insert(0, REPO_DIR)
+
+import cam_sim  # noqa: E402
+import check_streams  # noqa: E402
+import http_pool  # noqa: E402
+import server  # noqa: E402
+import thumbnail_scraper  # noqa: E402
+
+try:
+    import uplink_scrape
+except ImportError:  # requests/bs4 not installed: skip the location benchmark
+    uplink_scrape = None
+
+REPEAT = 7
+MIN_TIME = 0.2  # seconds per repeat
+
+
+def load_captures():
+    """(MJPEG capture bytes, source description): recorded fixtures, or a multipart stream of thumbnail frames."""
+    captures = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.mjpeg"))):
+        with open(path, "rb") as f:
+            captures.append(f.read())
+    if captures:
+        return captures, "%d recorded capture(s) in bench/fixtures" % len(captures)
+    # Frames spread across the size range (3 KB .. 200 KB) so chunked scanning is exercised.
+    frames = cam_sim.load_frames(limit=1000)
+    picks = [frames[int(k * (len(frames) - 1) / 7.0)] for k in range(8)] if len(frames) >= 8 else frames
+    parts = [b"--myboundary\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(f) + f + b"\r\n"
+             for f in (cam_sim.tag_frame(f, n) for n, f in enumerate(picks))]
+    # One capture per starting frame, like viewers joining the stream at different moments.
+    for n in range(len(parts)):
+        captures.append(b"".join(parts[n:] + parts[:n]))
+    return captures, "synthetic: no bench/fixtures/*.mjpeg, multipart stream of %d thumbnail frames" % len(parts)
+
+
+def load_urls():
+    with open(os.path.join(REPO_DIR, "cams.json"), "r", encoding="utf-8") as f:
+        return [c["url"] for c in json.load(f) if c.get("url")]
+
+
+def load_locations():
+    with open(os.path.join(FIXTURES_DIR, "locations.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def bench(name, fn, inputs):
+    """Time fn(x) over inputs; returns per-call stats. One 'call' = one input item."""
+    n_inputs = len(inputs)
+
+    def run(loops):
+        start = time.perf_counter()
+        for _ in range(loops):
+            for x in inputs:
+                fn(x)
+        return time.perf_counter() - start
+
+    # Calibrate loops so one repeat takes at least MIN_TIME.
+    loops = 1
+    while run(loops) < MIN_TIME and loops < 1 << 20:
+        loops *= 2
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        per_call = [run(loops) / (loops * n_inputs) for _ in range(REPEAT)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    for x in inputs:
+        fn(x)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(s.count_diff for s in after.compare_to(before, "filename") if s.count_diff > 0)
+    return {
+        "name": name,
+        "inputs": n_inputs,
+        "min_us": round(min(per_call) * 1e6, 3),
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+        "stdev_pct": round(100 * statistics.pstdev(per_call) / statistics.mean(per_call), 2),
+        "peak_kb": round((peak - base) / 1024.0, 1),
+        "blocks_per_call": round(blocks / float(n_inputs), 2),
+    }
+
+
+def benchmarks():
+    captures, source = load_captures()
+    print("frame scan input: %s" % source)
+    urls = load_urls()
+    cases = []
+    for size in (8192, 65536):
+        streams = [chunked(c, size) for c in captures]
+        cases.append(("frame_scan_%dk" % (size // 1024), lambda chunks: server._first_frame(iter(chunks)), streams))
+    bodies = [c[: thumbnail_scraper.MAX_READ] for c in captures]
+    cases.append(("extract_one_image", thumbnail_scraper.extract_one_image, bodies))
+    cases.append(("is_snapshot_only", server.is_snapshot_only, urls))
+    cases.append(("get_live_stream_url", check_streams.get_live_stream_url, urls))
+    if uplink_scrape is not None:
+        cases.append(("normalize_location", uplink_scrape.normalize_location, load_locations()))
+    return cases, source
+
+
+def capture(url, seconds, out_path):
+    """Record seconds of a live MJPEG stream to a fixture file."""
+    data = []
+    end = time.monotonic() + seconds
+    with http_pool.urlopen(url, headers={"User-Agent": server.FEED_PROXY_USER_AGENT}, timeout=15) as resp:
+        while time.monotonic() < end:
+            chunk = resp.read1(65536)
+            if not chunk:
+                break
+            data.append(chunk)
+    with open(out_path, "wb") as f:
+        f.write(b"".join(data))
+    print("Wrote %d bytes to %s" % (sum(len(d) for d in data), out_path))
+
+
+def main():
+    args = sys.argv[1:]
+    json_path = None
+    only = None
+    capture_url = None
+    seconds = 5.0
+    i = 0
+    while i < len(args):
+        if args[i] == "--json" and i + 1 < len(args):
+            json_path = args[i + 1]
+            i += 1
+        elif args[i] == "--only" and i + 1 < len(args):
+            only = args[i + 1]
+            i += 1
+        elif args[i] == "--capture" and i + 1 < len(args):
+            capture_url = args[i + 1]
+            i += 1
+        elif args[i] == "--seconds" and i + 1 < len(args):
+            seconds = float(args[i + 1])
+            i += 1
+        i += 1
+
+    if capture_url:
+        name = "capture_%d.mjpeg" % int(time.time())
+        capture(capture_url, seconds, os.path.join(FIXTURES_DIR, name))
+        return
+
+    results = []
+    cases, source = benchmarks()
+    print("%-22s %8s %12s %12s %8s %10s %10s" % ("benchmark", "inputs", "min us/call", "med us/call", "stdev%", "peak KB", "blocks/call"))
+    for name, fn, inputs in cases:
+        if only and only not in name:
+            continue
+        r = bench(name, fn, inputs)
+        results.append(r)
+        print("%-22s %8d %12.3f %12.3f %8.2f %10.1f %10.2f" % (
+            name, r["inputs"], r["min_us"], r["median_us"], r["stdev_pct"], r["peak_kb"], r["blocks_per_call"]))
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "frame_source": source, "results": results}, f, indent=2)
+        print("Wrote %s" % json_path)
+
+
+if __name__ == "__main__":
+    main()
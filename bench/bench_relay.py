@@ -0,0 +1,149 @@
+"""
+CPU cost of the /stream-proxy MJPEG relay: the original loop (read(8192), write, flush per
+chunk) against server.relay_mjpeg (readinto1 into a reusable buffer, one send per frame).
+
+A local upstream streams MJPEG captures (bench/fixtures/*.mjpeg, or frames built from
+thumbnails/) over HTTP; the relay reads it through http_pool like the server does and writes
+to a socketpair drained by another thread. Reported per relay: relay-thread CPU ms per MB,
+wall MB/s and socket writes per MB.
+
+Usage (from the repo root):
+  python3 bench/bench_relay.py                 # 64 MB per relay, table on stdout
+  python3 bench/bench_relay.py --mb 256 --json relay.json
+"""
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import http_pool  # noqa: E402
+import server  # noqa: E402
+from bench_hotpaths import load_captures  # noqa: E402
+
+REPEAT = 5
+MB = 1024 * 1024
+
+
+class Upstream:
+    """Minimal HTTP/1.0 camera: answers every request with the MJPEG payload, then closes."""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(8)
+        self.url = "http://127.0.0.1:%d/mjpg/video.mjpg" % self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._send, args=(conn,), daemon=True).start()
+
+    def _send(self, conn):
+        with conn:
+            conn.recv(65536)
+            head = b"HTTP/1.0 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=myboundary\r\n\r\n"
+            try:
+                conn.sendall(head)
+                conn.sendall(self.payload)
+            except OSError:
+                pass
+
+
+def drain(sock, counter):
+    buf = bytearray(256 * 1024)
+    while True:
+        n = sock.recv_into(buf)
+        if not n:
+            return
+        counter[0] += n
+
+
+def legacy_relay(resp, sock, counter):
+    """The pre-optimisation /stream-proxy loop."""
+    wfile = sock.makefile("wb", buffering=0)
+    while True:
+        chunk = resp.read(8192)
+        if not chunk:
+            break
+        wfile.write(chunk)
+        wfile.flush()
+        counter[0] += 1
+
+
+def new_relay(resp, sock, counter):
+    def on_send(n):
+        counter[0] += 1
+    server.relay_mjpeg(resp, sock, on_send)
+
+
+def run_once(relay, upstream):
+    out, sink = socket.socketpair()
+    received = [0]
+    t = threading.Thread(target=drain, args=(sink, received), daemon=True)
+    t.start()
+    writes = [0]
+    with http_pool.urlopen(upstream.url, timeout=30) as resp:
+        cpu0 = time.thread_time()
+        wall0 = time.perf_counter()
+        relay(resp, out, writes)
+        cpu = time.thread_time() - cpu0
+        wall = time.perf_counter() - wall0
+    out.close()
+    t.join()
+    sink.close()
+    mb = received[0] / float(MB)
+    return {"cpu_ms_per_mb": 1000.0 * cpu / mb, "mb_per_s": mb / wall, "writes_per_mb": writes[0] / mb}
+
+
+def main():
+    args = sys.argv[1:]
+    total_mb = 64
+    json_path = None
+    i = 0
+    while i < len(args):
+        if args[i] == "--mb" and i + 1 < len(args):
+            total_mb = int(args[i + 1])
+            i += 1
+        elif args[i] == "--json" and i + 1 < len(args):
+            json_path = args[i + 1]
+            i += 1
+        i += 1
+
+    capture = b"".join(load_captures())
+    payload = capture * max(1, int(total_mb * MB / len(capture)))
+    upstream = Upstream(payload)
+    results = []
+    print("Relaying %.1f MB per run, %d runs" % (len(payload) / float(MB), REPEAT))
+    print("%-14s %14s %12s %12s" % ("relay", "CPU ms/MB", "MB/s", "writes/MB"))
+    for name, relay in (("read8k_flush", legacy_relay), ("relay_mjpeg", new_relay)):
+        runs = [run_once(relay, upstream) for _ in range(REPEAT)]
+        r = {
+            "name": name,
+            "cpu_ms_per_mb": round(statistics.median(x["cpu_ms_per_mb"] for x in runs), 3),
+            "mb_per_s": round(statistics.median(x["mb_per_s"] for x in runs), 1),
+            "writes_per_mb": round(statistics.median(x["writes_per_mb"] for x in runs), 1),
+        }
+        results.append(r)
+        print("%-14s %14.3f %12.1f %12.1f" % (name, r["cpu_ms_per_mb"], r["mb_per_s"], r["writes_per_mb"]))
+    upstream.sock.close()
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "payload_mb": round(len(payload) / float(MB), 1),
+                       "results": results}, f, indent=2)
+        print("Wrote %s" % json_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Camera catalog index for server.py's /api/cams: cams.json with per-camera fields derived once at
+load time, and indexes for filtering without scanning the whole list.
+
+Derived per camera (the same rules app.js applies in the browser):
+  country         canonical country code from the last part of the location ("United States" -> "US")
+  location_short  cleaned "City, Country" location
+  snapshot_score  0-3, how likely the URL returns one image per request (matrix prefers high scores)
+  thumbnail       whether thumbnails/list.json lists the camera
+Cameras are kept sorted by id. There are position lists per country and per status, so a
+query starts from the smallest matching list. The cursor is the last id returned, which
+stays valid across reloads.
+"""
+import bisect
+import random
+import re
+
+# ISO code -> display name (app.js COUNTRY_CODE_TO_NAME), plus alternate names seen in locations.
+COUNTRY_NAMES = {
+    "US": "United States", "GB": "United Kingdom", "FR": "France", "DE": "Germany", "IT": "Italy",
+    "ES": "Spain", "NL": "Netherlands", "BE": "Belgium", "AT": "Austria", "CH": "Switzerland",
+    "PL": "Poland", "CZ": "Czech Republic", "SE": "Sweden", "NO": "Norway", "DK": "Denmark", "FI": "Finland",
+    "EE": "Estonia", "LV": "Latvia", "LT": "Lithuania", "RO": "Romania", "HU": "Hungary", "BG": "Bulgaria",
+    "HR": "Croatia", "SK": "Slovakia", "SI": "Slovenia", "RU": "Russia", "UA": "Ukraine", "BY": "Belarus",
+    "JP": "Japan", "KR": "South Korea", "CN": "China", "IN": "India", "TH": "Thailand", "VN": "Vietnam",
+    "PH": "Philippines", "MY": "Malaysia", "ID": "Indonesia", "AU": "Australia", "NZ": "New Zealand",
+    "AR": "Argentina", "BR": "Brazil", "MX": "Mexico", "CA": "Canada", "CO": "Colombia", "CL": "Chile",
+    "PE": "Peru", "HN": "Honduras", "BA": "Bosnia and Herzegovina", "GR": "Greece", "PT": "Portugal",
+    "TR": "Turkey", "IL": "Israel", "AE": "United Arab Emirates", "SA": "Saudi Arabia", "EG": "Egypt",
+    "ZA": "South Africa", "IE": "Ireland", "LU": "Luxembourg", "MT": "Malta", "CY": "Cyprus", "RS": "Serbia",
+    "MD": "Moldova", "DO": "Dominican Republic", "EC": "Ecuador", "PA": "Panama", "SG": "Singapore",
+    "TW": "Taiwan", "AM": "Armenia", "NI": "Nicaragua", "BD": "Bangladesh", "KZ": "Kazakhstan",
+    "GE": "Georgia", "LK": "Sri Lanka", "PK": "Pakistan", "NG": "Nigeria", "KE": "Kenya", "MA": "Morocco",
+    "TN": "Tunisia", "IQ": "Iraq", "IR": "Iran", "JO": "Jordan", "LB": "Lebanon", "KW": "Kuwait",
+    "QA": "Qatar", "BH": "Bahrain", "OM": "Oman", "UZ": "Uzbekistan", "AZ": "Azerbaijan", "KG": "Kyrgyzstan",
+    "TJ": "Tajikistan", "MM": "Myanmar", "KH": "Cambodia", "LA": "Laos", "NP": "Nepal", "AF": "Afghanistan",
+    "UY": "Uruguay", "PY": "Paraguay", "VE": "Venezuela", "BO": "Bolivia", "CR": "Costa Rica",
+    "GT": "Guatemala", "SV": "El Salvador", "CU": "Cuba", "JM": "Jamaica", "TT": "Trinidad and Tobago",
+    "IS": "Iceland", "AL": "Albania", "ME": "Montenegro", "MK": "North Macedonia", "XK": "Kosovo",
+}
+COUNTRY_ALIASES = {
+    "Russia": "RU", "Russian Federation": "RU", "Serbia": "RS", "Moldova": "MD", "Czechia": "CZ", "Taiwan": "TW",
+    "Korea, Republic Of": "KR", "Taiwan, Province Of": "TW",
+}
+_COUNTRY_CODES = dict({name: code for code, name in COUNTRY_NAMES.items()}, **COUNTRY_ALIASES)
+
+# Fields a client can ask for with fields=; everything else in cams.json is passed through too.
+DERIVED_FIELDS = ("country", "location_short", "snapshot_score", "thumbnail")
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def canonical_country(name):
+    """Country code for a country name or code ("United States", "US" -> "US"); unknown names unchanged."""
+    s = (name or "").strip()
+    return _COUNTRY_CODES.get(s, s)
+
+
+def country_of(location):
+    """Canonical country of a location string, or "" (like app.js getCountryFromLocation + canonicalCountry)."""
+    s = (location or "").strip()
+    m = re.search(r"located\s+in\s+([^,]+)", s, re.I)
+    if m:
+        return canonical_country(m.group(1))
+    parts = [p.strip() for p in s.split(",") if p.strip()]
+    return canonical_country(parts[-1]) if len(parts) >= 2 else ""
+
+
+def short_location(location):
+    """Clean "City, Country" from a stored location (legacy Insecam "located in ..." strings included)."""
+    s = (location or "").strip()
+    if not s:
+        return "Unknown"
+    if not re.search(r"click\s+here|located\s+in", s, re.I):
+        return s
+    m = re.search(r"located\s+in\s+([^,]+),\s*region\s+[^,]+,\s*(.+)$", s, re.I)
+    if m:
+        return "%s, %s" % (m.group(2).strip(), m.group(1).strip())
+    m = re.search(r"\s+in\s+(.+)$", s)
+    return m.group(1).strip() if m else s
+
+
+def snapshot_score(url):
+    """Same scale as app.js snapshotScore: 3 snapshot CGI, 2 single JPEG, 1 MJPEG stream, 0 unknown."""
+    u = (url or "").lower()
+    if not u:
+        return 0
+    if any(k in u for k in ("snapshotjpeg", "snapshot.cgi", "image.jpg", "image.jpeg")) or ("webcapture" in u and "command=snap" in u):
+        return 3
+    if any(k in u for k in ("video.jpg", "video.jpeg", "/jpg/", "nph-jpeg")):
+        return 2
+    if any(k in u for k in ("mjpg", "mjpeg", "faststream", "videostream")):
+        return 1
+    return 0
+
+
+def _count(params, name, default):
+    try:
+        n = int(params.get(name) or default)
+    except ValueError:
+        n = 0
+    if not 0 < n <= MAX_LIMIT:
+        raise ValueError("%s must be 1-%d" % (name, MAX_LIMIT))
+    return n
+
+
+def _id_key(cam_id):
+    s = str(cam_id)
+    return (0, int(s), s) if s.isdigit() else (1, 0, s)
+
+
+class CamCatalog:
+    """Immutable index over one cams.json load; build a new one when the file (or thumbnails) change."""
+
+    def __init__(self, cams, thumbnail_ids=()):
+        thumbs = set(str(i) for i in thumbnail_ids)
+        cams = [c for c in cams if isinstance(c, dict) and c.get("id") is not None and not c.get("duplicate_of")]
+        cams.sort(key=lambda c: _id_key(c["id"]))
+        self.cams = []
+        self.keys = []
+        self.by_country = {}
+        self.by_status = {}
+        self.with_thumbnail = []
+        for pos, cam in enumerate(cams):
+            cam = dict(cam)
+            cam["country"] = country_of(cam.get("location"))
+            cam["location_short"] = short_location(cam.get("location"))
+            cam["snapshot_score"] = snapshot_score(cam.get("url"))
+            cam["thumbnail"] = str(cam["id"]) in thumbs
+            cam["_search"] = cam["location_short"].lower()
+            self.cams.append(cam)
+            self.keys.append(_id_key(cam["id"]))
+            self.by_country.setdefault(cam["country"], []).append(pos)
+            self.by_status.setdefault(str(cam.get("status") or "").upper(), []).append(pos)
+            if cam["thumbnail"]:
+                self.with_thumbnail.append(pos)
+
+    def get(self, cam_id):
+        """Catalog entry (with derived fields) for a cam id, or None."""
+        key = _id_key(cam_id)
+        pos = bisect.bisect_left(self.keys, key)
+        return self.cams[pos] if pos < len(self.keys) and self.keys[pos] == key else None
+
+    def _candidates(self, countries, statuses, thumbnail):
+        """Sorted positions matching the indexed filters (None = no filter)."""
+        lists = []
+        if countries is not None:
+            lists.append(sorted(p for c in countries for p in self.by_country.get(c, ())))
+        if statuses is not None:
+            lists.append(sorted(p for s in statuses for p in self.by_status.get(s, ())))
+        if thumbnail:
+            lists.append(self.with_thumbnail)
+        if not lists:
+            return range(len(self.cams))
+        lists.sort(key=len)
+        rest = [set(l) for l in lists[1:]]
+        return [p for p in lists[0] if all(p in r for r in rest)]
+
+    def query(self, params):
+        """Run an /api/cams query (dict of single query-string values); raises ValueError on bad input.
+
+        country, status   comma-separated (country by code or name)
+        thumbnail=1       only cams with a thumbnail
+        q                 substring of the location
+        fields            comma-separated projection (default: all)
+        limit, cursor     page size and the "next" value of the previous page
+        sample=N          N random matches instead of a page (prefer=snapshot: best snapshot_score first; seed=)
+        """
+        countries = statuses = None
+        if params.get("country"):
+            countries = {canonical_country(c) for c in params["country"].split(",")}
+        if params.get("status"):
+            statuses = {s.strip().upper() for s in params["status"].split(",")}
+        positions = self._candidates(countries, statuses, params.get("thumbnail") in ("1", "true"))
+        q = (params.get("q") or "").strip().lower()
+        if q:
+            positions = [p for p in positions if q in self.cams[p]["_search"]]
+        fields = [f.strip() for f in params["fields"].split(",") if f.strip()] if params.get("fields") else None
+
+        if params.get("sample"):
+            n = _count(params, "sample", 0)
+            rng = random.Random(params["seed"]) if params.get("seed") else random
+            if params.get("prefer") == "snapshot":
+                # Like the matrix: highest snapshot_score first, random within a score.
+                picked = sorted(positions, key=lambda p: (-self.cams[p]["snapshot_score"], rng.random()))[:n]
+            else:
+                picked = rng.sample(list(positions), min(n, len(positions)))
+            return {"cams": [self._project(p, fields) for p in picked], "total": len(positions)}
+
+        limit = _count(params, "limit", DEFAULT_LIMIT)
+        start = 0
+        if params.get("cursor"):
+            after = bisect.bisect_right(self.keys, _id_key(params["cursor"]))
+            start = bisect.bisect_left(positions, after)
+        page = positions[start : start + limit]
+        more = start + limit < len(positions)
+        return {
+            "cams": [self._project(p, fields) for p in page],
+            "total": len(positions),
+            "next": str(self.cams[page[-1]]["id"]) if more and page else None,
+        }
+
+    def _project(self, pos, fields):
+        cam = self.cams[pos]
+        if fields is None:
+            return {k: v for k, v in cam.items() if not k.startswith("_")}
+        return {f: cam[f] for f in fields if f in cam and not f.startswith("_")}
+
+    def countries(self, thumbnail=False):
+        """[{"code", "name", "count"}] of countries with cameras, by code."""
+        allowed = set(self.with_thumbnail) if thumbnail else None
+        out = []
+        for code, positions in sorted(self.by_country.items()):
+            count = len(positions) if allowed is None else sum(1 for p in positions if p in allowed)
+            if code and count:
+                out.append({"code": code, "name": COUNTRY_NAMES.get(code, code), "count": count})
+        return out
@@ -0,0 +1,360 @@
+"""
+Simulated camera farm: thousands of fake cameras on localhost for benchmarking and testing
+server.py and the maintenance scripts without hitting real cameras.
+
+Each camera listens on its own port (127.0.0.1:base_port + n) so per-host pooling, the TCP
+pre-sweep and per-camera stats behave as they do against real hosts. Frames are real JPEGs
+taken from thumbnails/ (each tagged with a frame counter in a COM segment).
+
+Camera kinds (URL written to the generated cams.json):
+  mjpeg        /mjpg/video.mjpg                       multipart MJPEG stream at fps
+  snapshot     /snapshot.cgi                          one JPEG per request (also /nphMotionJpeg stream)
+  getoneshot   /oneshotimage.jpg, /GetOneShot         one JPEG per request
+  webcapture   /webcapture.jpg?command=snap&channel=1 one JPEG; same path without query streams MJPEG
+  png          /image.png                             one PNG per request
+  garbage      /image.jpg                             200 with random non-image bytes
+
+Per-camera behaviour (spec keys, all optional): fps, latency (s before response headers),
+bandwidth (bytes/s, 0 = unlimited), stall_after (frames sent before the camera goes silent
+but keeps the socket open), refuse (no listener: connection refused), reset (accept then close).
+
+Usage:
+  python3 cam_sim.py --count 2000                          # serve 2000 cams, write sim_cams.json
+  python3 cam_sim.py --count 500 --base-port 30000 --cams-out /tmp/cams.json --seed 7
+  python3 cam_sim.py --spec farm.json                      # per-camera specs (list of dicts) from a file
+  python3 cam_sim.py --count 1000 --fps 5 --latency 0.2 --bandwidth 200000 --refuse-ratio 0.2 --stall-ratio 0.05
+"""
+import asyncio
+import glob
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+THUMBNAILS_DIR = os.path.join(SCRIPT_DIR, "thumbnails")
+DEFAULT_CAMS_OUT = os.path.join(SCRIPT_DIR, "sim_cams.json")
+DEFAULT_BASE_PORT = 20000
+DEFAULT_COUNT = 1000
+HOST = "127.0.0.1"
+BOUNDARY = b"simframe"
+MAX_FRAMES = 32
+
+# Relative weight of each kind when generating a farm (roughly the mix seen in cams.json).
+KIND_MIX = {"mjpeg": 6, "snapshot": 1, "getoneshot": 1, "webcapture": 1, "png": 0.5, "garbage": 0.5}
+KIND_PATHS = {
+    "mjpeg": "/mjpg/video.mjpg",
+    "snapshot": "/snapshot.cgi",
+    "getoneshot": "/oneshotimage.jpg",
+    "webcapture": "/webcapture.jpg?command=snap&channel=1",
+    "png": "/image.png",
+    "garbage": "/image.jpg",
+}
+SIM_LOCATIONS = [
+    "San Diego, California, US", "Tallinn, Harjumaa, EE", "Paris, Île-de-France, FR", "Tokyo, Tokyo, JP",
+    "Berlin, Berlin, DE", "Halmstad, Halland, SE", "Madrid, Madrid, ES", "Naples, Campania, IT",
+    "Seoul, Seoul, KR", "Boca Raton, Florida, US", "Rotterdam, South Holland, NL", "Taipei, Taipei, TW",
+]
+
+
+def load_frames(limit=MAX_FRAMES):
+    """Real JPEGs from thumbnails/ to serve as frames (smallest first so streams stay light)."""
+    paths = sorted(glob.glob(os.path.join(THUMBNAILS_DIR, "*.jpg")), key=os.path.getsize)[:limit]
+    frames = []
+    for p in paths:
+        with open(p, "rb") as f:
+            data = f.read()
+        if data[:2] == b"\xff\xd8":
+            frames.append(data)
+    if not frames:
+        # No thumbnails checked out: SOI/EOI-delimited placeholder is enough for the proxy paths.
+        frames.append(b"\xff\xd8\xff\xfe\x00\x0bsimframe\xff\xd9")
+    return frames
+
+
+def tag_frame(jpeg, n):
+    """Insert a COM segment with the frame counter after SOI so successive frames differ."""
+    comment = b"sim frame %d" % n
+    return jpeg[:2] + b"\xff\xfe" + struct.pack(">H", len(comment) + 2) + comment + jpeg[2:]
+
+
+def solid_png(width=64, height=48, rgb=(40, 80, 120)):
+    """Minimal valid RGB PNG of one colour."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    row = b"\x00" + bytes(rgb) * width
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(row * height)) + chunk(b"IEND", b"")
+
+
+def build_farm(count=DEFAULT_COUNT, base_port=DEFAULT_BASE_PORT, seed=1, fps=2.0, latency=0.0, bandwidth=0,
+               refuse_ratio=0.0, reset_ratio=0.0, stall_ratio=0.0, id_base=9000000):
+    """Generate per-camera spec dicts (deterministic for a given seed)."""
+    rng = random.Random(seed)
+    kinds = list(KIND_MIX)
+    weights = [KIND_MIX[k] for k in kinds]
+    specs = []
+    for n in range(count):
+        spec = {
+            "id": id_base + n,
+            "port": base_port + n,
+            "kind": rng.choices(kinds, weights)[0],
+            "fps": fps,
+            "latency": latency,
+            "bandwidth": bandwidth,
+            "stall_after": 0,
+            "refuse": False,
+            "reset": False,
+        }
+        r = rng.random()
+        if r < refuse_ratio:
+            spec["refuse"] = True
+        elif r < refuse_ratio + reset_ratio:
+            spec["reset"] = True
+        elif r < refuse_ratio + reset_ratio + stall_ratio:
+            spec["stall_after"] = rng.randint(1, 5)
+        specs.append(spec)
+    return specs
+
+
+def spec_url(spec):
+    return "http://%s:%d%s" % (HOST, spec["port"], KIND_PATHS.get(spec.get("kind"), "/mjpg/video.mjpg"))
+
+
+def write_cams_json(specs, path):
+    """Write a cams.json matching the farm (same fields the scraper writes)."""
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    cams = [{
+        "id": spec["id"],
+        "url": spec_url(spec),
+        "location": SIM_LOCATIONS[i % len(SIM_LOCATIONS)],
+        "status": "ACTIVE",
+        "last_seen": now,
+    } for i, spec in enumerate(specs)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(cams, f, indent=4, ensure_ascii=False)
+    return cams
+
+
+def raise_fd_limit():
+    """Each camera holds a listening socket; lift the soft descriptor limit to the hard limit where possible."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or hard > soft:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 1 << 16, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+class CamFarm:
+    """Runs the fake cameras on an asyncio loop; start() in a background thread or run_forever() in the foreground."""
+
+    def __init__(self, specs, frames=None):
+        self.specs = [s for s in specs]
+        self.frames = frames or load_frames()
+        self.png = solid_png()
+        self.loop = None
+        self.servers = []
+        self.stats = {"connections": 0, "requests": 0, "frames": 0, "bytes": 0}
+        self._thread = None
+        self._ready = threading.Event()
+
+    async def _write(self, writer, spec, data):
+        bandwidth = spec.get("bandwidth") or 0
+        if bandwidth <= 0:
+            writer.write(data)
+            await writer.drain()
+        else:
+            step = max(1024, int(bandwidth / 20))
+            for i in range(0, len(data), step):
+                part = data[i:i + step]
+                writer.write(part)
+                await writer.drain()
+                await asyncio.sleep(len(part) / float(bandwidth))
+        self.stats["bytes"] += len(data)
+
+    def _frame(self, spec):
+        n = spec.setdefault("_frame_no", 0)
+        spec["_frame_no"] = n + 1
+        self.stats["frames"] += 1
+        return tag_frame(self.frames[(spec["id"] + n) % len(self.frames)], n)
+
+    async def _stall(self, writer):
+        # Camera goes silent but keeps the socket open (the case that burns client timeouts).
+        while not writer.is_closing():
+            await asyncio.sleep(3600)
+
+    async def _send_single(self, writer, spec, content_type, body):
+        head = ("HTTP/1.1 200 OK\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n" % (content_type, len(body))).encode("ascii")
+        await self._write(writer, spec, head + body)
+
+    async def _send_stream(self, writer, spec):
+        head = ("HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=%s\r\n"
+                "Connection: close\r\n\r\n" % BOUNDARY.decode("ascii")).encode("ascii")
+        await self._write(writer, spec, head)
+        interval = 1.0 / spec["fps"] if spec.get("fps") else 0.5
+        sent = 0
+        while True:
+            if spec.get("stall_after") and sent >= spec["stall_after"]:
+                await self._stall(writer)
+                return
+            frame = self._frame(spec)
+            part = (b"--" + BOUNDARY + b"\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                    + str(len(frame)).encode("ascii") + b"\r\n\r\n" + frame + b"\r\n")
+            await self._write(writer, spec, part)
+            sent += 1
+            await asyncio.sleep(interval)
+
+    async def _handle(self, reader, writer, spec):
+        self.stats["connections"] += 1
+        try:
+            if spec.get("reset"):
+                return
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                self.stats["requests"] += 1
+                request_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+                parts = request_line.split(" ")
+                target = parts[1] if len(parts) > 1 else "/"
+                path, _, query = target.partition("?")
+                path_l = path.lower()
+                if spec.get("latency"):
+                    await asyncio.sleep(spec["latency"])
+                kind = spec.get("kind")
+                streaming = (
+                    path_l == "/mjpg/video.mjpg" and kind == "mjpeg"
+                    or path_l == "/nphmotionjpeg" and kind == "snapshot"
+                    or path_l == "/webcapture.jpg" and kind == "webcapture" and "command=snap" not in query.lower()
+                )
+                if streaming:
+                    await self._send_stream(writer, spec)
+                    return
+                if spec.get("stall_after") and spec.get("_frame_no", 0) >= spec["stall_after"]:
+                    await self._stall(writer)
+                    return
+                if (kind == "snapshot" and path_l == "/snapshot.cgi"
+                        or kind == "getoneshot" and path_l in ("/oneshotimage.jpg", "/getoneshot")
+                        or kind == "webcapture" and path_l == "/webcapture.jpg"):
+                    await self._send_single(writer, spec, "image/jpeg", self._frame(spec))
+                elif kind == "png" and path_l == "/image.png":
+                    self.stats["frames"] += 1
+                    await self._send_single(writer, spec, "image/png", self.png)
+                elif kind == "garbage" and path_l == "/image.jpg":
+                    await self._send_single(writer, spec, "image/jpeg", os.urandom(2048).replace(b"\xff", b"\x00"))
+                else:
+                    body = b"Not Found"
+                    await self._write(writer, spec, b"HTTP/1.1 404 Not Found\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+                if b"connection: close" in head.lower():
+                    return
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.CancelledError, ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def _start_servers(self):
+        for spec in self.specs:
+            if spec.get("refuse"):
+                continue
+            server = await asyncio.start_server(
+                lambda r, w, spec=spec: self._handle(r, w, spec), HOST, spec["port"], backlog=64, reuse_address=True)
+            self.servers.append(server)
+
+    def start(self):
+        """Start the farm on a background thread; returns once every camera is listening."""
+        raise_fd_limit()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self._start_servers())
+            self._ready.set()
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            for server in self.servers:
+                server.close()
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def run_forever(self):
+        raise_fd_limit()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._start_servers())
+        self.loop.run_forever()
+
+
+def main():
+    count = DEFAULT_COUNT
+    base_port = DEFAULT_BASE_PORT
+    cams_out = DEFAULT_CAMS_OUT
+    spec_path = None
+    opts = {"seed": 1, "fps": 2.0, "latency": 0.0, "bandwidth": 0, "refuse_ratio": 0.0, "reset_ratio": 0.0, "stall_ratio": 0.0}
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "--count" and i + 1 < len(args):
+            count = int(args[i + 1])
+            i += 1
+        elif a == "--base-port" and i + 1 < len(args):
+            base_port = int(args[i + 1])
+            i += 1
+        elif a == "--cams-out" and i + 1 < len(args):
+            cams_out = args[i + 1]
+            i += 1
+        elif a == "--spec" and i + 1 < len(args):
+            spec_path = args[i + 1]
+            i += 1
+        elif a.startswith("--") and a[2:].replace("-", "_") in opts and i + 1 < len(args):
+            key = a[2:].replace("-", "_")
+            opts[key] = type(opts[key])(float(args[i + 1])) if key != "seed" else int(args[i + 1])
+            i += 1
+        i += 1
+
+    if spec_path:
+        with open(spec_path, "r", encoding="utf-8") as f:
+            specs = json.load(f)
+        for n, spec in enumerate(specs):
+            spec.setdefault("id", 9000000 + n)
+            spec.setdefault("port", base_port + n)
+            spec.setdefault("kind", "mjpeg")
+    else:
+        specs = build_farm(count=count, base_port=base_port, **opts)
+    write_cams_json(specs, cams_out)
+    kinds = {}
+    for spec in specs:
+        kinds[spec["kind"]] = kinds.get(spec["kind"], 0) + 1
+    print("Camera farm: %d cams on %s:%d-%d (%s)" % (
+        len(specs), HOST, specs[0]["port"] if specs else base_port, specs[-1]["port"] if specs else base_port,
+        ", ".join("%s=%d" % kv for kv in sorted(kinds.items()))))
+    print("Wrote %s" % cams_out)
+    try:
+        CamFarm(specs).run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -8,21 +8,29 @@ Usage:
   python3 check_streams.py --no-signal   # print only cam IDs with no signal (easy to copy)
   python3 check_streams.py --remove     # check all, then remove no-signal cams from cams.json
   python3 check_streams.py --timeout 5   # use 5 second timeout (default 8)
+  python3 check_streams.py --connect-timeout 1.5  # TCP pre-sweep timeout (default 2)
+  python3 check_streams.py --workers 32  # parallel HTTP checks after the pre-sweep (default 16)
+  python3 check_streams.py --no-presweep # skip the TCP pre-sweep (HTTP-check every cam)
+
+Hosts that refuse or never answer a TCP connect are marked no-signal by a fast
+concurrent pre-sweep (tcp_sweep.py); only the rest get the full HTTP check.
 """
+import concurrent.futures
 import json
 import os
 import re
 import sys
-import urllib.request
 import urllib.error
 from urllib.parse import urlparse, urlunparse
 
+import http_pool
+import tcp_sweep
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CAMS_JSON = os.path.join(SCRIPT_DIR, "cams.json")
 DEFAULT_TIMEOUT = 8
+DEFAULT_WORKERS = 16
 USER_AGENT = "Mozilla/5.0 (compatible; UPLINK_SITE stream check)"
-# Avoid IDE/sandbox proxy env causing false 403 for camera hosts.
-NO_PROXY_OPENER = urllib.request.build_opener(urllib.request.ProxyHandler({}))
 
 
 def get_live_stream_url(stored_url):
@@ -69,10 +77,18 @@ def get_live_stream_url(stored_url):
 def check_url(url, timeout=DEFAULT_TIMEOUT):
     """Try to fetch URL; return (ok, message)."""
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
-        with NO_PROXY_OPENER.open(req, timeout=timeout) as resp:
+        with http_pool.urlopen(url, headers={"User-Agent": USER_AGENT}, timeout=timeout) as resp:
             code = resp.getcode()
-            body = resp.read(65536)  # first 64KB enough to see JPEG or stream start
+            # First 64KB is enough to see JPEG or stream start; stop as soon as the start is recognisable
+            # (read1: a low-fps MJPEG stream would otherwise block until a full 64KB has arrived).
+            body = b""
+            while len(body) < 65536:
+                chunk = resp.read1(65536 - len(body))
+                if not chunk:
+                    break
+                body += chunk
+                if len(body) >= 4096 or body[:2] in (b"\xff\xd8", b"--") or body[:8] == b"\x89PNG\r\n\x1a\n":
+                    break
         if code != 200:
             return False, "HTTP %s" % code
         if not body or len(body) < 2:
@@ -99,6 +115,9 @@ def main():
     timeout = DEFAULT_TIMEOUT
     only_no_signal = False
     do_remove = False
+    presweep = True
+    connect_timeout = tcp_sweep.CONNECT_TIMEOUT
+    workers = DEFAULT_WORKERS
     args = sys.argv[1:]
     i = 0
     while i < len(args):
@@ -109,6 +128,14 @@ def main():
         elif args[i] == "--timeout" and i + 1 < len(args):
             timeout = int(args[i + 1])
             i += 1
+        elif args[i] == "--connect-timeout" and i + 1 < len(args):
+            connect_timeout = float(args[i + 1])
+            i += 1
+        elif args[i] == "--workers" and i + 1 < len(args):
+            workers = max(1, int(args[i + 1]))
+            i += 1
+        elif args[i] == "--no-presweep":
+            presweep = False
         i += 1
 
     try:
@@ -123,28 +150,54 @@ def main():
     ok_count = 0
     total = len(cams)
 
-    for i, cam in enumerate(cams):
+    # Check the URL the live viewer actually uses (may differ from stored URL for snapshot cams)
+    jobs = []
+    for cam in cams:
         cam_id = cam.get("id", "?")
         url = cam.get("url", "").strip()
         if not url or not url.startswith(("http://", "https://")):
-            no_signal.append((cam_id, url, "invalid URL"))
-            no_signal_ids.add(cam_id)
-            continue
-        # Check the URL the live viewer actually uses (may differ from stored URL for snapshot cams)
-        live_url = get_live_stream_url(url)
-        check_url_used = live_url if live_url != url else url
-        ok, msg = check_url(check_url_used, timeout=timeout)
-        if ok:
-            ok_count += 1
-            if not only_no_signal:
-                print("[OK] id=%s" % cam_id)
+            jobs.append((cam_id, url, None))
         else:
-            no_signal.append((cam_id, check_url_used, msg))
-            no_signal_ids.add(cam_id)
-            if not only_no_signal:
-                print("[NO SIGNAL] id=%s %s" % (cam_id, msg))
+            jobs.append((cam_id, url, get_live_stream_url(url)))
+
+    # Stage 1: concurrent TCP connects; hosts that never answer skip the HTTP timeout entirely.
+    unreachable = {}
+    if presweep:
+        addr_of = {job[2]: tcp_sweep.cam_address(job[2]) for job in jobs if job[2]}
+        # --remove deletes cams, so a host must have had the full HTTP timeout to accept a connection.
+        swept = tcp_sweep.sweep(addr_of.values(), timeout=max(connect_timeout, timeout) if do_remove else connect_timeout)
+        for live_url, addr in addr_of.items():
+            ok, msg = swept.get(addr, (False, "invalid URL"))
+            if not ok:
+                unreachable[live_url] = "tcp: " + msg
+        if not only_no_signal:
+            print("Pre-sweep: %d of %d hosts accept connections." % (
+                sum(1 for ok, _ in swept.values() if ok), len(swept)))
+
+    def run_check(job):
+        cam_id, url, live_url = job
+        if live_url is None:
+            return False, "invalid URL"
+        if live_url in unreachable:
+            return False, unreachable[live_url]
+        return check_url(live_url, timeout=timeout)
+
+    # Stage 2: full HTTP/frame check for reachable hosts (results printed in cams.json order).
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        checked = ex.map(run_check, jobs)
+        for (cam_id, url, live_url), (ok, msg) in zip(jobs, checked):
+            check_url_used = live_url or url
+            if ok:
+                ok_count += 1
+                if not only_no_signal:
+                    print("[OK] id=%s" % cam_id)
             else:
-                print(cam_id)
+                no_signal.append((cam_id, check_url_used, msg))
+                no_signal_ids.add(cam_id)
+                if not only_no_signal:
+                    print("[NO SIGNAL] id=%s %s" % (cam_id, msg))
+                else:
+                    print(cam_id)
 
     if only_no_signal:
         return
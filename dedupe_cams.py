@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Find the same physical camera listed several times in cams.json (different Insecam ids, ports
+or URL variants) by comparing perceptual hashes of the thumbnails.
+
+Every thumbnail gets a 64-bit difference hash (dHash: 9x8 grey downscale, one bit per
+horizontally adjacent pixel pair), stored in cam_hashes.json next to cams.json and only
+recomputed when the thumbnail file changes. Near-duplicates are all pairs within
+--max-distance bits (Hamming distance), found with a NumPy-vectorised pass when NumPy is
+installed and a BK-tree otherwise. Pairs are then grouped (union-find). Each group keeps one
+representative, chosen by most visits, then ACTIVE status, then lowest id.
+
+Near-uniform frames (black, grey "no video" placeholders) hash to almost all-zero bits and
+would match each other; they are skipped. Groups larger than --max-group are reported as
+probable placeholders and left alone.
+
+Requires Pillow to decode thumbnails (pip install Pillow); NumPy is optional.
+
+Usage:
+  python3 dedupe_cams.py                   # update hashes, report duplicate groups
+  python3 dedupe_cams.py --max-distance 4  # stricter match (default 6 of 64 bits)
+  python3 dedupe_cams.py --flag            # set "duplicate_of": <representative id> in cams.json
+  python3 dedupe_cams.py --merge           # remove duplicates from cams.json, keeping representatives
+"""
+import io
+import json
+import os
+import sys
+import urllib.parse
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import numpy as np
+except ImportError:  # BK-tree fallback
+    np = None
+
+import thumb_pack
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMS_PATH = os.path.join(SCRIPT_DIR, "cams.json")
+HASHES_PATH = os.path.join(SCRIPT_DIR, "cam_hashes.json")
+CAM_VISITS_PATH = os.path.join(SCRIPT_DIR, "cam_visits.json")
+DEFAULT_MAX_DISTANCE = 6
+DEFAULT_MAX_GROUP = 5
+# Hashes with fewer set bits than this come from near-uniform frames (black / placeholder).
+MIN_HASH_BITS = 4
+# near_pairs with NumPy: XOR matrix block size (all pairs are compared in one broadcast per block).
+NUMPY_BLOCK_BYTES = 32 * 1024 * 1024
+
+
+def dhash(data):
+    """64-bit difference hash of an encoded JPEG/PNG, or None if it cannot be decoded."""
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.draft("L", (64, 64))  # JPEG: decode at reduced scale, the hash only needs 9x8
+        px = img.convert("L").resize((9, 8), Image.BILINEAR).tobytes()
+    except Exception:
+        return None
+    h = 0
+    for row in range(8):
+        for col in range(8):
+            h = (h << 1) | (px[row * 9 + col] < px[row * 9 + col + 1])
+    return h
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Metric tree over 64-bit hashes (Hamming distance) for radius queries."""
+
+    def __init__(self):
+        self.root = None  # [hash, [items], {distance: child}]
+
+    def add(self, h, item):
+        if self.root is None:
+            self.root = [h, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [item], {}]
+                return
+            node = child
+
+    def query(self, h, radius):
+        """[(distance, item)] for every item within radius of h."""
+        out = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                out.extend((d, item) for item in node[1])
+            for dist, child in node[2].items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        return out
+
+
+def _popcount(x):
+    """Set bits per element of a uint64 array."""
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(x)
+    return np.unpackbits(x.view(np.uint8), axis=-1).reshape(x.shape + (64,)).sum(axis=-1)
+
+
+def near_pairs(hashes, max_distance):
+    """[(i, j, distance)] for i < j with hamming(hashes[i], hashes[j]) <= max_distance."""
+    pairs = []
+    if np is not None and hashes:
+        arr = np.array(hashes, dtype=np.uint64)
+        n = len(arr)
+        cols = np.arange(n)
+        # Rows per block so one block's XOR matrix stays within NUMPY_BLOCK_BYTES.
+        rows = max(1, NUMPY_BLOCK_BYTES // (8 * n))
+        for start in range(0, n - 1, rows):
+            block = arr[start : start + rows]
+            dist = _popcount(block[:, None] ^ arr[None, :])
+            upper = cols[None, :] > (start + np.arange(len(block)))[:, None]
+            for i, j in zip(*np.nonzero((dist <= max_distance) & upper)):
+                pairs.append((start + int(i), int(j), int(dist[i, j])))
+        return pairs
+    tree = BKTree()
+    for i, h in enumerate(hashes):
+        for d, j in tree.query(h, max_distance):
+            pairs.append((j, i, d))
+        tree.add(h, i)
+    return pairs
+
+
+def group_pairs(n, pairs):
+    """Union-find: lists of indices connected by pairs (only groups of 2+)."""
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j, _ in pairs:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[rj] = ri
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def load_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def update_hashes(cams):
+    """dHash per cam thumbnail, cached in cam_hashes.json by capture time. Returns {cam_id: hash int}."""
+    cache = load_json(HASHES_PATH, {})
+    times = thumb_pack.thumbnail_times()
+    out = {}
+    changed = 0
+    for cam in cams:
+        cam_id = str(cam.get("id"))
+        mtime = times.get(cam_id)
+        if mtime is None:
+            continue
+        entry = cache.get(cam_id)
+        if not entry or entry.get("mtime") != mtime:
+            hit = thumb_pack.load_thumbnail(cam_id)
+            if hit is None:
+                continue
+            h = dhash(hit[1])
+            entry = cache[cam_id] = {"dhash": "%016x" % h if h is not None else None, "mtime": mtime}
+            changed += 1
+        if entry.get("dhash"):
+            out[cam_id] = int(entry["dhash"], 16)
+    if changed:
+        tmp = HASHES_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+        os.replace(tmp, HASHES_PATH)
+    print("Hashed %d thumbnails (%d new or changed)." % (len(out), changed))
+    return out
+
+
+def find_duplicates(cams, hashes, visits, max_distance, max_group):
+    """(groups, placeholder_groups): each group is [representative cam, duplicate cams...]."""
+    by_id = {str(c.get("id")): c for c in cams}
+    ids = [i for i in hashes if i in by_id and bin(hashes[i]).count("1") >= MIN_HASH_BITS]
+    pairs = near_pairs([hashes[i] for i in ids], max_distance)
+    groups, placeholders = [], []
+    for members in group_pairs(len(ids), pairs):
+        group = [by_id[ids[k]] for k in members]
+        group.sort(key=lambda c: (-int(visits.get(str(c.get("id")), 0)), c.get("status") != "ACTIVE", c.get("id")))
+        (placeholders if len(group) > max_group else groups).append(group)
+    return groups, placeholders
+
+
+def main():
+    args = sys.argv[1:]
+    max_distance = DEFAULT_MAX_DISTANCE
+    max_group = DEFAULT_MAX_GROUP
+    i = 0
+    while i < len(args):
+        if args[i] == "--max-distance" and i + 1 < len(args):
+            max_distance = int(args[i + 1])
+            i += 1
+        elif args[i] == "--max-group" and i + 1 < len(args):
+            max_group = int(args[i + 1])
+            i += 1
+        i += 1
+    do_flag = "--flag" in args
+    do_merge = "--merge" in args
+    if Image is None:
+        print("Pillow is required to hash thumbnails: pip install Pillow", file=sys.stderr)
+        sys.exit(1)
+
+    cams = load_json(CAMS_PATH, None)
+    if not cams:
+        print("No cams in %s." % CAMS_PATH, file=sys.stderr)
+        sys.exit(1)
+    hashes = update_hashes(cams)
+    groups, placeholders = find_duplicates(cams, hashes, load_json(CAM_VISITS_PATH, {}), max_distance, max_group)
+
+    for group in groups:
+        keep = group[0]
+        print("Keep %s %s" % (keep.get("id"), keep.get("url")))
+        for dup in group[1:]:
+            d = hamming(hashes[str(keep.get("id"))], hashes[str(dup.get("id"))])
+            host = urllib.parse.urlparse(dup.get("url") or "").hostname
+            same = "same host" if host == urllib.parse.urlparse(keep.get("url") or "").hostname else "other host"
+            print("  dup %s %s (distance %d, %s)" % (dup.get("id"), dup.get("url"), d, same))
+    for group in placeholders:
+        print("Skipped %d-cam group (probable placeholder image): %s" % (
+            len(group), ", ".join(str(c.get("id")) for c in group[:10])))
+    dup_of = {str(d.get("id")): g[0].get("id") for g in groups for d in g[1:]}
+    print("%d duplicate groups, %d duplicate cams." % (len(groups), len(dup_of)))
+
+    if (do_flag or do_merge) and dup_of:
+        if do_merge:
+            kept = [c for c in cams if str(c.get("id")) not in dup_of]
+        else:
+            kept = cams
+            for c in kept:
+                if str(c.get("id")) in dup_of:
+                    c["duplicate_of"] = dup_of[str(c.get("id"))]
+        tmp = CAMS_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(kept, f, indent=4, ensure_ascii=False)
+        os.replace(tmp, CAMS_PATH)
+        print("%s %d duplicate cams in cams.json." % ("Removed" if do_merge else "Flagged", len(dup_of)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Last frame per camera for server.py's /feed-proxy, kept across restarts.
+
+FrameCache holds the most recently fetched frame of each camera (least-recently-used out
+past a byte budget). A background thread snapshots it to one file every `interval` seconds
+when it has changed: a header, one index record per frame (timestamp, offset, length, key,
+content type), then the frame bytes. The file is written to a temp name and renamed into place.
+At startup the file is memory-mapped and the cache entries point into the mapping, so a
+restarted server has the frames at once without reading them onto the heap.
+
+With WORKERS every worker caches the frames it fetched itself. A snapshot therefore merges
+with the file already there (newest frame per camera wins, then the byte budget) under a lock
+file, so workers add to one snapshot instead of overwriting each other's.
+"""
+import collections
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+
+_MAGIC = b"UPFC"
+_HEADER = struct.Struct("<4sII")  # magic, format version, entry count
+_ENTRY = struct.Struct("<dQIHH")  # timestamp, data offset, frame length, key length, content type length
+_VERSION = 1
+
+
+class FrameCache:
+    def __init__(self, path, budget_bytes, interval=60.0):
+        self.path = path
+        self.budget = budget_bytes
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # key -> (ts, ctype, frame bytes or memoryview), oldest first
+        self.bytes = 0
+        self.dirty = False
+        self.loaded = 0
+
+    def put(self, key, ctype, frame, ts=None):
+        if self.budget <= 0 or len(frame) > self.budget // 8:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[2])
+            self.entries[key] = (time.time() if ts is None else ts, ctype, frame)
+            self.bytes += len(frame)
+            while self.bytes > self.budget:
+                _, (_, _, dropped) = self.entries.popitem(last=False)
+                self.bytes -= len(dropped)
+            self.dirty = True
+
+    def get(self, key):
+        """(age in seconds, ctype, frame) or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+        return (time.time() - entry[0], entry[1], entry[2])
+
+    def discard(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= len(entry[2])
+                self.dirty = True
+
+    def _read(self):
+        """[(key, ts, ctype, frame memoryview)] from the snapshot file, newest first; [] if none or corrupt."""
+        try:
+            with open(self.path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):  # no snapshot yet, or empty
+            return []
+        try:
+            magic, version, count = _HEADER.unpack_from(mm, 0)
+            if magic != _MAGIC or version != _VERSION:
+                return []
+            view = memoryview(mm)
+            pos = _HEADER.size
+            entries = []
+            for _ in range(count):
+                ts, offset, length, key_len, ct_len = _ENTRY.unpack_from(mm, pos)
+                pos += _ENTRY.size
+                key = bytes(mm[pos : pos + key_len]).decode("utf-8")
+                ctype = bytes(mm[pos + key_len : pos + key_len + ct_len]).decode("ascii")
+                pos += key_len + ct_len
+                if offset + length <= len(mm):
+                    entries.append((key, ts, ctype, view[offset : offset + length]))
+        except (struct.error, UnicodeDecodeError):
+            print("[frame_cache] %s is corrupt; ignoring it" % self.path)
+            return []
+        return entries
+
+    def load(self, max_age):
+        """Map the snapshot file and adopt its frames younger than max_age; returns how many."""
+        now = time.time()
+        loaded = [e for e in self._read() if now - e[1] <= max_age]
+        for key, ts, ctype, frame in reversed(loaded):  # file is newest first; put oldest first
+            with self.lock:
+                if key in self.entries:
+                    continue
+            self.put(key, ctype, frame, ts)
+        with self.lock:
+            self.dirty = False
+        self.loaded = len(loaded)
+        return self.loaded
+
+    def snapshot(self):
+        """Merge the cache into self.path (newest first) if it changed since the last snapshot."""
+        with self.lock:
+            if not self.dirty:
+                return False
+            items = [(key,) + entry for key, entry in reversed(self.entries.items())]
+            self.dirty = False
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)  # released when the file is closed
+            return self._write(items)
+
+    def _write(self, items):
+        """Write items plus the newer frames of other workers from the current file. Caller holds the lock file."""
+        newest = {key: ts for key, ts, _, _ in items}
+        for key, ts, ctype, frame in self._read():
+            if ts > newest.get(key, 0.0):
+                newest[key] = ts
+                items.append((key, ts, ctype, frame))
+        items.sort(key=lambda item: item[1], reverse=True)
+        merged, total = [], 0
+        for key, ts, ctype, frame in items:
+            if newest[key] == ts and total + len(frame) <= self.budget:
+                merged.append((key, ts, ctype, frame))
+                total += len(frame)
+                newest[key] = None  # one frame per key
+        items = merged
+        index = []
+        offset = _HEADER.size + sum(_ENTRY.size + len(k.encode("utf-8")) + len(c.encode("ascii")) for k, _, c, _ in items)
+        for key, ts, ctype, frame in items:
+            k, c = key.encode("utf-8"), ctype.encode("ascii")
+            index.append(_ENTRY.pack(ts, offset, len(frame), len(k), len(c)) + k + c)
+            offset += len(frame)
+        tmp = "%s.tmp.%d" % (self.path, os.getpid())
+        try:
+            with open(tmp, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, len(items)))
+                f.writelines(index)
+                for _, _, _, frame in items:
+                    f.write(frame)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print("[frame_cache] snapshot failed: %s" % e)
+            with self.lock:
+                self.dirty = True
+            return False
+        return True
+
+    def start(self):
+        """Snapshot every `interval` seconds in a daemon thread."""
+        def run():
+            while True:
+                time.sleep(self.interval)
+                self.snapshot()
+
+        threading.Thread(target=run, name="frame-cache", daemon=True).start()
+        return self
+
+    def stats(self):
+        with self.lock:
+            return {"frames": len(self.entries), "bytes": self.bytes, "loaded": self.loaded}
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Thumbnail quality scoring: tells real camera pictures apart from black frames, flat "no video"
+screens, known placeholder images and frozen feeds, which all pass the SOI/EOI check.
+
+Every thumbnail is decoded at reduced scale to a 16x12 grey sample. Measured per sample:
+  brightness  mean grey level (too dark or blown out)
+  contrast    standard deviation of the grey levels
+  edges       mean absolute difference between neighbouring pixels
+  placeholder smallest mean difference to any image in placeholders/
+  frozen      mean difference to the previous capture's sample (kept in thumbnail_state.json)
+Frames are scored in batches, as one NumPy array when NumPy is installed and per sample
+otherwise. The score (0..1) and flags go into thumbnail_state.json. Cams scoring below
+QUALITY_MIN are left out of thumbnails/list.json, like cams that keep failing, so the
+carousel and matrix skip them. They come back once a capture scores well again.
+
+Requires Pillow to decode thumbnails; NumPy is optional.
+
+Usage:
+  python3 frame_quality.py                      # score every thumbnail, update state and list.json
+  python3 frame_quality.py --report 30          # also print the 30 lowest-scoring cams
+  python3 frame_quality.py --add-placeholder ID # copy cam ID's thumbnail into placeholders/
+"""
+import base64
+import io
+import math
+import os
+import sys
+
+import thumb_pack
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import numpy as np
+except ImportError:  # per-sample fallback
+    np = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PLACEHOLDER_DIR = os.environ.get("PLACEHOLDER_DIR") or os.path.join(SCRIPT_DIR, "placeholders")
+SAMPLE_SIZE = (16, 12)
+# Cams scoring below this are hidden from list.json.
+QUALITY_MIN = 0.2
+# Mean grey-level difference (0-255) under which a frame counts as the same picture.
+PLACEHOLDER_MATCH = 6.0
+FROZEN_MATCH = 0.5
+# Consecutive near-identical captures before a cam is flagged frozen.
+FROZEN_LIMIT = 2
+BATCH = 256
+
+
+def sample(data):
+    """16x12 grey sample (bytes) of an encoded JPEG/PNG, or None if it cannot be decoded."""
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.draft("L", (SAMPLE_SIZE[0] * 4, SAMPLE_SIZE[1] * 4))
+        return img.convert("L").resize(SAMPLE_SIZE, Image.BILINEAR).tobytes()
+    except Exception:
+        return None
+
+
+def _mean_diff(a, b):
+    return sum(abs(x - y) for x, y in zip(a, b)) / float(len(a))
+
+
+def _measure_py(s, placeholders, prev):
+    w, h = SAMPLE_SIZE
+    n = float(len(s))
+    mean = sum(s) / n
+    std = math.sqrt(sum((p - mean) ** 2 for p in s) / n)
+    dx = sum(abs(s[r * w + c + 1] - s[r * w + c]) for r in range(h) for c in range(w - 1)) / float(h * (w - 1))
+    dy = sum(abs(s[(r + 1) * w + c] - s[r * w + c]) for r in range(h - 1) for c in range(w)) / float((h - 1) * w)
+    ph = min((_mean_diff(s, p) for p in placeholders), default=None)
+    return mean, std, (dx + dy) / 2.0, ph, _mean_diff(s, prev) if prev else None
+
+
+def measure(samples, placeholders=(), previous=None):
+    """[(brightness, contrast, edges, placeholder_diff, previous_diff)] for a batch of samples.
+
+    placeholder_diff is None without placeholders, previous_diff is None where previous[i] is None.
+    """
+    previous = previous or [None] * len(samples)
+    if np is None or not samples:
+        return [_measure_py(s, placeholders, p) for s, p in zip(samples, previous)]
+    w, h = SAMPLE_SIZE
+    a = np.frombuffer(b"".join(samples), dtype=np.uint8).reshape(len(samples), h, w).astype(np.float32)
+    flat = a.reshape(len(samples), -1)
+    mean = flat.mean(axis=1)
+    std = flat.std(axis=1)
+    edges = (np.abs(np.diff(a, axis=2)).mean(axis=(1, 2)) + np.abs(np.diff(a, axis=1)).mean(axis=(1, 2))) / 2.0
+    ph = [None] * len(samples)
+    if placeholders:
+        p = np.frombuffer(b"".join(placeholders), dtype=np.uint8).reshape(len(placeholders), -1).astype(np.float32)
+        ph = np.abs(flat[:, None, :] - p[None, :, :]).mean(axis=2).min(axis=1).tolist()
+    prev = [None] * len(samples)
+    have = [i for i, s in enumerate(previous) if s]
+    if have:
+        b = np.frombuffer(b"".join(previous[i] for i in have), dtype=np.uint8).reshape(len(have), -1).astype(np.float32)
+        for i, d in zip(have, np.abs(flat[have] - b).mean(axis=1).tolist()):
+            prev[i] = d
+    return list(zip(mean.tolist(), std.tolist(), edges.tolist(), ph, prev))
+
+
+def score(brightness, contrast, edges, placeholder_diff, frozen):
+    """(score 0..1, flags) from one measure() row; frozen is the consecutive-frozen count."""
+    flags = []
+    exposure = min(1.0, brightness / 32.0, (255.0 - brightness) / 32.0)
+    if exposure < 0.5:
+        flags.append("dark" if brightness < 128 else "bright")
+    detail = min(1.0, contrast / 24.0, edges / 6.0)
+    if detail < 0.25:
+        flags.append("flat")
+    q = max(0.0, exposure) * detail
+    if placeholder_diff is not None and placeholder_diff < PLACEHOLDER_MATCH:
+        flags.append("placeholder")
+        q = 0.0
+    if frozen >= FROZEN_LIMIT:
+        flags.append("frozen")
+        q *= 0.25
+    return round(q, 3), flags
+
+
+def load_placeholders(directory=PLACEHOLDER_DIR):
+    out = []
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith((".jpg", ".jpeg", ".png")):
+                with open(os.path.join(directory, name), "rb") as f:
+                    s = sample(f.read())
+                if s:
+                    out.append(s)
+    return out
+
+
+def score_cams(state, cam_ids, placeholders=None, rescore=False):
+    """Score the new thumbnails of cam_ids into state (thumbnail_state.json entries); returns the count.
+
+    Files already scored are skipped unless rescore (e.g. after adding placeholders). Without
+    Pillow nothing is scored and cams keep their previous score.
+    """
+    if Image is None:
+        return 0
+    if placeholders is None:
+        placeholders = load_placeholders()
+    cam_ids = [str(c) for c in cam_ids]
+    times = thumb_pack.thumbnail_times()
+    done = 0
+    for start in range(0, len(cam_ids), BATCH):
+        ids, samples, new = [], [], []
+        for cam_id in cam_ids[start : start + BATCH]:
+            mtime = times.get(cam_id)
+            if mtime is None:
+                continue
+            is_new = state.get(cam_id, {}).get("luma_mtime") != mtime
+            if not (is_new or rescore):
+                continue
+            hit = thumb_pack.load_thumbnail(cam_id)
+            if hit is None:
+                continue
+            s = sample(hit[1])
+            if s:
+                ids.append(cam_id)
+                samples.append(s)
+                new.append(mtime if is_new else None)
+        previous = []
+        for cam_id, mtime in zip(ids, new):
+            luma = state.get(cam_id, {}).get("luma")
+            previous.append(base64.b64decode(luma) if luma and mtime else None)
+        for cam_id, s, mtime, row in zip(ids, samples, new, measure(samples, placeholders, previous)):
+            entry = state.setdefault(cam_id, {})
+            if mtime:  # a new capture: compare with the previous one (rescoring the same file keeps the count)
+                frozen = row[4] is not None and row[4] < FROZEN_MATCH
+                entry["frozen"] = entry.get("frozen", 0) + 1 if frozen else 0
+                entry["luma"] = base64.b64encode(s).decode("ascii")
+                entry["luma_mtime"] = mtime
+            entry["quality"], entry["quality_flags"] = score(row[0], row[1], row[2], row[3], entry.get("frozen", 0))
+            done += 1
+    return done
+
+
+def low_quality_ids(state):
+    """Cam ids whose latest thumbnail scored below QUALITY_MIN."""
+    return {cam_id for cam_id, e in state.items() if e.get("quality", 1.0) < QUALITY_MIN}
+
+
+def main():
+    import thumbnail_scraper
+
+    args = sys.argv[1:]
+    report = 0
+    i = 0
+    while i < len(args):
+        if args[i] == "--report" and i + 1 < len(args):
+            report = int(args[i + 1])
+            i += 1
+        elif args[i] == "--add-placeholder" and i + 1 < len(args):
+            hit = thumb_pack.load_thumbnail(args[i + 1])
+            if hit is None:
+                print("No thumbnail for cam %s." % args[i + 1], file=sys.stderr)
+                sys.exit(1)
+            os.makedirs(PLACEHOLDER_DIR, exist_ok=True)
+            name = "%s.%s" % (args[i + 1], thumb_pack.EXTENSIONS.get(hit[0], "jpg"))
+            with open(os.path.join(PLACEHOLDER_DIR, name), "wb") as f:
+                f.write(hit[1])
+            print("Added %s to %s." % (name, PLACEHOLDER_DIR))
+            return
+        i += 1
+    if Image is None:
+        print("Pillow is required to score thumbnails: pip install Pillow", file=sys.stderr)
+        sys.exit(1)
+
+    state = thumbnail_scraper.load_state()
+    placeholders = load_placeholders()
+    n = score_cams(state, sorted(thumbnail_scraper.existing_thumbnail_ids()), placeholders, rescore=True)
+    thumbnail_scraper.save_state(state)
+    listed = thumbnail_scraper.write_list_json(exclude=thumbnail_scraper.hidden_ids(state))
+    low = low_quality_ids(state)
+    counts = {}
+    for e in state.values():
+        for flag in e.get("quality_flags") or ():
+            counts[flag] = counts.get(flag, 0) + 1
+    print("Scored %d thumbnails (%d placeholder images); %d below %.2f, list.json has %d cams." % (
+        n, len(placeholders), len(low), QUALITY_MIN, len(listed)))
+    if counts:
+        print("Flags: " + ", ".join("%s %d" % kv for kv in sorted(counts.items())))
+    if report:
+        scored = sorted((e["quality"], cam_id, e.get("quality_flags")) for cam_id, e in state.items() if "quality" in e)
+        for q, cam_id, flags in scored[:report]:
+            print("%6.3f  %s  %s" % (q, cam_id, " ".join(flags or ())))
+
+
+if __name__ == "__main__":
+    main()
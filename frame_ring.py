@@ -0,0 +1,197 @@
+"""
+Per-camera frame history for server.py: the last RING_SECONDS of frames of every camera being
+relayed, kept in memory-mapped segment files so the server's heap stays flat. All viewers of a
+camera share its one ring.
+
+Each camera gets one fixed-size segment used as a circular log of records
+(timestamp, seq, head length, frame length, head bytes, frame bytes); "head" is the camera's
+own multipart part header, kept so a stored frame can be replayed into that camera's MJPEG
+stream. Segment files are unlinked as soon as they are mapped, so nothing is left on disk after
+a crash. FrameRingStore bounds the total: rings not written for RING_SECONDS are dropped, and
+once the segments fill the byte budget a new camera gets no ring (it is relayed unbuffered)
+rather than evicting one that is still being written.
+
+A ring has one writer at a time: every viewer of a camera runs its own fetch loop, but only the
+viewer holding the ring appends, so the history holds each frame once and replays at the
+camera's pace. Another viewer takes over when the writer leaves or stops appending for
+WRITER_TIMEOUT seconds.
+"""
+import collections
+import itertools
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+_RECORD = struct.Struct("<dIII")  # timestamp, seq, head_len, frame_len
+_names = itertools.count(1)
+# Seconds without an append after which another viewer may take over a ring's writer slot
+# (longer than the slowest snapshot poll interval).
+WRITER_TIMEOUT = 5.0
+
+
+class FrameRing:
+    """Circular frame log for one camera in an mmap'd segment of `capacity` bytes."""
+
+    def __init__(self, directory, capacity, seconds):
+        self.capacity = capacity
+        self.seconds = seconds
+        self.lock = threading.Lock()
+        self.index = collections.deque()  # (ts, seq, offset, head_len, frame_len), oldest first
+        self.pos = 0
+        self.seq = 0
+        self.content_type = None  # camera's multipart Content-Type, for replaying heads into its stream
+        self.last_write = time.monotonic()
+        self.writer = None  # viewer currently appending (see append)
+        self.writer_seen = 0.0
+        path = os.path.join(directory, "ring-%d-%d.seg" % (os.getpid(), next(_names)))
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(fd, capacity)
+            self.mm = mmap.mmap(fd, capacity)
+        finally:
+            os.close(fd)
+            os.unlink(path)
+
+    def close(self):
+        with self.lock:
+            self.index.clear()
+            self.mm.close()
+
+    def _expire(self, now):
+        cutoff = now - self.seconds
+        while self.index and self.index[0][0] < cutoff:
+            self.index.popleft()
+
+    def release(self, writer):
+        """Give up the writer slot if writer holds it (the viewer disconnected)."""
+        with self.lock:
+            if self.writer is writer:
+                self.writer = None
+
+    def append(self, frame, head=b"", writer=None):
+        """Store a frame (and its part header). Frames over a quarter of the segment are skipped.
+
+        With writer given, the frame is only stored if writer holds the ring's writer slot, which
+        it gets when the slot is free or its holder has not appended for WRITER_TIMEOUT seconds.
+        """
+        size = _RECORD.size + len(head) + len(frame)
+        if size > self.capacity // 4:
+            return
+        now = time.time()
+        with self.lock:
+            if self.mm.closed:
+                return
+            if writer is not None:
+                tick = time.monotonic()
+                if self.writer is not writer and self.writer is not None and tick - self.writer_seen < WRITER_TIMEOUT:
+                    return
+                self.writer = writer
+                self.writer_seen = tick
+            pos = self.pos
+            if pos + size > self.capacity:
+                # Wrap: the previous lap's records past pos are the oldest; drop them and restart at 0.
+                while self.index and self.index[0][2] >= pos:
+                    self.index.popleft()
+                pos = 0
+            end = pos + size
+            while self.index and pos <= self.index[0][2] < end:
+                self.index.popleft()
+            self.seq += 1
+            _RECORD.pack_into(self.mm, pos, now, self.seq, len(head), len(frame))
+            body = pos + _RECORD.size
+            self.mm[body : body + len(head)] = head
+            self.mm[body + len(head) : end] = frame
+            self.index.append((now, self.seq, pos, len(head), len(frame)))
+            self.pos = end
+            self._expire(now)
+            self.last_write = time.monotonic()
+
+    def _read(self, entry):
+        ts, seq, offset, head_len, frame_len = entry
+        body = offset + _RECORD.size
+        return bytes(self.mm[body : body + head_len]), bytes(self.mm[body + head_len : body + head_len + frame_len])
+
+    def latest(self, max_age=None, with_head=False):
+        """(ts, head, frame) of the newest frame (newest with a part header if with_head), or None."""
+        now = time.time()
+        with self.lock:
+            if self.mm.closed:
+                return None
+            self._expire(now)
+            for entry in reversed(self.index):
+                if max_age is not None and entry[0] < now - max_age:
+                    break
+                if with_head and not entry[3]:
+                    continue
+                head, frame = self._read(entry)
+                return (entry[0], head, frame)
+        return None
+
+    def entries_since(self, since):
+        """Index entries with timestamp >= since, oldest first (read them with read())."""
+        with self.lock:
+            return [e for e in self.index if e[0] >= since]
+
+    def read(self, entry):
+        """(head, frame) for an entry from entries_since, or None if it has been overwritten since."""
+        with self.lock:
+            if self.mm.closed or not self.index or entry[1] < self.index[0][1]:
+                return None
+            return self._read(entry)
+
+
+class FrameRingStore:
+    """Rings per camera key under a global byte budget (segment bytes = disk and page-cache footprint)."""
+
+    def __init__(self, directory=None, segment_bytes=8 * 1024 * 1024, budget_bytes=256 * 1024 * 1024, seconds=30):
+        self.directory = directory or tempfile.gettempdir()
+        self.segment_bytes = segment_bytes
+        self.max_rings = max(0, budget_bytes // segment_bytes)
+        self.seconds = seconds
+        self.rings = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.refused = 0  # ring() calls turned away because the budget was used up
+
+    def get(self, key):
+        """Existing ring for key (marked recently used), or None."""
+        with self.lock:
+            ring = self.rings.get(key)
+            if ring is not None:
+                self.rings.move_to_end(key)
+            return ring
+
+    def ring(self, key):
+        """Ring for key, creating it (after dropping idle rings) if the budget has room. None if disabled or full."""
+        if not self.max_rings:
+            return None
+        evicted = []
+        with self.lock:
+            ring = self.rings.get(key)
+            if ring is not None:
+                self.rings.move_to_end(key)
+                return ring
+            idle_before = time.monotonic() - self.seconds
+            for k in [k for k, r in self.rings.items() if r.last_write < idle_before]:
+                evicted.append(self.rings.pop(k))
+            if len(self.rings) >= self.max_rings:
+                # Every ring is in use: evicting one would cut another camera's history mid-relay.
+                self.refused += 1
+                ring = None
+            else:
+                try:
+                    ring = self.rings[key] = FrameRing(self.directory, self.segment_bytes, self.seconds)
+                except (OSError, ValueError) as e:
+                    print("[frame-ring] cannot map segment in %s: %s" % (self.directory, e))
+                    ring = None
+        for r in evicted:
+            r.close()
+        return ring
+
+    def stats(self):
+        with self.lock:
+            rings = list(self.rings.values())
+        return {"rings": len(rings), "frames": sum(len(r.index) for r in rings),
+                "segment_bytes": self.segment_bytes * len(rings), "refused": self.refused}
@@ -1,5 +1,13 @@
+import http.client
 import json
-import requests
+import urllib.error
+
+import http_pool
+import tcp_sweep
+
+# Cams are deleted from cams.json on failure, so the connect pre-sweep waits as long as the HTTP
+# check does: a slow host that takes 3 s to accept is kept, not dropped on the sweep's 2 s default.
+HTTP_TIMEOUT = 5
 
 
 def verify_database():
@@ -7,18 +15,27 @@ def verify_database():
     with open("cams.json", "r") as f:
         cams = json.load(f)
 
+    # Hosts that refuse or ignore a TCP connect are dropped without waiting out the HTTP timeout.
+    reachable = tcp_sweep.sweep_cams(cams, timeout=HTTP_TIMEOUT)
+
     active_cams = []
     for cam in cams:
+        ok, msg = reachable.get(cam.get("id"), (False, "invalid URL"))
+        if not ok:
+            print(f"[DROPPED] Node {cam['id']} — {msg}")
+            continue
         try:
-            res = requests.get(cam["url"], timeout=5, stream=True)
-            if res.status_code == 200:
+            with http_pool.urlopen(cam["url"], timeout=HTTP_TIMEOUT) as res:
+                status = res.getcode()
+            if status == 200:
                 active_cams.append(cam)
-                res.close()
             else:
                 print(
-                    f"[DROPPED] Node {cam['id']} offline (Status {res.status_code})"
+                    f"[DROPPED] Node {cam['id']} offline (Status {status})"
                 )
-        except requests.RequestException as e:
+        except urllib.error.HTTPError as e:
+            print(f"[DROPPED] Node {cam['id']} offline (Status {e.code})")
+        except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError) as e:
             print(f"[DROPPED] Node {cam['id']} — {e}")
 
     with open("cams.json", "w") as f:
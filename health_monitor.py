@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Background camera health monitor: keeps every camera's status / last_seen fresh without anyone
+running check_streams.py by hand.
+
+Cameras sit in a priority queue ordered by when they are next due. How soon a camera comes
+due again depends on:
+  visits     popular cams (CAM_VISITS) are re-checked up to HEALTH_INTERVAL / (1 + log2(1 + visits))
+  failures   a failed cam is re-checked after 60 s, 120 s, 240 s ... (back to the normal interval)
+  carousel   cams the frontend is about to show (/api/health-hint) are checked next
+Checks run on a fixed pool of HEALTH_CONCURRENCY threads (check_streams.check_url on the URL
+the live viewer uses). Results go to a CamHealthStore (SQLite) one row at a time; server.py
+overlays them on /cams.json, and --export writes them into cams.json.
+
+Run inside server.py (HEALTH_MONITOR=1) or standalone:
+  python3 health_monitor.py                 # monitor forever
+  python3 health_monitor.py --concurrency 16 --interval 900
+  python3 health_monitor.py --export        # write stored status/last_seen into cams.json and exit
+"""
+import concurrent.futures
+import heapq
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+import check_streams
+import shared_state
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMS_JSON = os.path.join(SCRIPT_DIR, "cams.json")
+HEALTH_DB = os.environ.get("HEALTH_DB") or os.path.join(SCRIPT_DIR, "cam_health.db")
+HEALTH_INTERVAL = float(os.environ.get("HEALTH_INTERVAL", "1800"))
+HEALTH_MIN_INTERVAL = 60.0
+HEALTH_CONCURRENCY = int(os.environ.get("HEALTH_CONCURRENCY", "8"))
+HEALTH_TIMEOUT = 8
+# Consecutive failed checks before a cam is marked OFFLINE.
+OFFLINE_AFTER = 3
+# Failed cams are re-checked after FAIL_RETRY * 2**(fails-1) seconds (capped at the normal interval).
+FAIL_RETRY = 60.0
+# How often cams.json is re-read and other processes' results / hints are picked up.
+RELOAD_EVERY = 60.0
+SYNC_EVERY = 5.0
+
+
+class HealthMonitor:
+    def __init__(self, store, cams_path=CAMS_JSON, visits=None, concurrency=HEALTH_CONCURRENCY,
+                 interval=HEALTH_INTERVAL, timeout=HEALTH_TIMEOUT):
+        self.store = store
+        self.cams_path = cams_path
+        self.visits = visits  # callable -> {cam_id: visits}
+        self.concurrency = max(1, concurrency)
+        self.interval = interval
+        self.timeout = timeout
+        self.urls = {}  # cam_id -> stored url
+        self.heap = []  # (due, cam_id)
+        self.due = {}  # cam_id -> due time of its live heap entry (older entries are stale)
+        self.in_flight = set()
+        self.checked = 0
+        self.cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._cams_mtime = None
+        self._visit_counts = {}
+        self._last_sync = 0.0
+
+    # --- scheduling ---
+
+    def _interval_for(self, cam_id, fails):
+        if fails:
+            return min(self.interval, FAIL_RETRY * 2 ** min(fails - 1, 10))
+        visits = self._visit_counts.get(cam_id, 0)
+        return max(HEALTH_MIN_INTERVAL, self.interval / (1.0 + math.log2(1.0 + visits)))
+
+    def _schedule(self, cam_id, due):
+        """Queue cam_id at due; an earlier pending entry for it wins. Caller holds cond."""
+        current = self.due.get(cam_id)
+        if current is not None and current <= due:
+            return
+        self.due[cam_id] = due
+        heapq.heappush(self.heap, (due, cam_id))
+        self.cond.notify_all()
+
+    def hint(self, cam_ids):
+        """Check these cams next (they are about to enter the carousel), unless checked in the last minute."""
+        now = time.time()
+        cam_ids = [str(c) for c in cam_ids]
+        rows = self.store.rows(cam_ids=cam_ids)
+        with self.cond:
+            for cam_id in cam_ids:
+                if cam_id in self.in_flight or cam_id not in self.urls:
+                    continue
+                if now - ((rows.get(cam_id) or {}).get("last_checked") or 0) >= HEALTH_MIN_INTERVAL:
+                    self._schedule(cam_id, now)
+
+    def _reload(self):
+        """Re-read cams.json (on change) and visit counts; queue new cams by their last check time."""
+        if self.visits is not None:
+            try:
+                self._visit_counts = {str(k): int(v) for k, v in self.visits().items()}
+            except Exception as e:
+                print("[health] visit counts unavailable: %s" % e)
+        try:
+            mtime = os.path.getmtime(self.cams_path)
+        except OSError:
+            return
+        if mtime == self._cams_mtime:
+            return
+        try:
+            with open(self.cams_path, "r", encoding="utf-8") as f:
+                cams = json.load(f)
+        except (OSError, ValueError) as e:
+            print("[health] cannot read %s: %s" % (self.cams_path, e))
+            return
+        self._cams_mtime = mtime
+        urls = {str(c.get("id")): (c.get("url") or "").strip().replace("&amp;", "&")
+                for c in cams if isinstance(c, dict) and c.get("id") is not None and not c.get("duplicate_of")}
+        rows = self.store.rows()
+        now = time.time()
+        with self.cond:
+            self.urls = urls
+            for cam_id in list(self.due):
+                if cam_id not in urls:
+                    del self.due[cam_id]
+            for cam_id in urls:
+                if cam_id in self.due:
+                    continue
+                row = rows.get(cam_id) or {}
+                last = row.get("last_checked") or 0
+                if last:
+                    due = last + self._interval_for(cam_id, row.get("fails") or 0)
+                else:
+                    # Never checked: spread the first pass over a few minutes instead of one burst.
+                    due = now + random.uniform(0, min(300.0, self.interval))
+                self._schedule(cam_id, due)
+
+    def _sync(self):
+        """Pick up results and hints written by other processes (proxy outcomes, /api/health-hint)."""
+        since = self._last_sync
+        self._last_sync = time.time()
+        changed = self.store.rows(updated_after=since - 1.0 if since else None)
+        if not since:
+            return
+        with self.cond:
+            for cam_id, row in changed.items():
+                if cam_id not in self.urls or cam_id in self.in_flight:
+                    continue
+                if (row.get("hinted") or 0) > (row.get("last_checked") or 0):
+                    self._schedule(cam_id, time.time())
+                elif row.get("fails"):
+                    self._schedule(cam_id, (row.get("last_checked") or 0) + self._interval_for(cam_id, row["fails"]))
+
+    # --- checking ---
+
+    def _check(self, cam_id, url):
+        try:
+            if url.startswith(("http://", "https://")):
+                ok, msg = check_streams.check_url(check_streams.get_live_stream_url(url), timeout=self.timeout)
+            else:
+                ok, msg = False, "invalid URL"
+            fails = self.store.record(cam_id, ok, msg, offline_after=OFFLINE_AFTER)
+        except Exception as e:
+            print("[health] check of %s failed: %s" % (cam_id, e))
+            fails = 1
+        with self.cond:
+            self.in_flight.discard(cam_id)
+            self.checked += 1
+            if cam_id in self.urls:
+                self._schedule(cam_id, time.time() + self._interval_for(cam_id, fails))
+            self.cond.notify_all()
+
+    def run(self):
+        self.store.init()
+        next_reload = next_sync = 0.0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="health") as pool:
+            while not self._stop.is_set():
+                now = time.time()
+                if now >= next_reload:
+                    self._reload()
+                    next_reload = now + RELOAD_EVERY
+                if now >= next_sync:
+                    self._sync()
+                    next_sync = now + SYNC_EVERY
+                with self.cond:
+                    while self.heap and len(self.in_flight) < self.concurrency:
+                        due, cam_id = self.heap[0]
+                        if self.due.get(cam_id) != due:
+                            heapq.heappop(self.heap)  # superseded entry
+                            continue
+                        if due > now:
+                            break
+                        heapq.heappop(self.heap)
+                        del self.due[cam_id]
+                        self.in_flight.add(cam_id)
+                        pool.submit(self._check, cam_id, self.urls[cam_id])
+                    wait = min(next_reload, next_sync) - now
+                    if self.heap and len(self.in_flight) < self.concurrency:
+                        wait = min(wait, self.heap[0][0] - now)
+                    self.cond.wait(timeout=max(0.05, wait))
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="health-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self.cond:
+            self.cond.notify_all()
+
+
+def merge_health(cams, rows):
+    """Copy stored status/last_seen onto cams (list of cams.json dicts); returns the number changed."""
+    changed = 0
+    for cam in cams:
+        row = rows.get(str(cam.get("id")))
+        if not row:
+            continue
+        for key in ("status", "last_seen"):
+            if row.get(key) and cam.get(key) != row[key]:
+                cam[key] = row[key]
+                changed += 1
+    return changed
+
+
+def export(store, cams_path=CAMS_JSON):
+    """Write stored health into cams.json (atomic replace)."""
+    with open(cams_path, "r", encoding="utf-8") as f:
+        cams = json.load(f)
+    changed = merge_health(cams, store.rows())
+    tmp = cams_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cams, f, indent=4, ensure_ascii=False)
+    os.replace(tmp, cams_path)
+    print("Updated %d fields in %s." % (changed, cams_path))
+
+
+def main():
+    args = sys.argv[1:]
+    concurrency = HEALTH_CONCURRENCY
+    interval = HEALTH_INTERVAL
+    do_export = False
+    i = 0
+    while i < len(args):
+        if args[i] == "--concurrency" and i + 1 < len(args):
+            concurrency = int(args[i + 1])
+            i += 1
+        elif args[i] == "--interval" and i + 1 < len(args):
+            interval = float(args[i + 1])
+            i += 1
+        elif args[i] == "--export":
+            do_export = True
+        i += 1
+
+    store = shared_state.CamHealthStore(HEALTH_DB)
+    store.init()
+    if do_export:
+        export(store)
+        return
+    visits_path = os.path.join(SCRIPT_DIR, "cam_visits.json")
+
+    def visits():
+        with open(visits_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    monitor = HealthMonitor(store, visits=visits if os.path.exists(visits_path) else None,
+                            concurrency=concurrency, interval=interval)
+    print("Health monitor: %d concurrent checks, base interval %ds, results in %s" % (concurrency, interval, HEALTH_DB))
+    monitor.start()
+    try:
+        while True:
+            time.sleep(60)
+            print("[health] %d checks done, %d queued, %d in flight" % (monitor.checked, len(monitor.due), len(monitor.in_flight)))
+    except KeyboardInterrupt:
+        monitor.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Shared HTTP client for camera hosts: per-host keep-alive connection pools.
+
+Snapshot polling in /stream-proxy and the one-frame fetches hit the same camera
+hosts over and over; reusing the TCP connection skips a handshake (often a slow
+residential RTT) on every poll. Used by server.py and the maintenance scripts.
+
+Tuning (environment):
+  HTTP_POOL_MAX_IDLE_PER_HOST   idle connections kept per host (default 4)
+  HTTP_POOL_MAX_HOSTS           hosts kept in the pool, least recently used evicted (default 256)
+  HTTP_POOL_IDLE_TIMEOUT        seconds an idle connection is kept before eviction (default 30)
+
+Usage:
+  with http_pool.urlopen(url, headers={"User-Agent": ...}, timeout=8) as resp:
+      body = resp.read(65536)
+
+Racing fetches pass one Cancel to each urlopen(); cancel.set() shuts down the losers' sockets,
+which unblocks their reads at once, and those connections are closed instead of pooled.
+"""
+import base64
+import collections
+import http.client
+import io
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+MAX_IDLE_PER_HOST = int(os.environ.get("HTTP_POOL_MAX_IDLE_PER_HOST", "4"))
+MAX_HOSTS = int(os.environ.get("HTTP_POOL_MAX_HOSTS", "256"))
+IDLE_TIMEOUT = float(os.environ.get("HTTP_POOL_IDLE_TIMEOUT", "30"))
+DEFAULT_TIMEOUT = 8
+MAX_REDIRECTS = 5
+
+# Avoid IDE/sandbox proxy env causing false 403 for camera hosts.
+NO_PROXY_OPENER = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+# Errors that mean a reused keep-alive connection was closed by the camera while idle.
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+
+_lock = threading.Lock()
+# (scheme, host, port) -> deque of (conn, released_at); most recently used host last.
+_idle = collections.OrderedDict()
+_last_sweep = 0.0
+
+
+def _host_key(parsed):
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    return (parsed.scheme, parsed.hostname or "", port)
+
+
+def _new_connection(key, timeout):
+    scheme, host, port = key
+    if scheme == "https":
+        return http.client.HTTPSConnection(host, port, timeout=timeout)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
+
+
+def _sweep(now):
+    """Close idle connections older than IDLE_TIMEOUT. Caller holds _lock."""
+    global _last_sweep
+    if now - _last_sweep < 1.0:
+        return []
+    _last_sweep = now
+    expired = []
+    for key in list(_idle):
+        conns = _idle[key]
+        while conns and now - conns[0][1] > IDLE_TIMEOUT:
+            expired.append(conns.popleft()[0])
+        if not conns:
+            del _idle[key]
+    return expired
+
+
+def _acquire(key, timeout):
+    """Return (conn, reused). Reuses the most recently released idle connection for this host."""
+    now = time.monotonic()
+    conn = None
+    with _lock:
+        expired = _sweep(now)
+        conns = _idle.get(key)
+        while conns:
+            candidate, released_at = conns.pop()
+            if now - released_at <= IDLE_TIMEOUT:
+                conn = candidate
+                break
+            expired.append(candidate)
+        if conns is not None and not conns:
+            del _idle[key]
+    for c in expired:
+        c.close()
+    if conn is None:
+        return _new_connection(key, timeout), False
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    return conn, True
+
+
+def _release(key, conn):
+    """Put a connection back in its host pool, or close it if the pool is full."""
+    if MAX_IDLE_PER_HOST <= 0 or MAX_HOSTS <= 0:
+        conn.close()
+        return
+    evicted = []
+    with _lock:
+        conns = _idle.get(key)
+        if conns is None:
+            conns = _idle[key] = collections.deque()
+        _idle.move_to_end(key)
+        if len(conns) < MAX_IDLE_PER_HOST:
+            conns.append((conn, time.monotonic()))
+        else:
+            evicted.append(conn)
+        while len(_idle) > MAX_HOSTS:
+            _, old = _idle.popitem(last=False)
+            evicted.extend(c for c, _ in old)
+    for c in evicted:
+        c.close()
+
+
+def close_all():
+    """Close every idle pooled connection (e.g. at shutdown or between benchmark runs)."""
+    with _lock:
+        conns = [c for q in _idle.values() for c, _ in q]
+        _idle.clear()
+    for c in conns:
+        c.close()
+
+
+def pool_stats():
+    """Return {"hosts": N, "idle": M} for the debug/stats endpoints."""
+    with _lock:
+        return {"hosts": len(_idle), "idle": sum(len(q) for q in _idle.values())}
+
+
+class Cancel:
+    """Event-like (set/is_set) handle that aborts the urlopen() calls it was passed to, from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._set = False
+        self._conns = {}  # connection -> its socket
+
+    def is_set(self):
+        return self._set
+
+    def set(self):
+        with self._lock:
+            self._set = True
+            socks, self._conns = list(self._conns.values()), {}
+        for sock in socks:
+            _shutdown(sock)
+
+    def _track(self, conn):
+        """Register a connected connection; shuts it down at once if already cancelled."""
+        # The socket itself is kept: http.client drops conn.sock once a "Connection: close" response
+        # starts, but the response goes on reading from the same socket.
+        with self._lock:
+            if not self._set:
+                self._conns[conn] = conn.sock
+                return
+        _shutdown(conn.sock)
+
+    def _untrack(self, conn):
+        with self._lock:
+            self._conns.pop(conn, None)
+
+
+def _shutdown(sock):
+    """Wake any thread blocked reading sock (its read returns EOF / fails)."""
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class PooledResponse:
+    """File-like response (read/readinto/headers/getcode) that returns its connection to the pool on close."""
+
+    def __init__(self, url, key, conn, resp, cancel=None):
+        self.url = url
+        self.status = resp.status
+        self.reason = resp.reason
+        self.headers = resp.msg
+        self._key = key
+        self._conn = conn
+        self._resp = resp
+        self._cancel = cancel
+
+    def getcode(self):
+        return self.status
+
+    def read(self, amt=None):
+        if self._resp is None:
+            return b""
+        if amt is None or amt < 0:
+            return self._resp.read()
+        return self._resp.read(amt)
+
+    def read1(self, amt=-1):
+        if self._resp is None:
+            return b""
+        return self._resp.read1(amt)
+
+    def readinto(self, b):
+        if self._resp is None:
+            return 0
+        return self._resp.readinto(b)
+
+    def readinto1(self, b):
+        """Like read1 into a caller's buffer: returns whatever has arrived (at most one socket read), 0 at EOF."""
+        resp = self._resp
+        if resp is None:
+            return 0
+        if resp.fp is None or resp.chunked or resp.length is not None:
+            data = resp.read1(len(b))
+            b[: len(data)] = data
+            return len(data)
+        # Body delimited by connection close (MJPEG streams): straight from the socket buffer, no bytes object.
+        return resp.fp.readinto1(b)
+
+    def fileno(self):
+        return self._conn.sock.fileno() if self._conn is not None and self._conn.sock is not None else -1
+
+    def close(self):
+        resp, conn = self._resp, self._conn
+        self._resp = self._conn = None
+        if conn is None:
+            return
+        if self._cancel is not None:
+            self._cancel._untrack(conn)
+        # Only a fully consumed, non-"Connection: close" response leaves the socket reusable;
+        # a cancelled one may have been shut down mid-read and is never pooled.
+        if resp.isclosed() and not resp.will_close and not (self._cancel is not None and self._cancel.is_set()):
+            _release(self._key, conn)
+        else:
+            resp.close()
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def _request(conn, path, headers, cancel):
+    """GET on conn, tracked by cancel (if any) from connect on so a cancel unblocks the wait for headers."""
+    if cancel is not None:
+        if conn.sock is None:
+            conn.connect()
+        cancel._track(conn)
+        if cancel.is_set():
+            raise urllib.error.URLError("cancelled")
+    conn.request("GET", path, headers=headers)
+    return conn.getresponse()
+
+
+def _send(key, path, headers, timeout, cancel=None):
+    """Send GET on a pooled connection; retry once on a fresh connection if a reused one was stale."""
+    conn, reused = _acquire(key, timeout)
+    try:
+        return conn, _request(conn, path, headers, cancel)
+    except _STALE_ERRORS:
+        _discard(conn, cancel)
+        if not reused or (cancel is not None and cancel.is_set()):
+            raise
+    except Exception:
+        _discard(conn, cancel)
+        raise
+    conn = _new_connection(key, timeout)
+    try:
+        return conn, _request(conn, path, headers, cancel)
+    except Exception:
+        _discard(conn, cancel)
+        raise
+
+
+def _discard(conn, cancel):
+    if cancel is not None:
+        cancel._untrack(conn)
+    conn.close()
+
+
+def urlopen(url, headers=None, timeout=DEFAULT_TIMEOUT, max_redirects=MAX_REDIRECTS, cancel=None):
+    """
+    GET url over a pooled keep-alive connection (no proxy). Follows redirects.
+    Returns a PooledResponse; raises urllib.error.HTTPError for 4xx/5xx and
+    urllib.error.URLError for bad URLs, like urllib.request.urlopen.
+    cancel (a Cancel) aborts the request or its body reads from another thread.
+    """
+    headers = dict(headers or {})
+    for _ in range(max_redirects + 1):
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise urllib.error.URLError("unsupported URL: %s" % url)
+        key = _host_key(parsed)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+        if parsed.username or parsed.password:
+            cred = "%s:%s" % (urllib.parse.unquote(parsed.username or ""), urllib.parse.unquote(parsed.password or ""))
+            headers["Authorization"] = "Basic " + base64.b64encode(cred.encode("utf-8")).decode("ascii")
+        conn, resp = _send(key, path, headers, timeout, cancel)
+        pooled = PooledResponse(url, key, conn, resp, cancel)
+        location = resp.getheader("Location")
+        if resp.status in (301, 302, 303, 307, 308) and location:
+            # Drain small redirect bodies so the connection can go back to the pool.
+            try:
+                resp.read(65536)
+            except Exception:
+                pass
+            pooled.close()
+            url = urllib.parse.urljoin(url, location)
+            if _host_key(urllib.parse.urlsplit(url)) != key:
+                # Like urllib/requests: credentials never follow a redirect to another scheme, host or port.
+                headers = {k: v for k, v in headers.items() if k.lower() != "authorization"}
+            continue
+        if resp.status >= 400:
+            try:
+                body = resp.read(65536)
+            except Exception:
+                body = b""
+            pooled.close()
+            raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.msg, io.BytesIO(body))
+        return pooled
+    raise urllib.error.HTTPError(url, 310, "Too many redirects", None, None)
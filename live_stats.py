@@ -0,0 +1,129 @@
+"""
+Live per-camera stats pushed to browsers over Server-Sent Events (/api/live in server.py).
+
+A browser opens one EventSource for the cams it shows or is about to show. One LiveHub thread
+per process snapshots the stats of every watched cam: visits, thumbs votes, live viewers and
+health status. It sends each subscriber only the cams whose stats changed. Snapshots run
+every LIVE_INTERVAL seconds, and sooner after a local nudge() such as a visit or a vote. So
+many changes to one cam between snapshots reach the browser as one update, and a batch
+covers several cams. Snapshots read the shared stores, so with WORKERS a vote counted by
+one worker also reaches subscribers on the other workers. Each subscriber thread sleeps on its
+own Event, and subscribers are indexed by cam, so an update wakes only the threads watching
+that cam.
+"""
+import threading
+import time
+
+# Seconds between snapshots of the watched cams (and the most a pushed update is delayed).
+LIVE_INTERVAL = 1.0
+# A nudge() waits this long so a burst of changes goes out as one batch.
+LIVE_NUDGE_DELAY = 0.2
+
+
+class Subscription:
+    """Changes pending for one client: {cam_id: stats}, collected by next_batch()."""
+
+    def __init__(self, hub, cam_ids):
+        self.hub = hub
+        self.cam_ids = frozenset(cam_ids)
+        self.pending = {}  # guarded by hub.lock
+        self.closed = False
+        self.ready = threading.Event()  # set when pending has something or the subscription closed
+
+    def next_batch(self, timeout):
+        """{cam_id: stats} changed since the last call; {} after timeout (send a keep-alive)."""
+        self.ready.wait(timeout)
+        with self.hub.lock:
+            batch, self.pending = self.pending, {}
+            if not self.closed:
+                self.ready.clear()
+        return batch
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class LiveHub:
+    """snapshot(cam_ids) -> {cam_id: stats dict}; a change in any value is pushed to the cam's subscribers."""
+
+    def __init__(self, snapshot, interval=LIVE_INTERVAL):
+        self.snapshot = snapshot
+        self.interval = interval
+        self.lock = threading.Lock()  # subscriptions, their pending batches and last
+        self.cond = threading.Condition(self.lock)  # wakes the snapshot thread only (nudge)
+        self.subs = set()
+        self.by_cam = {}  # cam_id -> set of subscriptions watching it
+        self.last = {}  # cam_id -> stats last pushed
+        self.nudged = False
+        self.thread = None
+        self.pushed = 0
+
+    def subscribe(self, cam_ids):
+        """Subscription whose first batch is the current stats of cam_ids."""
+        sub = Subscription(self, cam_ids)
+        current = self.snapshot(sub.cam_ids)
+        with self.cond:
+            self.subs.add(sub)
+            for cam_id in sub.cam_ids:
+                self.by_cam.setdefault(cam_id, set()).add(sub)
+            for cam_id, stats in current.items():
+                self.last.setdefault(cam_id, stats)
+            sub.pending = dict(current)
+            sub.ready.set()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="live-stats", daemon=True)
+                self.thread.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.cond:
+            sub.closed = True
+            sub.ready.set()
+            if sub in self.subs:
+                self.subs.discard(sub)
+                for cam_id in sub.cam_ids:
+                    watchers = self.by_cam.get(cam_id)
+                    watchers.discard(sub)
+                    if not watchers:
+                        del self.by_cam[cam_id]
+            if not self.subs:
+                self.last.clear()
+
+    def nudge(self):
+        """Something changed locally: snapshot soon instead of at the next interval."""
+        with self.cond:
+            self.nudged = True
+            self.cond.notify_all()
+
+    def subscribers(self):
+        with self.cond:
+            return len(self.subs)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.nudged, timeout=self.interval)
+                nudged, self.nudged = self.nudged, False
+                watched = set(self.by_cam)
+            if not watched:
+                continue
+            if nudged:
+                time.sleep(LIVE_NUDGE_DELAY)
+            try:
+                current = self.snapshot(watched)
+            except Exception as e:
+                print("[live] snapshot failed: %s" % e)
+                time.sleep(self.interval)
+                continue
+            with self.cond:
+                changed = {c: s for c, s in current.items() if self.last.get(c) != s}
+                # Forget cams nobody watches any more.
+                self.last = {c: s for c, s in self.last.items() if c in watched}
+                self.last.update(changed)
+                if not changed:
+                    continue
+                for cam_id, stats in changed.items():
+                    for sub in self.by_cam.get(cam_id, ()):
+                        sub.pending[cam_id] = stats
+                        sub.ready.set()
+                        self.pushed += 1
@@ -0,0 +1,256 @@
+"""
+End-to-end load test for a running server.py: replays the request mix app.js produces and
+reports throughput, p50/p95/p99 latency and error rate per route as JSON.
+
+Each virtual viewer runs the app.js flow:
+  landing   GET /cams.json + GET /api/thumbnail-ids (once per session)
+  carousel  GET /feed-proxy?url=<cam>&single=1, then updateNodeHUD's
+            GET /api/cam-visit + GET /api/cam-thumbs
+  matrix    burst of MATRIX_SIZE GET /thumbnails/{id}.jpg (every --matrix-every carousel steps)
+  live      GET /stream-proxy?url=<cam>, held open for --stream-seconds (with probability --stream-prob)
+
+Concurrency ramps through --stages (viewers per stage), each held for --stage-seconds.
+Cam choice is seeded (--seed) so runs are comparable between commits. Pair with cam_sim.py
+to run against simulated cameras: start cam_sim.py, then server.py with that cams.json.
+
+Usage:
+  python3 load_test.py --base-url http://localhost:8081
+  python3 load_test.py --stages 1,10,50,100 --stage-seconds 30 --out load_report.json
+"""
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+import http_pool
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASE_URL = "http://localhost:8081"
+DEFAULT_STAGES = [1, 5, 10, 25, 50]
+DEFAULT_STAGE_SECONDS = 20
+MATRIX_SIZE = 24  # same as app.js
+REQUEST_TIMEOUT = 30
+USER_AGENT = "Mozilla/5.0 (compatible; UPLINK_SITE load test)"
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (None if empty)."""
+    if not sorted_values:
+        return None
+    k = max(0, math.ceil(pct / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+class Recorder:
+    """Thread-safe per-route samples: (latency seconds, ok, bytes)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, route, latency, ok, nbytes=0):
+        with self.lock:
+            self.samples.setdefault(route, []).append((latency, ok, nbytes))
+
+    def report(self, duration):
+        routes = {}
+        all_lat = []
+        all_err = []
+        total = errors = total_bytes = 0
+        with self.lock:
+            items = list(self.samples.items())
+        for route, samples in sorted(items):
+            lat = sorted(s[0] for s in samples if s[1])
+            err_lat = sorted(s[0] for s in samples if not s[1])
+            nbytes = sum(s[2] for s in samples)
+            routes[route] = _summary(lat, err_lat, len(samples), nbytes, duration)
+            all_lat.extend(lat)
+            all_err.extend(err_lat)
+            total += len(samples)
+            errors += len(err_lat)
+            total_bytes += nbytes
+        all_lat.sort()
+        all_err.sort()
+        return {"routes": routes, "total": _summary(all_lat, all_err, total, total_bytes, duration)}
+
+
+def _summary(lat, err_lat, count, nbytes, duration):
+    """Latency percentiles of the successes; errors (timeouts included) get their own err_p95/err_p99."""
+    errors = len(err_lat)
+    ms = lambda v: round(v * 1000.0, 2) if v is not None else None
+    return {
+        "count": count,
+        "errors": errors,
+        "error_rate": round(errors / float(count), 4) if count else 0.0,
+        "rps": round(count / duration, 2) if duration > 0 else 0.0,
+        "p50_ms": ms(percentile(lat, 50)),
+        "p95_ms": ms(percentile(lat, 95)),
+        "p99_ms": ms(percentile(lat, 99)),
+        "mean_ms": ms(sum(lat) / len(lat)) if lat else None,
+        "err_p95_ms": ms(percentile(err_lat, 95)),
+        "err_p99_ms": ms(percentile(err_lat, 99)),
+        "bytes": nbytes,
+    }
+
+
+class LoadTest:
+    def __init__(self, base_url, stream_seconds=10.0, stream_prob=0.05, matrix_every=10, think=0.5, seed=1):
+        self.base_url = base_url.rstrip("/")
+        self.stream_seconds = stream_seconds
+        self.stream_prob = stream_prob
+        self.matrix_every = matrix_every
+        self.think = think
+        self.seed = seed
+        self.cams = []
+        self.thumb_ids = []
+
+    def _get(self, rec, route, path, hold=None):
+        """GET path; record latency (time to first body bytes for streams). Returns body bytes or None."""
+        start = time.monotonic()
+        try:
+            with http_pool.urlopen(self.base_url + path, headers={"User-Agent": USER_AGENT}, timeout=REQUEST_TIMEOUT) as resp:
+                if hold is None:
+                    body = resp.read()
+                    rec.add(route, time.monotonic() - start, True, len(body))
+                    return body
+                # Long-lived stream: latency = time to first chunk; then relay until hold expires.
+                first = resp.read1(65536)
+                if not first:
+                    rec.add(route, time.monotonic() - start, False)
+                    return None
+                ttfb = time.monotonic() - start
+                nbytes = len(first)
+                end = start + hold
+                while time.monotonic() < end:
+                    chunk = resp.read1(65536)
+                    if not chunk:
+                        break
+                    nbytes += len(chunk)
+                rec.add(route, ttfb, True, nbytes)
+                return first
+        except Exception:
+            rec.add(route, time.monotonic() - start, False)
+            return None
+
+    def load_catalog(self):
+        rec = Recorder()
+        body = self._get(rec, "/cams.json", "/cams.json")
+        self.cams = [c for c in json.loads(body or b"[]") if isinstance(c, dict) and c.get("url")]
+        ids = self._get(rec, "/api/thumbnail-ids", "/api/thumbnail-ids")
+        self.thumb_ids = [str(i) for i in json.loads(ids or b"[]")]
+        if not self.cams:
+            raise SystemExit("No cams from %s/cams.json; is the server running?" % self.base_url)
+
+    def viewer(self, n, rec, stop):
+        rng = random.Random(self.seed * 100003 + n)
+        self._get(rec, "/cams.json", "/cams.json")
+        self._get(rec, "/api/thumbnail-ids", "/api/thumbnail-ids")
+        step = 0
+        while not stop.is_set():
+            cam = rng.choice(self.cams)
+            url = cam["url"] + ("&" if "?" in cam["url"] else "?") + "t=%d" % int(time.time() * 1000)
+            self._get(rec, "/feed-proxy", "/feed-proxy?url=" + urllib.parse.quote(url, safe="") + "&single=1")
+            cam_id = urllib.parse.quote(str(cam.get("id", "")))
+            self._get(rec, "/api/cam-visit", "/api/cam-visit?cam_id=" + cam_id)
+            self._get(rec, "/api/cam-thumbs", "/api/cam-thumbs?cam_id=" + cam_id)
+            step += 1
+            if self.thumb_ids and self.matrix_every and step % self.matrix_every == 0:
+                for tid in rng.sample(self.thumb_ids, min(MATRIX_SIZE, len(self.thumb_ids))):
+                    self._get(rec, "/thumbnails", "/thumbnails/%s.jpg" % tid)
+            if rng.random() < self.stream_prob:
+                self._get(rec, "/stream-proxy", "/stream-proxy?url=" + urllib.parse.quote(cam["url"], safe=""),
+                          hold=self.stream_seconds)
+            stop.wait(self.think * (0.5 + rng.random()))
+
+    def run_stage(self, concurrency, seconds):
+        rec = Recorder()
+        stop = threading.Event()
+        threads = [threading.Thread(target=self.viewer, args=(n, rec, stop), daemon=True) for n in range(concurrency)]
+        start = time.monotonic()
+        for t in threads:
+            t.start()
+        stop.wait(seconds)
+        stop.set()
+        for t in threads:
+            t.join(timeout=REQUEST_TIMEOUT + self.stream_seconds)
+        duration = time.monotonic() - start
+        result = rec.report(duration)
+        result["concurrency"] = concurrency
+        result["duration_s"] = round(duration, 2)
+        return result
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    base_url = DEFAULT_BASE_URL
+    stages = DEFAULT_STAGES
+    stage_seconds = DEFAULT_STAGE_SECONDS
+    out_path = None
+    opts = {"stream_seconds": 10.0, "stream_prob": 0.05, "matrix_every": 10, "think": 0.5, "seed": 1}
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "--base-url" and i + 1 < len(args):
+            base_url = args[i + 1]
+            i += 1
+        elif a == "--stages" and i + 1 < len(args):
+            stages = [int(x) for x in args[i + 1].split(",") if x.strip()]
+            i += 1
+        elif a == "--stage-seconds" and i + 1 < len(args):
+            stage_seconds = float(args[i + 1])
+            i += 1
+        elif a == "--out" and i + 1 < len(args):
+            out_path = args[i + 1]
+            i += 1
+        elif a.startswith("--") and a[2:].replace("-", "_") in opts and i + 1 < len(args):
+            key = a[2:].replace("-", "_")
+            opts[key] = type(opts[key])(args[i + 1])
+            i += 1
+        i += 1
+
+    lt = LoadTest(base_url, **opts)
+    lt.load_catalog()
+    print("Load test against %s: %d cams, %d thumbnails, stages %s x %ss" % (
+        base_url, len(lt.cams), len(lt.thumb_ids), stages, stage_seconds), file=sys.stderr)
+    report = {
+        "meta": {
+            "git": git_revision(),
+            "base_url": base_url,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "stage_seconds": stage_seconds,
+            "options": opts,
+            "cams": len(lt.cams),
+        },
+        "stages": [],
+    }
+    for concurrency in stages:
+        result = lt.run_stage(concurrency, stage_seconds)
+        report["stages"].append(result)
+        fp = result["routes"].get("/feed-proxy", {})
+        print("  %4d viewers: %7.1f req/s  /feed-proxy p95=%s ms  errors=%.1f%%" % (
+            concurrency, result["total"]["rps"], fp.get("p95_ms"), 100 * result["total"]["error_rate"]), file=sys.stderr)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print("Wrote %s" % out_path, file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Per-camera reliability from the proxy's own fetches, and a carousel order weighted by it.
+
+Every /feed-proxy fetch (and background revalidation) reports whether a frame came back and how
+long the first frame took. ReliabilityTracker keeps a rolling success rate and time-to-first-frame
+per camera. Both are exponentially weighted, so a camera that recovers climbs back within a few
+fetches. A camera's weight is its success rate times a speed factor. order() draws a random
+sequence where each camera comes earlier with higher weight (weighted sampling without
+replacement). Unreliable cameras are still shown, just mostly later. Cameras not fetched yet
+get PRIOR_SUCCESS, or a low prior when the health monitor has them OFFLINE.
+
+The stats are saved to a JSON file every `interval` seconds and loaded at startup, so a restart
+keeps them. With WORKERS each worker tracks its own fetches; a save merges with the file under
+a lock file (the most recently fetched entry per camera wins) and adopts the other workers'
+newer entries, so every worker's order() sees every camera's fetches within one interval.
+"""
+import fcntl
+import json
+import os
+import random
+import threading
+import time
+
+# Weight of the newest fetch in the rolling averages.
+ALPHA = 0.25
+# Success rate assumed for a camera with no fetches yet (and for one the health monitor has OFFLINE).
+PRIOR_SUCCESS = 0.6
+PRIOR_OFFLINE = 0.1
+# Time-to-first-frame (seconds) at which the speed factor is 0.5; it is 1 / (1 + ttff / TTFF_REF).
+TTFF_REF = 2.0
+# Every camera keeps at least this weight so none disappears from the carousel for good.
+MIN_WEIGHT = 0.02
+
+
+class ReliabilityTracker:
+    def __init__(self, path, interval=60.0):
+        self.path = path
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.stats = {}  # cam_id -> [success rate, ttff seconds or None, fetches, last fetch time]
+        self.dirty = False
+
+    def record(self, cam_id, ok, seconds=None, now=None):
+        """Count one fetch of cam_id; seconds is the time to its first frame (successes only)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            s = self.stats.get(cam_id)
+            if s is None:
+                s = self.stats[cam_id] = [PRIOR_SUCCESS, None, 0, now]
+            s[0] += ALPHA * ((1.0 if ok else 0.0) - s[0])
+            if ok and seconds is not None:
+                s[1] = seconds if s[1] is None else s[1] + ALPHA * (seconds - s[1])
+            s[2] += 1
+            s[3] = now
+            self.dirty = True
+
+    def weight(self, cam_id, offline=False):
+        with self.lock:
+            s = self.stats.get(cam_id)
+        if s is None:
+            return PRIOR_OFFLINE if offline else PRIOR_SUCCESS * 0.5
+        speed = 0.5 if s[1] is None else 1.0 / (1.0 + s[1] / TTFF_REF)
+        return max(MIN_WEIGHT, s[0] * speed)
+
+    def order(self, cam_ids, offline=(), rng=random):
+        """cam_ids shuffled so that heavier cams tend to come first: sort by u ** (1 / weight), u uniform."""
+        keyed = []
+        for cam_id in cam_ids:
+            w = self.weight(cam_id, cam_id in offline)
+            keyed.append((rng.random() ** (1.0 / w), cam_id))
+        keyed.sort(reverse=True)
+        return [cam_id for _, cam_id in keyed]
+
+    def summary(self, cam_ids=None):
+        """{cam_id: {"success", "ttff", "fetches", "weight"}} for the cams with fetches."""
+        with self.lock:
+            items = [(c, list(s)) for c, s in self.stats.items() if cam_ids is None or c in cam_ids]
+        return {c: {"success": round(s[0], 3), "ttff": None if s[1] is None else round(s[1], 3),
+                    "fetches": s[2], "weight": round(self.weight(c), 4)} for c, s in items}
+
+    def load(self):
+        """Adopt the saved stats of every camera whose saved last fetch is newer than ours."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        with self.lock:
+            for cam_id, s in (data if isinstance(data, dict) else {}).items():
+                if isinstance(s, list) and len(s) == 4:
+                    mine = self.stats.get(str(cam_id))
+                    if mine is None or s[3] > mine[3]:
+                        self.stats[str(cam_id)] = s
+        return len(self.stats)
+
+    def save(self):
+        """Merge the stats into self.path if they changed since the last save."""
+        with self.lock:
+            if not self.dirty:
+                return False
+            self.dirty = False
+        try:
+            with open(self.path + ".lock", "a") as lock:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)  # released when the file is closed
+                self.load()
+                with self.lock:
+                    data = json.dumps(self.stats)
+                tmp = "%s.tmp.%d" % (self.path, os.getpid())
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp, self.path)
+        except OSError as e:
+            print("[reliability] save failed: %s" % e)
+            return False
+        return True
+
+    def start(self):
+        """Save every `interval` seconds in a daemon thread."""
+        def run():
+            while True:
+                time.sleep(self.interval)
+                self.save()
+
+        threading.Thread(target=run, name="reliability", daemon=True).start()
+        return self
@@ -7,20 +7,24 @@ set -e
 cd "$(dirname "$0")/.."
 ADD="${1:-100}"
 
-echo "=== 1/4 Scrape up to $ADD new cameras (no duplicates) ==="
+echo "=== 1/5 Scrape up to $ADD new cameras (no duplicates) ==="
 python3 uplink_scrape.py --add "$ADD"
 
 echo ""
-echo "=== 2/4 Backfill locations (ipinfo) ==="
+echo "=== 2/5 Backfill locations (ipinfo) ==="
 python3 backfill_locations.py --delay 0.6
 
 echo ""
-echo "=== 3/4 Check streams and remove no-signal cams ==="
+echo "=== 3/5 Check streams and remove no-signal cams ==="
 python3 check_streams.py --remove
 
 echo ""
-echo "=== 4/4 Grab thumbnails for cams that don't have one ==="
+echo "=== 4/5 Grab thumbnails for cams that don't have one ==="
 python3 thumbnail_scraper.py
 
+echo ""
+echo "=== 5/5 Export the thumbnail pack to thumbnails/ (the pack is not committed) ==="
+python3 thumb_pack.py --export
+
 echo ""
 echo "Done. New cams added, locations fixed, dead streams removed, thumbnails updated."
@@ -3,16 +3,41 @@ UPLINK_SITE server: serves static files and /snapshot-proxy for SNAPSHOT capture
 Run: python3 server.py
 Then open http://localhost:8080
 """
+import collections
 import http.server
 import hashlib
+import hmac
+import io
+import itertools
 import json
 import os
 import re
 import shutil
+import signal
+import socket
 import socketserver
+import sys
+import threading
 import time as _t
 import urllib.parse
-import urllib.request
+
+import admission
+import cam_catalog
+import frame_cache
+import frame_ring
+import health_monitor
+import http_pool
+import live_stats
+import reliability
+import shared_state
+import stack_sampler
+import thumb_pack
+import weather
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow not installed: /stream-proxy profiles only cap fps, no downscale/re-encode
+    Image = None
 
 PORT = int(os.environ.get("PORT", "8081"))
 # One-frame timeout: avoid long-lived streams so Railway doesn't overload (concurrent connection limit).
@@ -20,9 +45,51 @@ FEED_PROXY_TIMEOUT = 8
 # Snapshot button in live viewer: longer timeout so slow streams can deliver one frame.
 SNAPSHOT_FRAME_TIMEOUT = 18
 FEED_PROXY_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+# Hedged frame fetch: start the next URL variant if no frame after this many seconds.
+FRAME_HEDGE_DELAY = 0.5
+# When a winning variant is remembered, give it this long before hedging with the others.
+FRAME_WINNER_GRACE = 2.0
+# Remembered winning URL variant per camera (stored URL without cache-buster -> variant URL). LRU-bounded.
+FRAME_URL_WINNERS = collections.OrderedDict()
+FRAME_URL_WINNERS_MAX = 5000
+FRAME_URL_WINNERS_LOCK = threading.Lock()
+# Query params the frontend and stream-proxy add as cache-busters; ignored when keying a camera.
+CACHE_BUSTER_PARAMS = ("t", "_t", "_", "COUNTER")
+# /stream-proxy?max_fps=&max_width=&quality=: one upstream + encoder per (camera, profile), shared by its viewers.
+# Viewers are served on their own request threads (threaded server), so several can attach at once.
+PROFILE_STREAMS = {}
+PROFILE_STREAMS_LOCK = threading.Lock()
+# A profile stream with no viewers for this long closes its upstream.
+PROFILE_IDLE_GRACE = 5.0
+# Viewer gives up if its profile stream produces no frame for this long.
+PROFILE_FRAME_TIMEOUT = 20.0
+PROFILE_MAX_FPS = 30.0
+PROFILE_MAX_WIDTH = 4096
+PROFILE_DEFAULT_QUALITY = 70
+# MJPEG relay buffer: starts at RELAY_MIN_BUF, doubles while frames overflow it, halves when frames stay small.
+RELAY_MIN_BUF = 16 * 1024
+RELAY_MAX_BUF = 512 * 1024
+# Frame history per relayed camera (mmap'd segments): new /stream-proxy viewers get the latest frame at once,
+# /replay streams the last RING_SECONDS. RING_BUDGET_MB caps all segments together (0 disables).
+RING_SECONDS = int(os.environ.get("RING_SECONDS", "30"))
+RING_SEGMENT_MB = int(os.environ.get("RING_SEGMENT_MB", "8"))
+RING_BUDGET_MB = int(os.environ.get("RING_BUDGET_MB", "256"))
+FRAME_RINGS = frame_ring.FrameRingStore(
+    os.environ.get("RING_DIR") or None, RING_SEGMENT_MB * 1024 * 1024, RING_BUDGET_MB * 1024 * 1024, RING_SECONDS)
+# Snapshot-only cameras are polled at most this often.
+SNAPSHOT_POLL_INTERVAL = 0.5
+# While a snapshot camera keeps returning the same picture, the poll interval doubles up to this.
+SNAPSHOT_MAX_POLL_INTERVAL = 4.0
+# Unchanged frames are not re-sent, except once per this many seconds so the client stream stays alive.
+SNAPSHOT_KEEPALIVE = 10.0
+# Frames whose 16x12 luma thumbnails differ by at most this mean (0-255) count as unchanged (clock overlays, noise).
+SNAPSHOT_LUMA_THRESHOLD = 2.0
 
 # Per-cam visit counts: cam_id -> total visits. Persisted to cam_visits.json.
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMS_JSON_PATH = os.path.join(SCRIPT_DIR, "cams.json")
+# cam id -> url (and camera key -> id) from cams.json, for endpoints addressed by cam_id (/replay) or url.
+CAM_URLS_BY_ID = {"mtime": None, "urls": {}, "ids": {}}
 CAM_VISITS_PATH = os.path.join(SCRIPT_DIR, "cam_visits.json")
 CAM_VISITS = {}
 
@@ -30,35 +97,647 @@ CAM_VISITS = {}
 CAM_THUMBS_PATH = os.path.join(SCRIPT_DIR, "cam_thumbs.json")
 CAM_THUMBS = {}
 
+# Pre-fork mode: WORKERS processes share the port via SO_REUSEPORT; a supervisor restarts crashed workers.
+WORKERS = int(os.environ.get("WORKERS", "1"))
+# Visits/thumbs go to this SQLite file when set (always used with WORKERS > 1 so counts are shared).
+STATE_DB_PATH = os.environ.get("STATE_DB") or (os.path.join(SCRIPT_DIR, "cam_stats.db") if WORKERS > 1 else "")
+SHARED_COUNTERS = None
+# Supervisor: a worker that dies within this many seconds of starting counts as crash-looping (restart backoff).
+WORKER_MIN_UPTIME = 5.0
+
+# Last /feed-proxy frame per camera (frame_cache.py), snapshotted to FRAME_CACHE_PATH every
+# FRAME_CACHE_SNAPSHOT seconds and mapped back in at startup. FRAME_CACHE_MB=0 disables it.
+FRAME_CACHE_PATH = os.environ.get("FRAME_CACHE_PATH") or os.path.join(SCRIPT_DIR, "frame_cache.bin")
+FRAME_CACHE_MB = float(os.environ.get("FRAME_CACHE_MB", "64"))
+FRAME_CACHE_SNAPSHOT = float(os.environ.get("FRAME_CACHE_SNAPSHOT", "60"))
+# A cached frame younger than this is served without contacting the camera (the carousel refreshes every 3 s).
+FRAME_FRESH = 3.0
+# Older frames up to this age are served at once (marked with Age / X-Frame-Age) while a background fetch
+# replaces them. Kept short: these are live cameras, and older frames are refetched before answering.
+FRAME_STALE_MAX = float(os.environ.get("FRAME_STALE_MAX", "30"))
+FRAME_CACHE = frame_cache.FrameCache(FRAME_CACHE_PATH, int(FRAME_CACHE_MB * 1024 * 1024), FRAME_CACHE_SNAPSHOT)
+# Camera keys with a background refetch running (one per camera at a time).
+FRAME_REVALIDATING = set()
+FRAME_REVALIDATING_LOCK = threading.Lock()
+
+# Rolling success rate and time-to-first-frame per cam from /feed-proxy fetches (reliability.py);
+# /api/cam-order returns the carousel order weighted by them. Saved to RELIABILITY_PATH every minute.
+RELIABILITY_PATH = os.environ.get("RELIABILITY_PATH") or os.path.join(SCRIPT_DIR, "cam_reliability.json")
+RELIABILITY = reliability.ReliabilityTracker(RELIABILITY_PATH)
+
+# HEALTH_MONITOR=1: keep cam status/last_seen fresh in the background (health_monitor.py; worker 0 runs it).
+# Results live in HEALTH_DB and are overlaid on /cams.json; /feed-proxy outcomes count as checks too.
+HEALTH_MONITOR = os.environ.get("HEALTH_MONITOR", "") not in ("", "0")
+HEALTH_STORE = None
+MONITOR = None
+# A cam's successful /feed-proxy fetches are recorded at most once per this many seconds.
+HEALTH_PASSIVE_EVERY = 60.0
+HEALTH_PASSIVE_LAST = {}
+# Rebuilt /cams.json with health overlaid: (cams.json mtime, health version, body); rebuilt at most every TTL seconds.
+CAMS_OVERLAY = {"key": None, "body": None, "built": 0.0}
+CAMS_OVERLAY_TTL = 30.0
+# /api/cams index (cam_catalog.CamCatalog), rebuilt when cams.json, thumbnails/list.json or health change;
+# the files are stat'ed at most every TTL seconds.
+CAM_CATALOG = {"key": None, "catalog": None, "checked": 0.0, "version": 0}
+CAM_CATALOG_TTL = 5.0
+# Changelog of cams.json (shared_state.CatalogLog) behind /api/cams/changes; the newest CATALOG_LOG_KEEP
+# changes are kept, older clients get {"resync": true}.
+CATALOG_DB = os.environ.get("CATALOG_DB") or os.path.join(SCRIPT_DIR, "cam_catalog.db")
+CATALOG_LOG = shared_state.CatalogLog(CATALOG_DB)
+CATALOG_LOG_KEEP = int(os.environ.get("CATALOG_LOG_KEEP", "5000"))
+CATALOG_LOG_READY = False
+# /api/weather: current weather per camera from a server-side cache (weather.py), instead of every
+# browser calling Open-Meteo. Batches take up to WEATHER_MAX_IDS cams.
+WEATHER = weather.WeatherCache()
+GEOCODER = weather.Geocoder()
+WEATHER_MAX_IDS = 50
+THUMBNAIL_LIST_PATH = os.path.join(SCRIPT_DIR, "thumbnails", "list.json")
+# /thumbnails/{id}.jpg|png: answered from the thumbnail pack when the cam is in it, whatever the extension.
+THUMBNAIL_PATH_RE = re.compile(r"^/thumbnails/(\d+)\.(?:jpg|jpeg|png)$")
+
+# /debug/profile and /debug/tasks are enabled only when DEBUG_TOKEN is set (send it as X-Debug-Token or ?token=).
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+# Profiler: stack samples per second, and how many seconds of samples are kept for /debug/profile?seconds=N.
+PROFILE_HZ = int(os.environ.get("PROFILE_HZ", "50"))
+PROFILE_WINDOW = int(os.environ.get("PROFILE_WINDOW", "60"))
+PROFILER = None
+# In-flight requests for /debug/tasks: task id -> {"route", "url", "client", "thread", "started", "bytes"}.
+# Filled from every request thread of the threaded server; /debug/tasks reads it from its own thread.
+IN_FLIGHT = {}
+IN_FLIGHT_LOCK = threading.Lock()
+IN_FLIGHT_IDS = itertools.count(1)
+
+# Admission control (see admission.py). Per-client token buckets per route class, "rate/burst" per second.
+RATE_LIMITS = admission.parse_rates(os.environ.get("RATE_LIMITS", "cheap=50/200,upstream=5/40,stream=0.5/6"))
+# Server-wide caps on concurrent camera fetches and relayed streams (0 = no cap).
+UPSTREAM_CONCURRENCY = int(os.environ.get("UPSTREAM_CONCURRENCY", "32"))
+MAX_STREAMS = int(os.environ.get("MAX_STREAMS", "64"))
+# Seconds a request waits for a free upstream/stream slot before it gets 503.
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "5"))
+# Global egress budget for relayed frames in megabits per second (0 = unlimited).
+EGRESS_MBPS = float(os.environ.get("EGRESS_MBPS", "0"))
+# Behind a hosting platform's proxy (Railway, Render) every client shares the proxy's address. TRUST_PROXY=N
+# takes the client IP from X-Forwarded-For, N entries from the right: the ones the N trusted proxies appended.
+# Entries further left are sent by the client and could be forged to dodge the limits.
+_trust_proxy = os.environ.get("TRUST_PROXY", "")
+TRUST_PROXY = int(_trust_proxy) if _trust_proxy.isdigit() else (0 if _trust_proxy in ("", "false", "no") else 1)
+CLIENT_LIMITER = admission.ClientLimiter(RATE_LIMITS)
+GATES = {
+    "upstream": admission.Gate(UPSTREAM_CONCURRENCY, ADMISSION_QUEUE_TIMEOUT),
+    "stream": admission.Gate(MAX_STREAMS, ADMISSION_QUEUE_TIMEOUT),
+}
+EGRESS = admission.EgressShaper(EGRESS_MBPS * 125000)
+# Requests are served on their own threads; guards the JSON-file counters (no STATE_DB).
+COUNTERS_LOCK = threading.Lock()
+
+# /api/live (Server-Sent Events): open subscriptions per worker, cams per subscription, keep-alive seconds.
+LIVE_MAX_SUBSCRIBERS = int(os.environ.get("LIVE_MAX_SUBSCRIBERS", "2000"))
+LIVE_MAX_CAMS = 50
+LIVE_KEEPALIVE = 15.0
+
+
+# URL substrings of cameras that return one image per request; /stream-proxy polls these.
+SNAPSHOT_ONLY_PATTERNS = (
+    "jpgmulreq", "getoneshot", "oneshotimage", "onvif/snapshot", "cgi-bin/camera", "out.jpg", "webcapture.jpg",
+    "image.jpg", "image.jpeg", "snapshotjpeg", "snapshot.cgi", "nph-jpeg", "tmpfs/auto.jpg", "snap.jpg",
+)
 
-def _fetch_one_frame(url, timeout, max_size=768 * 1024):
-    """Fetch URL and return one image frame (JPEG or PNG). Returns (content_type, body) or (None, None)."""
+
+# app.js getLiveStreamUrl passes these URLs to /stream-proxy unchanged (the server polls them).
+LIVE_PASSTHROUGH_PATTERNS = ("jpgmulreq", "getoneshot", "oneshotimage", "onvif/snapshot", "webcapture", "image.jpg",
+                             "image.jpeg", "snapshotjpeg", "snapshot.cgi", "nph-jpeg", "out.jpg", "tmpfs/auto.jpg",
+                             "cgi-bin/camera", "snap.jpg")
+
+
+def live_stream_url(url):
+    """The URL the live viewer opens for a stored cam URL: &amp; decoded and app.js getLiveStreamUrl's
+    rewrites applied (video.jpg -> mjpg/video.mjpg, /jpg/ -> /mjpg/video.mjpg)."""
+    url = url.strip().replace("&amp;", "&")
+    u = url.lower()
+    if any(p in u for p in LIVE_PASSTHROUGH_PATTERNS):
+        return url
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": FEED_PROXY_USER_AGENT})
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            body = b""
-            chunk_size = 65536
-            while len(body) < max_size:
-                chunk = resp.read(chunk_size)
-                if not chunk:
-                    break
-                body += chunk
-                soi = body.find(b"\xff\xd8")
-                if soi >= 0:
-                    eoi = body.find(b"\xff\xd9", soi)
-                    if eoi > soi:
-                        return ("image/jpeg", body[soi : eoi + 2])
-            if body[:8] == b"\x89PNG\r\n\x1a\n":
-                return ("image/png", body)
-            soi = body.find(b"\xff\xd8")
-            eoi = body.find(b"\xff\xd9", soi) if soi >= 0 else -1
-            if soi >= 0 and eoi > soi:
+        parts = urllib.parse.urlsplit(url)
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.netloc:
+        return url
+    origin = parts.scheme + "://" + parts.netloc
+    if "video.jpg" in u or "video.jpeg" in u:
+        path = (parts.path or "/").rstrip("/") or "/"
+        return origin + re.sub(r"/video\.(jpg|jpeg)$", "/mjpg/video.mjpg", path, flags=re.I)
+    if "/jpg/" in u:
+        return origin + "/mjpg/video.mjpg"
+    return url
+
+
+def ring_key(url):
+    """FRAME_RINGS key of a camera: the same for its stored URL (/replay) and what the viewer opens (/stream-proxy)."""
+    return _strip_cache_buster(live_stream_url(url))
+
+
+def _multipart_boundary(content_type):
+    """Boundary parameter of a multipart Content-Type, as bytes ("frame" if it has none)."""
+    m = re.search(r'boundary="?([^";]+)"?', content_type or "", re.I)
+    return (m.group(1).strip() if m else "frame").encode("latin-1")
+
+
+def is_snapshot_only(url):
+    """True if the camera URL returns a single image per request (polled as MJPEG by /stream-proxy)."""
+    url_lower = url.lower()
+    return any(p in url_lower for p in SNAPSHOT_ONLY_PATTERNS)
+
+
+def _first_frame(chunks, max_size=768 * 1024):
+    """Scan an iterable of byte chunks for the first complete JPEG (or a PNG body). Returns (content_type, body) or (None, None)."""
+    body = b""
+    for chunk in chunks:
+        if not chunk:
+            break
+        body += chunk
+        soi = body.find(b"\xff\xd8")
+        if soi >= 0:
+            eoi = body.find(b"\xff\xd9", soi)
+            if eoi > soi:
                 return ("image/jpeg", body[soi : eoi + 2])
+        if len(body) >= max_size:
+            break
+    if body[:8] == b"\x89PNG\r\n\x1a\n":
+        return ("image/png", body)
+    soi = body.find(b"\xff\xd8")
+    eoi = body.find(b"\xff\xd9", soi) if soi >= 0 else -1
+    if soi >= 0 and eoi > soi:
+        return ("image/jpeg", body[soi : eoi + 2])
+    return (None, None)
+
+
+def _fetch_one_frame(url, timeout, max_size=768 * 1024, cancel=None):
+    """Fetch URL and return one image frame (JPEG or PNG). Returns (content_type, body) or (None, None).
+    If cancel (http_pool.Cancel) is set, the request is aborted at once and this returns (None, None)."""
+    try:
+        with http_pool.urlopen(url, headers={"User-Agent": FEED_PROXY_USER_AGENT}, timeout=timeout, cancel=cancel) as resp:
+            def chunks():
+                while cancel is None or not cancel.is_set():
+                    # read1: take what has arrived instead of blocking for a full chunk (slow low-fps streams)
+                    yield resp.read1(65536)
+            ct, body = _first_frame(chunks(), max_size)
+            if cancel is not None and cancel.is_set():
+                return (None, None)
+            return (ct, body)
     except Exception:
         pass
     return (None, None)
 
 
+def _strip_cache_buster(url):
+    """Drop t=/_t=/COUNTER= style cache-busting params so every request for a camera maps to one key."""
+    try:
+        parts = urllib.parse.urlsplit(url)
+        if not parts.query:
+            return url
+        kept = [(k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True) if k not in CACHE_BUSTER_PARAMS]
+        return urllib.parse.urlunsplit((parts.scheme, parts.netloc, parts.path, urllib.parse.urlencode(kept), ""))
+    except ValueError:
+        return url
+
+
+def _frame_url_variants(url):
+    """
+    Candidate URLs that may yield a frame for this camera, stored URL first.
+    Same rewrites as app.js getLiveStreamUrl / check_streams.get_live_stream_url, plus the
+    Axis snapshot CGI for MJPEG cams (a single JPEG usually arrives faster than a stream's first frame).
+    """
+    variants = [url]
+    try:
+        parts = urllib.parse.urlsplit(url)
+    except ValueError:
+        return variants
+    if not parts.scheme or not parts.netloc:
+        return variants
+    origin = parts.scheme + "://" + parts.netloc
+    path = (parts.path or "/").rstrip("/") or "/"
+    u = url.lower()
+    if "snapshotjpeg" in u or "snapshot.cgi" in u or "nph-jpeg" in u:
+        variants.append(origin + "/nphMotionJpeg?Resolution=640x480&Quality=Standard")
+    if "image.jpg" in u or "image.jpeg" in u or "/jpg/" in u or "/jpeg/" in u:
+        variants.append(origin + "/mjpg/video.mjpg")
+    if "video.jpg" in u or "video.jpeg" in u:
+        variants.append(origin + re.sub(r"/video\.(jpg|jpeg)$", "/mjpg/video.mjpg", path, flags=re.I))
+    if "webcapture" in u and "command=snap" in u:
+        variants.append(origin + (parts.path or "/"))
+    if "/mjpg/video.mjpg" in u:
+        variants.append(origin + "/axis-cgi/jpg/image.cgi")
+    return list(dict.fromkeys(variants))
+
+
+def _fetch_frame_hedged(url, timeout, max_size=768 * 1024):
+    """
+    Fetch one frame, racing the stored URL against its rewritten variants.
+    Variants start staggered (FRAME_HEDGE_DELAY apart, or as soon as every running attempt
+    has failed); the first valid frame wins and the rest are cancelled. The winning variant
+    is remembered per camera so later requests try it first.
+    Returns (content_type, body) or (None, None).
+    """
+    cam_key = _strip_cache_buster(url)
+    variants = _frame_url_variants(url)
+    if len(variants) == 1:
+        return _fetch_one_frame(url, timeout, max_size=max_size)
+    # Variant 0 keeps the caller's cache-buster; the others are derived URLs.
+    keyed = [cam_key] + variants[1:]
+    with FRAME_URL_WINNERS_LOCK:
+        remembered = FRAME_URL_WINNERS.get(cam_key)
+        if remembered is not None:
+            FRAME_URL_WINNERS.move_to_end(cam_key)
+    order = list(range(len(variants)))
+    if remembered in keyed:
+        first = keyed.index(remembered)
+        order.remove(first)
+        order.insert(0, first)
+
+    deadline = _t.monotonic() + timeout
+    cancel = http_pool.Cancel()  # set() closes the losing attempts' sockets, so no thread waits out its timeout
+    cond = threading.Condition()
+    state = {"winner": None, "running": 0}
+
+    def attempt(idx):
+        remaining = max(0.5, deadline - _t.monotonic())
+        ct, body = _fetch_one_frame(variants[idx], remaining, max_size=max_size, cancel=cancel)
+        with cond:
+            state["running"] -= 1
+            if ct and body and state["winner"] is None:
+                state["winner"] = (idx, ct, body)
+                cancel.set()
+            cond.notify_all()
+
+    settled = lambda: state["winner"] is not None or state["running"] == 0
+    with cond:
+        for n, idx in enumerate(order):
+            if n > 0:
+                delay = FRAME_WINNER_GRACE if (n == 1 and remembered is not None) else FRAME_HEDGE_DELAY
+                cond.wait_for(settled, timeout=min(delay, max(0.0, deadline - _t.monotonic())))
+                if state["winner"] is not None or _t.monotonic() >= deadline:
+                    break
+            state["running"] += 1
+            threading.Thread(target=attempt, args=(idx,), daemon=True).start()
+        cond.wait_for(settled, timeout=max(0.0, deadline - _t.monotonic()))
+        cancel.set()
+        winner = state["winner"]
+
+    with FRAME_URL_WINNERS_LOCK:
+        if winner is None:
+            FRAME_URL_WINNERS.pop(cam_key, None)
+        else:
+            FRAME_URL_WINNERS[cam_key] = keyed[winner[0]]
+            FRAME_URL_WINNERS.move_to_end(cam_key)
+            while len(FRAME_URL_WINNERS) > FRAME_URL_WINNERS_MAX:
+                FRAME_URL_WINNERS.popitem(last=False)
+    if winner is None:
+        return (None, None)
+    return (winner[1], winner[2])
+
+
+def _snapshot_poll_url(url):
+    """Cache-bust a snapshot-only URL so the camera returns a fresh frame. Some cameras reject extra params."""
+    url_lower = url.lower()
+    if "cgi-bin/camera" in url_lower or "oneshotimage" in url_lower:
+        sep = "&" if "?" in url else "?"
+        return url + sep + "COUNTER=" + str(int(_t.time() * 1000))
+    if "webcapture.jpg" in url_lower:
+        return url  # use as-is; some reject _t=
+    sep = "&" if "?" in url else "?"
+    return url + sep + "_t=" + str(int(_t.time() * 1000))
+
+
+def _snapshot_headers(poll_url):
+    headers = {"User-Agent": FEED_PROXY_USER_AGENT}
+    # Some cameras require Referer from their own origin
+    try:
+        base = urllib.parse.urlparse(poll_url)
+        if base.scheme and base.netloc:
+            headers["Referer"] = base.scheme + "://" + base.netloc + "/"
+    except Exception:
+        pass
+    return headers
+
+
+def _extract_image(body):
+    """Raw JPEG/PNG body, or the JPEG inside it (some CGIs send extra bytes). None if there is no image."""
+    if body and (body[:2] == b"\xff\xd8" or body[:8] == b"\x89PNG\r\n\x1a\n"):
+        return body
+    if body and b"\xff\xd8" in body:
+        soi = body.find(b"\xff\xd8")
+        eoi = body.find(b"\xff\xd9", soi)
+        if eoi >= 0:
+            return body[soi : eoi + 2]
+    return None
+
+
+def _iter_jpeg_frames(read, max_size=2 * 1024 * 1024):
+    """Yield each complete JPEG from a multipart MJPEG byte stream; read() returns the next chunk (b"" at EOF)."""
+    buf = bytearray()
+    scan = 0  # where the EOI search resumes, so big frames are not rescanned per chunk
+    while True:
+        chunk = read()
+        if not chunk:
+            return
+        buf += chunk
+        while True:
+            soi = buf.find(b"\xff\xd8")
+            if soi < 0:
+                del buf[:-1]
+                scan = 0
+                break
+            if soi > 0:
+                del buf[:soi]
+                scan = max(0, scan - soi)
+            eoi = buf.find(b"\xff\xd9", max(2, scan))
+            if eoi < 0:
+                scan = max(2, len(buf) - 1)
+                if len(buf) > max_size:
+                    # No EOI within max_size: drop and resync on the next SOI.
+                    del buf[:]
+                    scan = 0
+                break
+            yield bytes(buf[: eoi + 2])
+            del buf[: eoi + 2]
+            scan = 0
+
+
+def send_parts(sock, parts):
+    """Send byte buffers with gathered sendmsg (writev) calls, resuming after partial sends. Returns bytes sent."""
+    views = [memoryview(p) for p in parts if len(p)]
+    total = sum(v.nbytes for v in views)
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(views))
+        return total
+    while views:
+        sent = sock.sendmsg(views)
+        while sent:
+            if sent >= views[0].nbytes:
+                sent -= views[0].nbytes
+                views.pop(0)
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+    return total
+
+
+def relay_mjpeg(resp, sock, on_send=None, on_frame=None, part_head=None):
+    """Relay a camera's MJPEG body to sock with one send per frame. Returns bytes relayed.
+
+    Reads with readinto1 into a reusable bytearray and sends once the buffer holds a frame end
+    (JPEG EOI) or is full, so a frame costs one send instead of a write+flush per 8 KB chunk.
+    The buffer grows while frames overflow it and shrinks when they stay under a quarter of it.
+    on_frame(frame, part_head), if given, receives the last complete frame of each send with the
+    camera's multipart part header. With part_head (bytes) the body is not passed through: the
+    last complete frame of each send goes out behind part_head instead, for a client whose
+    stream headers named another multipart boundary than the camera now uses.
+    """
+    size = RELAY_MIN_BUF
+    buf = bytearray(size)
+    view = memoryview(buf)
+    filled = 0
+    small = 0
+    total = 0
+    carry = b""  # bytes after the last frame end of the previous send (start of the next part header)
+    try:
+        while True:
+            n = resp.readinto1(view[filled:])
+            if not n:
+                break
+            start = max(0, filled - 1)  # EOI marker may straddle two reads
+            filled += n
+            eoi = buf.rfind(b"\xff\xd9", start, filled)
+            frame_end = eoi >= 0
+            if not frame_end and filled < size:
+                continue
+            parse = on_frame is not None or part_head is not None
+            sent = filled if part_head is None else 0
+            if frame_end and parse:
+                prev = buf.rfind(b"\xff\xd9", 0, eoi)
+                part = bytes(buf[prev + 2 : eoi + 2]) if prev >= 0 else carry + bytes(buf[: eoi + 2])
+                soi = part.find(b"\xff\xd8")
+                # Only frames whose whole part (boundary line, headers, JPEG) was seen are kept.
+                if soi > 0 and b"--" in part[:soi]:
+                    if on_frame is not None:
+                        on_frame(part[soi:], part[:soi])
+                    if part_head is not None:
+                        out = part_head + part[soi:] + b"\r\n"
+                        sock.sendall(out)
+                        sent = len(out)
+            if part_head is None:
+                sock.sendall(view[:filled])
+            total += sent
+            if on_send is not None and sent:
+                on_send(sent)
+            if parse:
+                carry = bytes(buf[eoi + 2 : filled]) if frame_end and filled - eoi - 2 <= 4096 else b""
+            new_size = size
+            if not frame_end:
+                new_size = min(size * 2, RELAY_MAX_BUF)
+            elif filled < size // 4:
+                small += 1
+                if small >= 8:
+                    new_size = max(size // 2, RELAY_MIN_BUF)
+            else:
+                small = 0
+            filled = 0
+            if new_size != size:
+                view.release()
+                size = new_size
+                buf = bytearray(size)
+                view = memoryview(buf)
+                small = 0
+        if filled and part_head is None:
+            sock.sendall(view[:filled])
+            total += filled
+            if on_send is not None:
+                on_send(filled)
+    finally:
+        view.release()
+    return total
+
+
+def _reencode_jpeg(data, max_width, quality):
+    """Downscale to max_width and/or re-encode at quality. Returns data unchanged without Pillow or on decode errors."""
+    if Image is None or not (max_width or quality):
+        return data
+    try:
+        img = Image.open(io.BytesIO(data))
+        scale = bool(max_width) and img.width > max_width
+        if not scale and not quality:
+            return data
+        if scale:
+            height = max(1, img.height * max_width // img.width)
+            # JPEG draft mode decodes at 1/2, 1/4 or 1/8 scale in the DCT: much cheaper than a full decode + resize.
+            img.draft("RGB", (max_width, height))
+            if img.width > max_width:
+                img = img.resize((max_width, max(1, img.height * max_width // img.width)), Image.BILINEAR)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=quality or PROFILE_DEFAULT_QUALITY)
+        return out.getvalue()
+    except Exception:
+        return data
+
+
+def _frame_signature(data):
+    """(digest, luma) for change detection: a hash of the bytes, plus a 16x12 grey thumbnail when Pillow is available."""
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    luma = None
+    if Image is not None and data[:2] == b"\xff\xd8":
+        try:
+            img = Image.open(io.BytesIO(data))
+            img.draft("L", (max(1, img.width // 8), max(1, img.height // 8)))
+            luma = img.convert("L").resize((16, 12), Image.BILINEAR).tobytes()
+        except Exception:
+            pass
+    return (digest, luma)
+
+
+def _same_scene(a, b):
+    if a[0] == b[0]:
+        return True
+    if a[1] is None or b[1] is None:
+        return False
+    return sum(abs(x - y) for x, y in zip(a[1], b[1])) / float(len(a[1])) <= SNAPSHOT_LUMA_THRESHOLD
+
+
+class SnapshotChangeDetector:
+    """Duplicate-frame suppression for a snapshot poll loop.
+
+    should_send() is False for frames that show the same scene as the last one sent (unless
+    SNAPSHOT_KEEPALIVE has passed), and .interval backs off while the scene stays static.
+    """
+
+    def __init__(self, base_interval=SNAPSHOT_POLL_INTERVAL):
+        self.base_interval = base_interval
+        self.interval = base_interval
+        self.last = None
+        self.last_sent = 0.0
+
+    def should_send(self, frame):
+        sig = _frame_signature(frame)
+        changed = self.last is None or not _same_scene(sig, self.last)
+        if changed:
+            # Compare against the last frame sent, so slow drift still counts as a change eventually.
+            self.last = sig
+            self.interval = self.base_interval
+        else:
+            self.interval = min(max(self.interval * 2, self.base_interval), max(SNAPSHOT_MAX_POLL_INTERVAL, self.base_interval))
+        now = _t.monotonic()
+        if changed or now - self.last_sent >= SNAPSHOT_KEEPALIVE:
+            self.last_sent = now
+            return True
+        return False
+
+
+class ProfileStream:
+    """One camera relayed at one (max_fps, max_width, quality) profile.
+
+    A producer thread reads the camera (MJPEG stream, or polls snapshot-only URLs), drops frames
+    to max_fps and re-encodes the rest once; every viewer of the same profile waits on the
+    latest encoded frame. The producer stops after PROFILE_IDLE_GRACE seconds without viewers.
+    """
+
+    def __init__(self, key, url, max_fps, max_width, quality):
+        self.key = key
+        self.url = url
+        self.max_fps = max_fps
+        self.max_width = max_width
+        self.quality = quality
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.frame = None
+        self.done = False
+        self.subscribers = 0
+        self.idle_since = _t.monotonic()
+
+    def _should_stop(self):
+        """True (and unregistered) once nobody has watched for PROFILE_IDLE_GRACE seconds."""
+        with PROFILE_STREAMS_LOCK:
+            if self.subscribers or _t.monotonic() - self.idle_since < PROFILE_IDLE_GRACE:
+                return False
+            if PROFILE_STREAMS.get(self.key) is self:
+                del PROFILE_STREAMS[self.key]
+            return True
+
+    def release(self):
+        with PROFILE_STREAMS_LOCK:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                self.idle_since = _t.monotonic()
+
+    def wait_frame(self, after_seq, timeout):
+        """(seq, frame) for the first frame newer than after_seq; (after_seq, None) on timeout or end of stream."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > after_seq or self.done, timeout=timeout)
+            if self.seq > after_seq:
+                return (self.seq, self.frame)
+            return (after_seq, None)
+
+    def _source_frames(self):
+        if is_snapshot_only(self.url):
+            detector = SnapshotChangeDetector(max(SNAPSHOT_POLL_INTERVAL, 1.0 / self.max_fps if self.max_fps else 0.0))
+            while not self._should_stop():
+                started = _t.monotonic()
+                try:
+                    poll_url = _snapshot_poll_url(self.url)
+                    with http_pool.urlopen(poll_url, headers=_snapshot_headers(poll_url), timeout=15) as resp:
+                        out = _extract_image(resp.read(2 * 1024 * 1024))
+                    if out and detector.should_send(out):
+                        yield out
+                except Exception as e:
+                    print("[stream-proxy] profile poll error (retrying): %s" % e)
+                _t.sleep(max(0.0, detector.interval - (_t.monotonic() - started)))
+            return
+        with http_pool.urlopen(self.url, headers={"User-Agent": FEED_PROXY_USER_AGENT}, timeout=15) as resp:
+            for frame in _iter_jpeg_frames(lambda: resp.read1(65536)):
+                yield frame
+                if self._should_stop():
+                    return
+
+    def run(self):
+        interval = 1.0 / self.max_fps if self.max_fps else 0.0
+        last = 0.0
+        try:
+            for frame in self._source_frames():
+                now = _t.monotonic()
+                if interval and now - last < interval:
+                    continue
+                last = now
+                if frame[:2] == b"\xff\xd8":
+                    frame = _reencode_jpeg(frame, self.max_width, self.quality)
+                with self.cond:
+                    self.frame = frame
+                    self.seq += 1
+                    self.cond.notify_all()
+        except Exception as e:
+            print("[stream-proxy] profile stream error: %s" % e)
+        finally:
+            with PROFILE_STREAMS_LOCK:
+                if PROFILE_STREAMS.get(self.key) is self:
+                    del PROFILE_STREAMS[self.key]
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+
+def get_profile_stream(url, max_fps, max_width, quality):
+    """Subscribe to the shared ProfileStream for (camera, profile), starting it if needed. Call .release() when done."""
+    key = (_strip_cache_buster(url), max_fps, max_width, quality)
+    with PROFILE_STREAMS_LOCK:
+        stream = PROFILE_STREAMS.get(key)
+        started = stream is None
+        if started:
+            stream = PROFILE_STREAMS[key] = ProfileStream(key, url, max_fps, max_width, quality)
+        stream.subscribers += 1
+    if started:
+        threading.Thread(target=stream.run, name="profile-stream", daemon=True).start()
+    return stream
+
+
 def load_cam_visits():
     global CAM_VISITS
     try:
@@ -106,6 +785,294 @@ def save_cam_thumbs():
         print("[cam_thumbs] save failed: %s" % e)
 
 
+def init_counters():
+    """Load visit/thumb counts; with STATE_DB, move them into the shared SQLite store (seeded from the JSON files)."""
+    global SHARED_COUNTERS
+    load_cam_visits()
+    load_cam_thumbs()
+    if STATE_DB_PATH:
+        SHARED_COUNTERS = shared_state.SharedCounters(STATE_DB_PATH)
+        SHARED_COUNTERS.init(visits=CAM_VISITS, thumbs=CAM_THUMBS)
+        SHARED_COUNTERS.close()
+
+
+def export_counters():
+    """Write the shared SQLite counts back to cam_visits.json / cam_thumbs.json (at shutdown), so the
+    JSON files stay current for single-process runs and deploys that do not keep cam_stats.db."""
+    global CAM_VISITS, CAM_THUMBS
+    if not STATE_DB_PATH:
+        return
+    try:
+        counters = shared_state.SharedCounters(STATE_DB_PATH)
+        with COUNTERS_LOCK:
+            CAM_VISITS = counters.all_visits()
+            CAM_THUMBS = counters.all_thumbs()
+            save_cam_visits()
+            save_cam_thumbs()
+        counters.close()
+        print("Exported counters from %s to %s / %s" % (STATE_DB_PATH, CAM_VISITS_PATH, CAM_THUMBS_PATH))
+    except Exception as e:
+        print("[counters] export failed: %s" % e)
+
+
+def record_cam_visit(cam_id):
+    """Add one visit to cam_id; returns the new total."""
+    LIVE.nudge()
+    if SHARED_COUNTERS is not None:
+        count = SHARED_COUNTERS.incr_visit(cam_id)
+        CAM_VISITS[cam_id] = count
+        return count
+    with COUNTERS_LOCK:
+        CAM_VISITS[cam_id] = CAM_VISITS.get(cam_id, 0) + 1
+        save_cam_visits()
+        return CAM_VISITS[cam_id]
+
+
+def get_cam_visit_count(cam_id):
+    if SHARED_COUNTERS is not None:
+        return SHARED_COUNTERS.visit_count(cam_id)
+    return CAM_VISITS.get(cam_id, 0)
+
+
+def get_cam_thumbs(cam_id):
+    """(up, down) votes for cam_id."""
+    if SHARED_COUNTERS is not None:
+        return SHARED_COUNTERS.thumbs(cam_id)
+    rec = CAM_THUMBS.get(cam_id, {})
+    return (int(rec.get("up", 0)), int(rec.get("down", 0)))
+
+
+def record_cam_thumb(cam_id, vote):
+    """Record an "up"/"down" vote; returns the new (up, down)."""
+    LIVE.nudge()
+    if SHARED_COUNTERS is not None:
+        up, down = SHARED_COUNTERS.vote(cam_id, vote)
+        CAM_THUMBS[cam_id] = {"up": up, "down": down}
+        return (up, down)
+    with COUNTERS_LOCK:
+        rec = CAM_THUMBS.get(cam_id, {"up": 0, "down": 0})
+        rec["up"] = int(rec.get("up", 0))
+        rec["down"] = int(rec.get("down", 0))
+        rec[vote] = rec[vote] + 1
+        CAM_THUMBS[cam_id] = rec
+        save_cam_thumbs()
+        return (rec["up"], rec["down"])
+
+
+def live_snapshot(cam_ids):
+    """{cam_id: {"visits", "up", "down", "viewers", "status", "last_seen"}} for /api/live subscribers."""
+    if SHARED_COUNTERS is not None:
+        counters = SHARED_COUNTERS.stats(cam_ids)
+    else:
+        with COUNTERS_LOCK:
+            counters = {}
+            for cam_id in cam_ids:
+                rec = CAM_THUMBS.get(cam_id, {})
+                counters[cam_id] = (CAM_VISITS.get(cam_id, 0), int(rec.get("up", 0)), int(rec.get("down", 0)))
+    # Live viewers: /stream-proxy relays in flight in this worker.
+    with IN_FLIGHT_LOCK:
+        urls = [t["url"] for t in IN_FLIGHT.values() if t["route"] == "/stream-proxy" and t["url"]]
+    viewers = collections.Counter(cam_id_for_url(url) for url in urls)
+    health = HEALTH_STORE.status(cam_ids) if HEALTH_STORE is not None else {}
+    out = {}
+    for cam_id in cam_ids:
+        visits, up, down = counters.get(cam_id, (0, 0, 0))
+        status, last_seen = health.get(cam_id, (None, None))
+        out[cam_id] = {"visits": visits, "up": up, "down": down, "viewers": viewers.get(cam_id, 0),
+                       "status": status, "last_seen": last_seen}
+    return out
+
+
+LIVE = live_stats.LiveHub(live_snapshot)
+
+
+def start_profiler():
+    """Start the background stack sampler in this process (no-op unless DEBUG_TOKEN is set)."""
+    global PROFILER
+    if DEBUG_TOKEN and PROFILER is None:
+        PROFILER = stack_sampler.StackSampler(PROFILE_HZ, PROFILE_WINDOW).start()
+
+
+class _CountingWriter:
+    """Wraps a handler's wfile and counts bytes written into the request's IN_FLIGHT entry."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.task = None
+
+    def write(self, data):
+        n = self._raw.write(data)
+        if self.task is not None:
+            self.task["bytes"] += len(data)
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+def _load_cam_urls():
+    """Refresh CAM_URLS_BY_ID when cams.json changes. Returns False if there is no cams.json."""
+    try:
+        mtime = os.path.getmtime(CAMS_JSON_PATH)
+    except OSError:
+        return False
+    if CAM_URLS_BY_ID["mtime"] != mtime:
+        try:
+            with open(CAMS_JSON_PATH, "r", encoding="utf-8") as f:
+                cams = json.load(f)
+        except (OSError, ValueError):
+            cams = []
+        urls = {str(c.get("id")): c.get("url") for c in cams if isinstance(c, dict) and c.get("url")}
+        CAM_URLS_BY_ID["urls"] = urls
+        CAM_URLS_BY_ID["ids"] = {_strip_cache_buster(u.strip().replace("&amp;", "&")): i for i, u in urls.items()}
+        CAM_URLS_BY_ID["mtime"] = mtime
+    return True
+
+
+def cam_url_for_id(cam_id):
+    """Stream URL of a camera in cams.json by id (reloaded when the file changes), or None."""
+    if not _load_cam_urls():
+        return None
+    return CAM_URLS_BY_ID["urls"].get(str(cam_id))
+
+
+def cam_id_for_url(url):
+    """Id of the cams.json camera a (possibly cache-busted) URL belongs to, or None."""
+    if not _load_cam_urls():
+        return None
+    return CAM_URLS_BY_ID["ids"].get(_strip_cache_buster(url))
+
+
+def start_health_monitor():
+    """Open the health store in this process (every worker records outcomes and serves the overlay)."""
+    global HEALTH_STORE
+    if HEALTH_MONITOR and HEALTH_STORE is None:
+        HEALTH_STORE = shared_state.CamHealthStore(health_monitor.HEALTH_DB)
+        HEALTH_STORE.init()
+
+
+def run_health_monitor():
+    global MONITOR
+    start_health_monitor()
+    if HEALTH_STORE is not None and MONITOR is None:
+        visits = SHARED_COUNTERS.all_visits if SHARED_COUNTERS is not None else (lambda: dict(CAM_VISITS))
+        MONITOR = health_monitor.HealthMonitor(HEALTH_STORE, CAMS_JSON_PATH, visits=visits).start()
+
+
+def revalidate_frame(url):
+    """Refetch a camera's frame in the background after a stale cache hit; a failure drops the cached frame
+    so the next request reports the camera as down instead of showing an old picture."""
+    key = _strip_cache_buster(url)
+    with FRAME_REVALIDATING_LOCK:
+        if key in FRAME_REVALIDATING:
+            return
+        FRAME_REVALIDATING.add(key)
+
+    def run():
+        gate = GATES["upstream"]
+        entered = gate.enter()
+        try:
+            if not entered:
+                return
+            started = _t.monotonic()
+            ct, body = _fetch_frame_hedged(url, FEED_PROXY_TIMEOUT, max_size=512 * 1024)
+            record_feed_outcome(url, bool(ct and body), _t.monotonic() - started)
+            if ct and body:
+                FRAME_CACHE.put(key, ct, body)
+            else:
+                FRAME_CACHE.discard(key)
+        finally:
+            if entered:
+                gate.leave()
+            with FRAME_REVALIDATING_LOCK:
+                FRAME_REVALIDATING.discard(key)
+
+    threading.Thread(target=run, name="frame-revalidate", daemon=True).start()
+
+
+def record_feed_outcome(url, ok, seconds=None):
+    """Count a /feed-proxy fetch (seconds to its first frame) towards its camera's reliability,
+    and as a health check (successes throttled per cam)."""
+    cam_id = cam_id_for_url(url)
+    if cam_id is None:
+        return
+    RELIABILITY.record(cam_id, ok, seconds)
+    if HEALTH_STORE is None:
+        return
+    now = _t.time()
+    if ok and now - HEALTH_PASSIVE_LAST.get(cam_id, 0) < HEALTH_PASSIVE_EVERY:
+        return
+    HEALTH_PASSIVE_LAST[cam_id] = now
+    try:
+        HEALTH_STORE.record(cam_id, ok, "feed-proxy" if ok else "feed-proxy: no frame", offline_after=health_monitor.OFFLINE_AFTER)
+    except Exception as e:
+        print("[health] cannot record feed outcome: %s" % e)
+
+
+def cams_json_with_health():
+    """cams.json bytes with stored health (status, last_seen) overlaid; None if cams.json is missing."""
+    now = _t.time()
+    if CAMS_OVERLAY["body"] is not None and now - CAMS_OVERLAY["built"] < CAMS_OVERLAY_TTL:
+        return CAMS_OVERLAY["body"]
+    try:
+        key = (os.path.getmtime(CAMS_JSON_PATH), HEALTH_STORE.version())
+    except OSError:
+        return None
+    if key != CAMS_OVERLAY["key"]:
+        with open(CAMS_JSON_PATH, "r", encoding="utf-8") as f:
+            cams = json.load(f)
+        health_monitor.merge_health(cams, HEALTH_STORE.rows())
+        CAMS_OVERLAY["body"] = json.dumps(cams, ensure_ascii=False).encode("utf-8")
+        CAMS_OVERLAY["key"] = key
+    CAMS_OVERLAY["built"] = now
+    return CAMS_OVERLAY["body"]
+
+
+def sync_catalog_log(cams):
+    """Record cams.json changes in the catalog changelog; returns the catalog version (0 if unavailable)."""
+    global CATALOG_LOG_READY
+    try:
+        if not CATALOG_LOG_READY:
+            CATALOG_LOG.init()
+            CATALOG_LOG_READY = True
+        return CATALOG_LOG.sync(cams, keep=CATALOG_LOG_KEEP)
+    except Exception as e:
+        print("[catalog] changelog unavailable: %s" % e)
+        return 0
+
+
+def get_cam_catalog():
+    """Current CamCatalog (health overlaid when the monitor is on), or None if cams.json is missing."""
+    now = _t.time()
+    if CAM_CATALOG["catalog"] is not None and now - CAM_CATALOG["checked"] < CAM_CATALOG_TTL:
+        return CAM_CATALOG["catalog"]
+    try:
+        mtime = os.path.getmtime(CAMS_JSON_PATH)
+    except OSError:
+        return None
+    try:
+        list_mtime = os.path.getmtime(THUMBNAIL_LIST_PATH)
+    except OSError:
+        list_mtime = None
+    key = (mtime, list_mtime, HEALTH_STORE.version() if HEALTH_STORE is not None else None)
+    if key != CAM_CATALOG["key"]:
+        with open(CAMS_JSON_PATH, "r", encoding="utf-8") as f:
+            cams = json.load(f)
+        if CAM_CATALOG["key"] is None or CAM_CATALOG["key"][0] != mtime:
+            CAM_CATALOG["version"] = sync_catalog_log(cams)  # the file itself, before the health overlay
+        if HEALTH_STORE is not None:
+            health_monitor.merge_health(cams, HEALTH_STORE.rows())
+        try:
+            with open(THUMBNAIL_LIST_PATH, "r", encoding="utf-8") as f:
+                thumbnail_ids = json.load(f)
+        except (OSError, ValueError):
+            thumbnail_ids = []
+        CAM_CATALOG["catalog"] = cam_catalog.CamCatalog(cams, thumbnail_ids)
+        CAM_CATALOG["key"] = key
+    CAM_CATALOG["checked"] = now
+    return CAM_CATALOG["catalog"]
+
+
 def is_safe_cam_id(cam_id):
     if not cam_id or not isinstance(cam_id, str):
         return False
@@ -117,8 +1084,6 @@ def is_safe_ip(ip):
         return False
     return bool(re.match(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$", ip))
 
-_no_proxy_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
-
 
 class Handler(http.server.SimpleHTTPRequestHandler):
     def end_headers(self):
@@ -133,14 +1098,245 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             self.send_header("Cache-Control", "public, max-age=86400")
         if path_lower == "/cams.json":
             self.send_header("Cache-Control", "public, max-age=300")
+            # Version to pass to /api/cams/changes?since= later, read by do_GET before the response started.
+            if self.catalog_version is not None:
+                self.send_header("X-Catalog-Version", str(self.catalog_version))
         http.server.SimpleHTTPRequestHandler.end_headers(self)
 
+    # Catalog version for this /cams.json response (set by do_GET, sent by end_headers).
+    catalog_version = None
+
+    def setup(self):
+        http.server.SimpleHTTPRequestHandler.setup(self)
+        self.wfile = _CountingWriter(self.wfile)
+
     def do_GET(self):
+        # Register the request for /debug/tasks while it is being served.
+        parsed = urllib.parse.urlparse(self.path)
+        route = re.sub(r"/+", "/", (parsed.path or "/").strip()).rstrip("/") or "/"
+        if route.startswith("/thumbnails/"):
+            route = "/thumbnails"
+        cam_url = (urllib.parse.parse_qs(parsed.query).get("url") or [""])[0]
+        client = self._client_ip()
+        # Admission: per-client rate limit for the route class, then a server-wide slot for camera fetches/streams.
+        cls = admission.route_class(route)
+        retry = CLIENT_LIMITER.check(client, cls)
+        if retry:
+            self._send_busy(429, "Too many requests", retry)
+            return
+        gate = GATES.get(cls)
+        if gate is not None and not gate.enter():
+            self._send_busy(503, "Server busy", ADMISSION_QUEUE_TIMEOUT)
+            return
+        task_id = next(IN_FLIGHT_IDS)
+        task = {
+            "route": route,
+            "url": cam_url,
+            "client": client,
+            "thread": threading.current_thread().name,
+            "started": _t.time(),
+            "bytes": 0,
+        }
+        with IN_FLIGHT_LOCK:
+            IN_FLIGHT[task_id] = task
+        self.wfile.task = task
+        try:
+            self._do_GET()
+        finally:
+            self.wfile.task = None
+            with IN_FLIGHT_LOCK:
+                IN_FLIGHT.pop(task_id, None)
+            if gate is not None:
+                gate.leave()
+
+    def _client_ip(self):
+        if TRUST_PROXY:
+            hops = [h.strip() for h in ",".join(self.headers.get_all("X-Forwarded-For") or []).split(",") if h.strip()]
+            if hops:
+                return hops[-min(TRUST_PROXY, len(hops))]
+        return self.client_address[0] if self.client_address else ""
+
+    def _send_busy(self, code, message, retry_after):
+        try:
+            self.send_response(code, message)
+            self.send_header("Retry-After", str(max(1, int(retry_after + 0.999))))
+            self.send_header("Content-Length", "0")
+            self.send_header("Connection", "close")
+            self.end_headers()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def _send_stream_headers(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+    def _count_sent(self, n):
+        # Bytes sent on the raw socket (bypassing wfile) still count towards /debug/tasks.
+        task = self.wfile.task
+        if task is not None:
+            task["bytes"] += n
+
+    def _send_parts(self, parts):
+        """One gathered send of parts (e.g. multipart boundary, frame, CRLF) on the client socket."""
+        self._count_sent(send_parts(self.connection, parts))
+
+    def _relayed(self, n):
+        # relay_mjpeg passes bytes through unparsed, so over the egress budget it slows down instead of dropping frames.
+        self._count_sent(n)
+        EGRESS.send(n)
+
+    def _debug_authorized(self, params):
+        token = self.headers.get("X-Debug-Token") or (params.get("token") or [""])[0]
+        return hmac.compare_digest(token.encode("utf-8"), DEBUG_TOKEN.encode("utf-8"))
+
+    def _send_debug(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, OSError):
+            pass
+
+    def _send_json(self, obj, cache="no-cache"):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", cache)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, OSError):
+            pass
+
+    def _serve_packed_thumbnail(self, cam_id):
+        """Send a cam's thumbnail from the pack with sendfile; False if the pack does not have it."""
+        for _ in range(2):  # the pack file can be compacted away between lookup and open
+            loc = thumb_pack.PACK.locate(cam_id)
+            if loc is None:
+                return False
+            path, offset, length, ctype, captured, digest = loc
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                break
+            except FileNotFoundError:
+                continue
+        else:
+            return False
+        try:
+            etag = '"%s"' % digest
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return True
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(length))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", self.date_time_string(int(captured)))
+            self.end_headers()
+            # Thumbnail bytes count towards the egress budget and /debug/tasks on either path.
+            EGRESS.send(length)
+            if hasattr(os, "sendfile"):
+                sock = self.connection.fileno()
+                end = offset + length
+                while offset < end:
+                    sent = os.sendfile(sock, fd, offset, end - offset)
+                    if not sent:
+                        break
+                    offset += sent
+                    self._count_sent(sent)
+            else:
+                data = os.pread(fd, length, offset)
+                self.connection.sendall(data)
+                self._count_sent(len(data))
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            os.close(fd)
+        return True
+
+    def _serve_profile_stream(self, url, max_fps, max_width, quality):
+        """Relay the camera as multipart MJPEG from the shared ProfileStream for this (camera, profile)."""
+        stream = get_profile_stream(url, max_fps, max_width, quality)
+        try:
+            seq, frame = stream.wait_frame(0, PROFILE_FRAME_TIMEOUT)
+            if frame is None:
+                self.send_error(504, "Stream proxy error: no frame")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            self.send_header("Cache-Control", "no-store, no-cache, must-revalidate")
+            self.send_header("Pragma", "no-cache")
+            self.send_header("X-Content-Type-Options", "nosniff")
+            self.send_header("X-Stream-Profile", "fps=%g; width=%d; quality=%d%s" % (
+                max_fps, max_width, quality, "" if Image is not None or not (max_width or quality) else "; reencode=unavailable"))
+            self.send_header("Connection", "close")
+            self.end_headers()
+            while frame is not None:
+                if EGRESS.try_send(len(frame)):
+                    ct = b"image/png" if frame[:8] == b"\x89PNG\r\n\x1a\n" else b"image/jpeg"
+                    self._send_parts((b"--frame\r\nContent-Type: " + ct + b"\r\n\r\n", frame, b"\r\n"))
+                seq, frame = stream.wait_frame(seq, PROFILE_FRAME_TIMEOUT)
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            stream.release()
+
+    def _do_GET(self):
         parsed = urllib.parse.urlparse(self.path)
         # Normalize path: collapse multiple slashes, strip trailing slash
         path = re.sub(r"/+", "/", (parsed.path or "/").strip()).rstrip("/") or "/"
         path_lower = path.lower()
 
+        # Debug endpoints: 404 unless DEBUG_TOKEN is set, 403 without the token.
+        if path in ("/debug/profile", "/debug/tasks"):
+            params = urllib.parse.parse_qs(parsed.query)
+            if not DEBUG_TOKEN:
+                self.send_error(404, "Not found")
+                return
+            if not self._debug_authorized(params):
+                self.send_error(403, "Forbidden")
+                return
+            if path == "/debug/profile":
+                # Collapsed stacks ("thread;outer;...;inner count") from the last N seconds of samples.
+                try:
+                    seconds = float((params.get("seconds") or ["10"])[0])
+                except ValueError:
+                    seconds = 10.0
+                start_profiler()
+                text, samples = PROFILER.collapsed(max(0.0, seconds))
+                header = "# pid %d, %d samples at %d Hz over the last %gs\n" % (
+                    os.getpid(), samples, PROFILER.hz, min(max(0.0, seconds), PROFILER.window))
+                self._send_debug((header + text).encode("utf-8"), "text/plain; charset=utf-8")
+            else:
+                now = _t.time()
+                with IN_FLIGHT_LOCK:
+                    items = sorted(IN_FLIGHT.items())
+                tasks = [{
+                    "id": task_id,
+                    "route": t["route"],
+                    "url": t["url"],
+                    "client": t["client"],
+                    "thread": t["thread"],
+                    "elapsed_s": round(now - t["started"], 3),
+                    "bytes": t["bytes"],
+                } for task_id, t in items]
+                limits = {name: gate.stats() for name, gate in GATES.items()}
+                limits["rate_limited"] = CLIENT_LIMITER.rejected
+                limits["egress_dropped_frames"] = EGRESS.dropped
+                body = json.dumps({"pid": os.getpid(), "tasks": tasks, "admission": limits,
+                                   "frame_cache": FRAME_CACHE.stats()}, indent=2).encode("utf-8")
+                self._send_debug(body, "application/json")
+            return
+
         if path == "/ipinfo" and parsed.query:
             params = urllib.parse.parse_qs(parsed.query)
             ip = (params.get("ip") or [""])[0].strip()
@@ -151,8 +1347,7 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             # Primary: ip-api.com (45 req/min free, no token needed)
             try:
                 api_url = "http://ip-api.com/json/" + ip + "?fields=status,country,countryCode,regionName,city,lat,lon,isp,org,as"
-                req = urllib.request.Request(api_url, headers={"User-Agent": "Mozilla/5.0 (compatible; UPLINK_SITE/1.0)"})
-                with _no_proxy_opener.open(req, timeout=8) as resp:
+                with http_pool.urlopen(api_url, headers={"User-Agent": "Mozilla/5.0 (compatible; UPLINK_SITE/1.0)"}, timeout=8) as resp:
                     raw = json.loads(resp.read().decode("utf-8"))
                 if raw.get("status") == "success":
                     as_str = raw.get("as", "")
@@ -169,11 +1364,11 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             # Fallback: ipinfo.io
             if body is None:
                 try:
-                    req = urllib.request.Request(
+                    with http_pool.urlopen(
                         "https://ipinfo.io/" + ip + "/json",
                         headers={"Accept": "application/json", "User-Agent": "Mozilla/5.0 (compatible; UPLINK_SITE/1.0)"},
-                    )
-                    with _no_proxy_opener.open(req, timeout=8) as resp:
+                        timeout=8,
+                    ) as resp:
                         body = resp.read()
                 except Exception as fetch_err:
                     try:
@@ -196,12 +1391,28 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             params = urllib.parse.parse_qs(parsed.query)
             url = (params.get("url") or [None])[0]
             if url and isinstance(url, str) and url.startswith(("http://", "https://")):
-                ct, body = _fetch_one_frame(url, FEED_PROXY_TIMEOUT, max_size=512 * 1024)
+                key = _strip_cache_buster(url)
+                cached = FRAME_CACHE.get(key)
+                if cached is not None and cached[0] <= FRAME_STALE_MAX:
+                    # Stale-while-revalidate: answer from the cache, refetch in the background if not fresh.
+                    age, ct, body = cached
+                    if age > FRAME_FRESH:
+                        revalidate_frame(url)
+                else:
+                    age = None
+                    started = _t.monotonic()
+                    ct, body = _fetch_frame_hedged(url, FEED_PROXY_TIMEOUT, max_size=512 * 1024)
+                    record_feed_outcome(url, bool(ct and body), _t.monotonic() - started)
+                    if ct and body:
+                        FRAME_CACHE.put(key, ct, body)
                 if ct and body:
                     self.send_response(200)
                     self.send_header("Content-Type", ct)
                     self.send_header("Cache-Control", "no-cache")
                     self.send_header("Content-Length", str(len(body)))
+                    if age is not None:
+                        self.send_header("Age", str(int(age)))
+                        self.send_header("X-Frame-Age", "%.1f" % age)
                     self.end_headers()
                     try:
                         self.wfile.write(body)
@@ -221,8 +1432,9 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             params = urllib.parse.parse_qs(parsed.query)
             url = (params.get("url") or [None])[0]
             if url and isinstance(url, str) and url.startswith(("http://", "https://")):
-                ct, body = _fetch_one_frame(url, SNAPSHOT_FRAME_TIMEOUT)
+                ct, body = _fetch_frame_hedged(url, SNAPSHOT_FRAME_TIMEOUT)
                 if ct and body:
+                    FRAME_CACHE.put(_strip_cache_buster(url), ct, body)
                     self.send_response(200)
                     self.send_header("Content-Type", ct)
                     self.send_header("Cache-Control", "no-cache")
@@ -248,25 +1460,24 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             url = params.get("url", [None])[0]
             if url and url.startswith(("http://", "https://")):
                 print("[stream-proxy] fetching: %s" % (url[:80] + "..." if len(url) > 80 else url))
-                url_lower = url.lower()
-                is_snapshot_only = (
-                    "jpgmulreq" in url_lower
-                    or "getoneshot" in url_lower
-                    or "oneshotimage" in url_lower
-                    or "onvif/snapshot" in url_lower
-                    or "cgi-bin/camera" in url_lower
-                    or "out.jpg" in url_lower
-                    or "webcapture.jpg" in url_lower
-                    or "image.jpg" in url_lower
-                    or "image.jpeg" in url_lower
-                    or "snapshotjpeg" in url_lower
-                    or "snapshot.cgi" in url_lower
-                    or "nph-jpeg" in url_lower
-                    or "tmpfs/auto.jpg" in url_lower
-                    or "snap.jpg" in url_lower
-                )
+                # Optional bandwidth profile: max_fps drops frames, max_width/quality re-encode (needs Pillow).
                 try:
-                    if is_snapshot_only:
+                    max_fps = float((params.get("max_fps") or ["0"])[0] or 0)
+                    max_width = int((params.get("max_width") or ["0"])[0] or 0)
+                    quality = int((params.get("quality") or ["0"])[0] or 0)
+                except ValueError:
+                    self.send_error(400, "Invalid max_fps, max_width or quality")
+                    return
+                if max_fps < 0 or max_width < 0 or not 0 <= quality <= 95:
+                    self.send_error(400, "Invalid max_fps, max_width or quality")
+                    return
+                if max_fps or max_width or quality:
+                    self._serve_profile_stream(url, min(max_fps, PROFILE_MAX_FPS), min(max_width, PROFILE_MAX_WIDTH), quality)
+                    return
+                streaming = False
+                ring = None
+                try:
+                    if is_snapshot_only(url):
                         # Poll snapshot URL and emit as multipart MJPEG so the browser sees a live stream
                         print("[stream-proxy] snapshot-only mode (polling): %s" % (url[:80] + "..." if len(url) > 80 else url))
                         self.send_response(200)
@@ -278,48 +1489,32 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                         self.end_headers()
                         boundary = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
                         frame_count = 0
+                        # Skip frames identical (or near-identical) to the last one sent; poll less while the scene is static.
+                        detector = SnapshotChangeDetector()
+                        ring = FRAME_RINGS.ring(ring_key(url))
+                        recent = ring.latest(RING_SECONDS) if ring is not None else None
+                        if recent:
+                            # Latest buffered frame first, so the viewer sees a picture before the first poll returns.
+                            detector.should_send(recent[2])
+                            self._send_parts((boundary, recent[2], b"\r\n"))
                         while True:
                             try:
-                                # Cache-bust so camera returns a fresh frame. Some cameras reject extra params.
-                                if "cgi-bin/camera" in url_lower or "oneshotimage" in url_lower:
-                                    sep = "&" if "?" in url else "?"
-                                    poll_url = url + sep + "COUNTER=" + str(int(_t.time() * 1000))
-                                elif "webcapture.jpg" in url_lower:
-                                    poll_url = url  # use as-is; some reject _t=
-                                else:
-                                    sep = "&" if "?" in url else "?"
-                                    poll_url = url + sep + "_t=" + str(int(_t.time() * 1000))
-                                headers = {"User-Agent": FEED_PROXY_USER_AGENT}
-                                # Some cameras require Referer from their own origin
-                                try:
-                                    base = urllib.parse.urlparse(poll_url)
-                                    if base.scheme and base.netloc:
-                                        headers["Referer"] = base.scheme + "://" + base.netloc + "/"
-                                except Exception:
-                                    pass
-                                req = urllib.request.Request(poll_url, headers=headers)
-                                with urllib.request.urlopen(req, timeout=15) as resp:
+                                poll_url = _snapshot_poll_url(url)
+                                with http_pool.urlopen(poll_url, headers=_snapshot_headers(poll_url), timeout=15) as resp:
                                     body = resp.read(2 * 1024 * 1024)
-                                # Accept raw JPEG/PNG, or extract JPEG from body (some CGIs send extra bytes)
-                                out = None
-                                if body and (body[:2] == b"\xff\xd8" or body[:8] == b"\x89PNG\r\n\x1a\n"):
-                                    out = body
-                                elif body and b"\xff\xd8" in body:
-                                    soi = body.find(b"\xff\xd8")
-                                    eoi = body.find(b"\xff\xd9", soi)
-                                    if eoi >= 0:
-                                        out = body[soi : eoi + 2]
+                                out = _extract_image(body)
                                 if out:
-                                    try:
-                                        self.wfile.write(boundary)
-                                        self.wfile.write(out)
-                                        self.wfile.write(b"\r\n")
-                                        self.wfile.flush()
-                                        frame_count += 1
-                                        if frame_count == 1:
-                                            print("[stream-proxy] snapshot-only: first frame sent")
-                                    except (BrokenPipeError, OSError):
-                                        break
+                                    # Over the egress budget the frame is skipped: the stream's fps drops instead.
+                                    if detector.should_send(out) and EGRESS.try_send(len(out)):
+                                        try:
+                                            self._send_parts((boundary, out, b"\r\n"))
+                                            if ring is not None:
+                                                ring.append(out, writer=self)
+                                            frame_count += 1
+                                            if frame_count == 1:
+                                                print("[stream-proxy] snapshot-only: first frame sent")
+                                        except (BrokenPipeError, OSError):
+                                            break
                                 elif body and len(body) > 0:
                                     print("[stream-proxy] snapshot-only: got %d bytes but not a valid JPEG/PNG (starts with %r)" % (len(body), body[:50]))
                                 # else: no valid frame this round; retry after sleep
@@ -328,47 +1523,102 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                             except Exception as e:
                                 print("[stream-proxy] snapshot poll error (retrying): %s" % e)
                                 # Retry instead of breaking so transient errors don't kill the stream
-                            _t.sleep(0.5)
+                            _t.sleep(detector.interval)
                     else:
-                        req = urllib.request.Request(url, headers={"User-Agent": FEED_PROXY_USER_AGENT})
-                        resp = urllib.request.urlopen(req, timeout=15)
-                        ct = resp.headers.get("Content-Type", "multipart/x-mixed-replace; boundary=frame")
-                        self.send_response(200)
-                        self.send_header("Content-Type", ct)
-                        self.send_header("Cache-Control", "no-cache")
-                        self.send_header("Connection", "close")
-                        self.end_headers()
-                        while True:
-                            chunk = resp.read(8192)
-                            if not chunk:
-                                break
-                            try:
-                                self.wfile.write(chunk)
-                                self.wfile.flush()
-                            except (BrokenPipeError, OSError):
-                                break
+                        ring = FRAME_RINGS.ring(ring_key(url))
+                        recent = ring.latest(RING_SECONDS, with_head=True) if ring is not None and ring.content_type else None
+                        if recent:
+                            # Replay the latest buffered part in the camera's own multipart format while upstream connects.
+                            self._send_stream_headers(ring.content_type)
+                            self._send_parts((recent[1], recent[2], b"\r\n"))
+                            streaming = True
+                        with http_pool.urlopen(url, headers={"User-Agent": FEED_PROXY_USER_AGENT}, timeout=15) as resp:
+                            ct = resp.headers.get("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                            part_head = None
+                            if recent and ct != ring.content_type:
+                                # Camera changed its multipart boundary since the replayed part: keep the client's
+                                # boundary and send each live frame as a new part under it.
+                                part_head = b"--%s\r\nContent-Type: image/jpeg\r\n\r\n" % _multipart_boundary(ring.content_type)
+                            if not recent:
+                                self._send_stream_headers(ct)
+                                streaming = True
+                            on_frame = None
+                            if ring is not None:
+                                ring.content_type = ct
+                                on_frame = lambda frame, head: ring.append(frame, head, writer=self)
+                            relay_mjpeg(resp, self.connection, self._relayed, on_frame, part_head)
                 except (BrokenPipeError, OSError):
                     pass
                 except Exception as e:
                     print("[stream-proxy] ERROR: %s" % e)
-                    try:
-                        self.send_error(504, "Stream proxy error: " + str(e))
-                    except (BrokenPipeError, OSError):
-                        pass
+                    if not streaming:
+                        try:
+                            self.send_error(504, "Stream proxy error: " + str(e))
+                        except (BrokenPipeError, OSError):
+                            pass
+                if ring is not None:
+                    ring.release(self)
                 return
             self.send_error(400, "Missing or invalid url")
             return
 
+        # Stream a camera's buffered history (last RING_SECONDS) at its original pace, then end.
+        if path == "/replay":
+            params = urllib.parse.parse_qs(parsed.query)
+            cam_id = (params.get("cam_id") or [""])[0].strip()
+            if not is_safe_cam_id(cam_id):
+                self.send_error(400, "Invalid cam_id")
+                return
+            try:
+                seconds = float((params.get("seconds") or [str(RING_SECONDS)])[0])
+            except ValueError:
+                seconds = float(RING_SECONDS)
+            seconds = max(0.0, min(seconds, float(RING_SECONDS)))
+            try:
+                catalog = get_cam_catalog()
+            except (OSError, ValueError):
+                catalog = None
+            cam = catalog.get(cam_id) if catalog is not None else None
+            # Same URL the viewer's /stream-proxy used (embed_url first, like app.js), so the ring is found.
+            url = ((cam.get("embed_url") or cam.get("url")) if cam else None) or cam_url_for_id(cam_id)
+            ring = FRAME_RINGS.get(ring_key(url)) if url else None
+            entries = ring.entries_since(_t.time() - seconds) if ring is not None else []
+            if not entries:
+                self.send_error(404, "No buffered frames for this camera")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("X-Replay-Frames", str(len(entries)))
+            self.send_header("Connection", "close")
+            self.end_headers()
+            try:
+                prev_ts = None
+                for entry in entries:
+                    data = ring.read(entry)
+                    if data is None:
+                        continue  # overwritten while replaying
+                    if prev_ts is not None:
+                        _t.sleep(min(1.0, max(0.0, entry[0] - prev_ts)))
+                    prev_ts = entry[0]
+                    EGRESS.send(len(data[1]))
+                    ct = b"image/png" if data[1][:8] == b"\x89PNG\r\n\x1a\n" else b"image/jpeg"
+                    self._send_parts((b"--frame\r\nContent-Type: " + ct + b"\r\n\r\n", data[1], b"\r\n"))
+                self._send_parts((b"--frame--\r\n",))
+            except (BrokenPipeError, OSError):
+                pass
+            return
+
         if path == "/thumbnail" and parsed.query:
             params = urllib.parse.parse_qs(parsed.query)
             url = params.get("url", [None])[0]
             if url and url.startswith(("http://", "https://")):
                 try:
-                    req = urllib.request.Request(
+                    with http_pool.urlopen(
                         url,
                         headers={"User-Agent": "Mozilla/5.0 (compatible; UPLINK_SITE/1.0)"},
-                    )
-                    with urllib.request.urlopen(req, timeout=12) as resp:
+                        timeout=12,
+                    ) as resp:
                         body = resp.read(512 * 1024)
                     if body[:8] == b"\x89PNG\r\n\x1a\n":
                         self.send_response(200)
@@ -416,11 +1666,11 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             url = params.get("url", [None])[0]
             if url and url.startswith(("http://", "https://")):
                 try:
-                    req = urllib.request.Request(
+                    with http_pool.urlopen(
                         url,
                         headers={"User-Agent": "Mozilla/5.0 (compatible; UPLINK_SITE/1.0)"},
-                    )
-                    with urllib.request.urlopen(req, timeout=10) as resp:
+                        timeout=10,
+                    ) as resp:
                         body = resp.read()
                         ct = resp.headers.get("Content-Type", "image/jpeg")
                         self.send_response(200)
@@ -455,9 +1705,7 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             if not is_safe_cam_id(cam_id):
                 self.send_error(400, "Invalid cam_id")
                 return
-            CAM_VISITS[cam_id] = CAM_VISITS.get(cam_id, 0) + 1
-            save_cam_visits()
-            count = CAM_VISITS[cam_id]
+            count = record_cam_visit(cam_id)
             print("Cam visit: id=%s count=%s" % (cam_id, count))
             body = json.dumps({"cam_id": cam_id, "count": count}).encode("utf-8")
             self.send_response(200)
@@ -483,7 +1731,7 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             if not is_safe_cam_id(cam_id):
                 self.send_error(400, "Invalid cam_id")
                 return
-            count = CAM_VISITS.get(cam_id, 0)
+            count = get_cam_visit_count(cam_id)
             body = json.dumps({"cam_id": cam_id, "count": count}).encode("utf-8")
             self.send_response(200)
             self.send_header("Content-Type", "application/json")
@@ -509,9 +1757,7 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 self.send_error(400, "Invalid cam_id")
                 return
             key = str(cam_id).strip()
-            rec = CAM_THUMBS.get(key, {})
-            up = int(rec.get("up", 0))
-            down = int(rec.get("down", 0))
+            up, down = get_cam_thumbs(key)
             body = json.dumps({"cam_id": key, "up": up, "down": down}).encode("utf-8")
             self.send_response(200)
             self.send_header("Content-Type", "application/json")
@@ -541,13 +1787,8 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 self.send_error(400, "Invalid vote (use vote=up or vote=down)")
                 return
             key = str(cam_id).strip()
-            rec = CAM_THUMBS.get(key, {"up": 0, "down": 0})
-            rec["up"] = int(rec.get("up", 0))
-            rec["down"] = int(rec.get("down", 0))
-            rec[vote] = rec[vote] + 1
-            CAM_THUMBS[key] = rec
-            save_cam_thumbs()
-            body = json.dumps({"cam_id": key, "up": rec["up"], "down": rec["down"]}).encode("utf-8")
+            up, down = record_cam_thumb(key, vote)
+            body = json.dumps({"cam_id": key, "up": up, "down": down}).encode("utf-8")
             self.send_response(200)
             self.send_header("Content-Type", "application/json")
             self.send_header("Content-Length", str(len(body)))
@@ -559,6 +1800,162 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 pass
             return
 
+        if path_lower == "/cams.json":
+            # Catalog sync happens here, before any header is written (may trail the file; replaying changes is harmless).
+            try:
+                self.catalog_version = CAM_CATALOG["version"] if get_cam_catalog() is not None else None
+            except (OSError, ValueError):
+                self.catalog_version = None
+
+        # cams.json with the health monitor's status/last_seen overlaid (static file when the monitor is off).
+        if path_lower == "/cams.json" and HEALTH_STORE is not None:
+            try:
+                body = cams_json_with_health()
+            except (OSError, ValueError) as e:
+                print("[health] cams.json overlay failed: %s" % e)
+                body = None
+            if body is not None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, OSError):
+                    pass
+                return
+
+        # Catalog queries: filtered / projected / paginated / sampled cams without downloading cams.json.
+        if path in ("/api/cams", "/api/cams/countries", "/api/cams/changes"):
+            params = {k: v[0] for k, v in urllib.parse.parse_qs(parsed.query).items()}
+            try:
+                catalog = get_cam_catalog()
+            except (OSError, ValueError) as e:
+                print("[catalog] cannot load cams.json: %s" % e)
+                catalog = None
+            if catalog is None:
+                self.send_error(503, "Catalog unavailable")
+                return
+            if path == "/api/cams/changes":
+                try:
+                    since = int(params.get("since", ""))
+                    limit = min(max(1, int(params.get("limit") or 1000)), 5000)
+                except ValueError:
+                    self.send_error(400, "Missing or invalid since")
+                    return
+                try:
+                    delta = CATALOG_LOG.changes(since, limit) if CATALOG_LOG_READY else {"version": 0, "resync": True}
+                except Exception as e:
+                    print("[catalog] changelog read failed: %s" % e)
+                    delta = {"version": CAM_CATALOG["version"], "resync": True}
+                self._send_json(delta, cache="no-store")
+                return
+            if path == "/api/cams/countries":
+                self._send_json({"countries": catalog.countries(thumbnail=params.get("thumbnail") in ("1", "true"))})
+                return
+            try:
+                result = catalog.query(params)
+            except ValueError as e:
+                self.send_error(400, "Invalid query: %s" % e)
+                return
+            result["version"] = CAM_CATALOG["version"]
+            self._send_json(result)
+            return
+
+        # Current weather: ?cam_ids=1,2,3 (carousel batch) or ?lat=..&lon=.. -> {"weather": {key: current or null}}.
+        if path == "/api/weather":
+            params = urllib.parse.parse_qs(parsed.query)
+            points = {}
+            if params.get("cam_ids"):
+                cam_ids = [c for c in params["cam_ids"][0].split(",") if is_safe_cam_id(c)][:WEATHER_MAX_IDS]
+                try:
+                    catalog = get_cam_catalog()
+                except (OSError, ValueError):
+                    catalog = None
+                for cam_id in cam_ids:
+                    cam = catalog.get(cam_id) if catalog is not None else None
+                    coords = weather.cam_coordinates(cam, GEOCODER) if cam is not None else None
+                    points[cam_id] = coords
+            else:
+                try:
+                    lat = float((params.get("lat") or [""])[0])
+                    lon = float((params.get("lon") or [""])[0])
+                except ValueError:
+                    lat = lon = None
+                if lat is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    self.send_error(400, "Use cam_ids= or lat= and lon=")
+                    return
+                points["%s,%s" % (lat, lon)] = (lat, lon)
+            found = WEATHER.get_many([p for p in points.values() if p])
+            self._send_json({"weather": {k: found.get(p) if p else None for k, p in points.items()}},
+                            cache="public, max-age=300")
+            return
+
+        # Carousel order: every cam once, randomized but weighted towards cams whose frames load reliably and fast.
+        if path == "/api/cam-order":
+            ids = list(CAM_URLS_BY_ID["urls"]) if _load_cam_urls() else []
+            offline = set()
+            if HEALTH_STORE is not None:
+                try:
+                    offline = {c for c, (status, _) in HEALTH_STORE.status(ids).items() if status == "OFFLINE"}
+                except Exception as e:
+                    print("[health] cannot read status: %s" % e)
+            weights = {c: round(RELIABILITY.weight(c, c in offline), 4)
+                       for c in set(RELIABILITY.summary()).union(offline)}
+            self._send_json({"order": RELIABILITY.order(ids, offline), "weights": weights,
+                             "default": RELIABILITY.weight(None)})
+            return
+
+        # Server-Sent Events: batched stats updates for the listed cams, for as long as the client stays connected.
+        if path == "/api/live":
+            params = urllib.parse.parse_qs(parsed.query or "")
+            cam_ids = [c.strip() for c in (params.get("cam_ids") or [""])[0].split(",") if c.strip()]
+            if not cam_ids or len(cam_ids) > LIVE_MAX_CAMS or not all(is_safe_cam_id(c) for c in cam_ids):
+                self.send_error(400, "Invalid cam_ids")
+                return
+            if LIVE.subscribers() >= LIVE_MAX_SUBSCRIBERS:
+                self._send_busy(503, "Too many live subscribers", LIVE_KEEPALIVE)
+                return
+            sub = LIVE.subscribe(cam_ids)
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("X-Accel-Buffering", "no")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.wfile.write(b"retry: 5000\n\n")
+                while True:
+                    batch = sub.next_batch(LIVE_KEEPALIVE)
+                    if sub.closed:
+                        break
+                    if batch:
+                        self.wfile.write(b"event: stats\ndata: " + json.dumps({"cams": batch}).encode("utf-8") + b"\n\n")
+                    else:
+                        self.wfile.write(b": keep-alive\n\n")
+            except (BrokenPipeError, OSError):
+                pass
+            finally:
+                sub.close()
+            return
+
+        # Carousel tells us which cams it shows next so the health monitor checks them first.
+        if path == "/api/health-hint":
+            params = urllib.parse.parse_qs(parsed.query)
+            cam_ids = [c for c in (params.get("cam_ids") or [""])[0].split(",") if is_safe_cam_id(c)][:20]
+            if HEALTH_STORE is not None and cam_ids:
+                try:
+                    if MONITOR is not None:
+                        MONITOR.hint(cam_ids)
+                    else:
+                        HEALTH_STORE.hint(cam_ids)
+                except Exception as e:
+                    print("[health] hint failed: %s" % e)
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
         # Returns the list of cam ids that have a snapshot so the matrix can show only those and link thumbnail → stream by id.
         if path == "/api/thumbnail-ids":
             list_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thumbnails", "list.json")
@@ -579,24 +1976,149 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 pass
             return
 
+        thumb = THUMBNAIL_PATH_RE.match(path)
+        if thumb and thumb_pack.THUMB_STORE == "pack" and self._serve_packed_thumbnail(thumb.group(1)):
+            return
+
         return http.server.SimpleHTTPRequestHandler.do_GET(self)
 
 
-class ReuseTCPServer(socketserver.TCPServer):
+class ReuseTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """One thread per connection; admission control in Handler.do_GET keeps camera fetches and streams bounded."""
+
     allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class ReusePortTCPServer(ReuseTCPServer):
+    """Worker listener: every worker binds the same port; the kernel spreads connections across them."""
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        ReuseTCPServer.server_bind(self)
+
+
+def print_banner():
+    print("Serving UPLINK_SITE at http://localhost:" + str(PORT))
+    print("Feed proxy: /feed-proxy?url=... (for HTTPS)")
+    print("Thumbnail: /thumbnail?url=... (matrix static previews)")
+    print("Snapshot proxy: /snapshot-proxy?url=...")
+    print("Snapshot frame (live viewer): /snapshot-frame?url=...")
+    print("Cam visits: /api/cam-visit?cam_id=...")
+    print("Live stats (SSE): /api/live?cam_ids=...")
+    if HEALTH_MONITOR:
+        print("Health monitor: on (%s), /api/health-hint?cam_ids=..." % health_monitor.HEALTH_DB)
+    print("Replay (last %ds of a relayed cam): /replay?cam_id=...&seconds=..." % RING_SECONDS)
+    print("IP info: /ipinfo?ip=...")
+    if TRUST_PROXY:
+        print("Client IPs: X-Forwarded-For, %d trusted proxy hop(s) (TRUST_PROXY)" % TRUST_PROXY)
+    else:
+        print("Client IPs: socket address; behind Railway/Render set TRUST_PROXY=1 or every user shares one rate limit")
+    if DEBUG_TOKEN:
+        print("Debug: /debug/profile?seconds=N, /debug/tasks (X-Debug-Token header)")
+
+
+def run_worker(shared_socket=None, slot=0):
+    """Serve forever in this process: own SO_REUSEPORT listener, or the supervisor's inherited socket.
+    Worker slot 0 also runs the health monitor (HEALTH_MONITOR=1)."""
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    # Ctrl-C reaches the whole process group: the supervisor handles it and SIGTERMs the workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    start_profiler()
+    FRAME_CACHE.start()
+    RELIABILITY.start()
+    if slot == 0:
+        run_health_monitor()
+    else:
+        start_health_monitor()
+    if shared_socket is None:
+        httpd = ReusePortTCPServer(("", PORT), Handler)
+    else:
+        httpd = ReuseTCPServer(("", PORT), Handler, bind_and_activate=False)
+        httpd.socket.close()
+        httpd.socket = shared_socket
+    with httpd:
+        httpd.serve_forever()
+
+
+def run_supervisor(workers):
+    """Pre-fork WORKERS processes and restart any that exit; SIGTERM/SIGINT stops them all."""
+    shared_socket = None
+    if not hasattr(socket, "SO_REUSEPORT"):
+        # No SO_REUSEPORT (non-Linux/BSD): workers accept() on one inherited listening socket instead.
+        shared_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        shared_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        shared_socket.bind(("", PORT))
+        shared_socket.listen(128)
+    children = {}
+    stopping = []
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(shared_socket, slot)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 0
+            except BaseException as e:
+                print("[worker %d] crashed: %s" % (slot, e))
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (slot, _t.monotonic())
+        print("[supervisor] worker %d started (pid %d)" % (slot, pid))
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(workers):
+        spawn(slot)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot, started = children.pop(pid, (None, 0))
+        if slot is None or stopping:
+            continue
+        print("[supervisor] worker %d (pid %d) exited with status %d; restarting" % (slot, pid, status))
+        if _t.monotonic() - started < WORKER_MIN_UPTIME:
+            _t.sleep(1.0)
+        spawn(slot)
+    export_counters()
 
 
 if __name__ == "__main__":
     # Serve from the directory containing this script (so Render finds index.html)
     os.chdir(SCRIPT_DIR)
-    load_cam_visits()
-    load_cam_thumbs()
-    with ReuseTCPServer(("", PORT), Handler) as httpd:
-        print("Serving UPLINK_SITE at http://localhost:" + str(PORT))
-        print("Feed proxy: /feed-proxy?url=... (for HTTPS)")
-        print("Thumbnail: /thumbnail?url=... (matrix static previews)")
-        print("Snapshot proxy: /snapshot-proxy?url=...")
-        print("Snapshot frame (live viewer): /snapshot-frame?url=...")
-        print("Cam visits: /api/cam-visit?cam_id=...")
-        print("IP info: /ipinfo?ip=...")
-        httpd.serve_forever()
+    init_counters()
+    if FRAME_CACHE.budget > 0:
+        # Loaded before forking so workers share the mapped pages.
+        print("Frame cache: %d frames from %s" % (FRAME_CACHE.load(FRAME_STALE_MAX), FRAME_CACHE_PATH))
+    RELIABILITY.load()
+    print_banner()
+    if WORKERS > 1:
+        print("Pre-fork mode: %d workers, shared counters in %s" % (WORKERS, STATE_DB_PATH))
+        sys.stdout.flush()
+        run_supervisor(WORKERS)
+    else:
+        start_profiler()
+        FRAME_CACHE.start()
+        RELIABILITY.start()
+        run_health_monitor()
+        try:
+            with ReuseTCPServer(("", PORT), Handler) as httpd:
+                httpd.serve_forever()
+        finally:
+            export_counters()
@@ -0,0 +1,468 @@
+"""
+Cross-process state (SQLite, WAL) for server.py's multi-worker mode and background jobs.
+
+CAM_VISITS / CAM_THUMBS are process-local dicts; with several worker processes each would
+count on its own and overwrite the others' JSON files. SharedCounters keeps visits and thumbs
+votes in one SQLite file that every worker updates atomically. CamHealthStore keeps per-camera
+health (status, last_seen, consecutive failures) updated one row at a time by the health
+monitor and by live proxy outcomes, instead of rewriting cams.json. CatalogLog numbers every
+change to cams.json (add / remove / update per camera) so clients can fetch only the delta.
+ThumbnailIndex maps cam ids to thumbnail blobs in thumb_pack.py's pack file.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+BUSY_TIMEOUT_MS = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cam_visits (cam_id TEXT PRIMARY KEY, count INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS cam_thumbs (
+    cam_id TEXT PRIMARY KEY,
+    up INTEGER NOT NULL DEFAULT 0,
+    down INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+_HEALTH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cam_health (
+    cam_id TEXT PRIMARY KEY,
+    status TEXT,
+    last_seen TEXT,
+    last_checked REAL NOT NULL DEFAULT 0,
+    fails INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    hinted REAL NOT NULL DEFAULT 0,
+    updated REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS cam_health_updated ON cam_health (updated);
+"""
+
+
+_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_cams (cam_id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    version INTEGER PRIMARY KEY,
+    cam_id TEXT NOT NULL,
+    op TEXT NOT NULL,
+    data TEXT,
+    ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+_THUMB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thumb_blobs (
+    digest TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    ctype TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS thumb_index (cam_id TEXT PRIMARY KEY, digest TEXT NOT NULL, captured REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS thumb_index_digest ON thumb_index (digest);
+CREATE TABLE IF NOT EXISTS thumb_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class _SQLiteStore:
+    """One connection per thread (opened lazily, so safe across fork)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=%d" % BUSY_TIMEOUT_MS)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class SharedCounters(_SQLiteStore):
+    """Visit counts and thumbs votes shared by every worker."""
+
+    def init(self, visits=None, thumbs=None):
+        """Create tables; if empty, seed from the legacy JSON dicts (cam_visits.json / cam_thumbs.json)."""
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if visits and conn.execute("SELECT COUNT(*) FROM cam_visits").fetchone()[0] == 0:
+                conn.executemany("INSERT INTO cam_visits (cam_id, count) VALUES (?, ?)",
+                                 [(str(k), int(v)) for k, v in visits.items()])
+            if thumbs and conn.execute("SELECT COUNT(*) FROM cam_thumbs").fetchone()[0] == 0:
+                conn.executemany("INSERT INTO cam_thumbs (cam_id, up, down) VALUES (?, ?, ?)",
+                                 [(str(k), int(v.get("up", 0)), int(v.get("down", 0))) for k, v in thumbs.items()])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def incr_visit(self, cam_id):
+        """Add one visit; returns the new total."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO cam_visits (cam_id, count) VALUES (?, 1) "
+                "ON CONFLICT(cam_id) DO UPDATE SET count = count + 1", (cam_id,))
+            count = conn.execute("SELECT count FROM cam_visits WHERE cam_id = ?", (cam_id,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    def visit_count(self, cam_id):
+        row = self._conn().execute("SELECT count FROM cam_visits WHERE cam_id = ?", (cam_id,)).fetchone()
+        return row[0] if row else 0
+
+    def all_visits(self):
+        """{cam_id: count} for every cam with visits."""
+        return dict(self._conn().execute("SELECT cam_id, count FROM cam_visits").fetchall())
+
+    def stats(self, cam_ids):
+        """{cam_id: (visits, up, down)} for several cams in one read (cams without rows are left out)."""
+        out = {}
+        cam_ids = [str(c) for c in cam_ids]
+        conn = self._conn()
+        for start in range(0, len(cam_ids), 500):
+            chunk = cam_ids[start : start + 500]
+            marks = ",".join("?" * len(chunk))
+            for cam_id, count in conn.execute(
+                    "SELECT cam_id, count FROM cam_visits WHERE cam_id IN (%s)" % marks, chunk).fetchall():
+                out[cam_id] = (count, 0, 0)
+            for cam_id, up, down in conn.execute(
+                    "SELECT cam_id, up, down FROM cam_thumbs WHERE cam_id IN (%s)" % marks, chunk).fetchall():
+                out[cam_id] = (out.get(cam_id, (0,))[0], up, down)
+        return out
+
+    def all_thumbs(self):
+        """{cam_id: {"up": N, "down": M}} for every cam with votes (cam_thumbs.json layout)."""
+        return {cam_id: {"up": up, "down": down}
+                for cam_id, up, down in self._conn().execute("SELECT cam_id, up, down FROM cam_thumbs").fetchall()}
+
+    def thumbs(self, cam_id):
+        """(up, down) for a cam."""
+        row = self._conn().execute("SELECT up, down FROM cam_thumbs WHERE cam_id = ?", (cam_id,)).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def vote(self, cam_id, vote):
+        """Record vote ("up" or "down"); returns the new (up, down)."""
+        column = "up" if vote == "up" else "down"
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO cam_thumbs (cam_id, up, down) VALUES (?, ?, ?) "
+                "ON CONFLICT(cam_id) DO UPDATE SET %s = %s + 1" % (column, column),
+                (cam_id, 1 if column == "up" else 0, 1 if column == "down" else 0))
+            row = conn.execute("SELECT up, down FROM cam_thumbs WHERE cam_id = ?", (cam_id,)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return (row[0], row[1])
+
+
+class CamHealthStore(_SQLiteStore):
+    """Per-camera health rows: status ("ACTIVE"/"OFFLINE"), last_seen, last check time and consecutive failures."""
+
+    def init(self):
+        self._conn().executescript(_HEALTH_SCHEMA)
+
+    def record(self, cam_id, ok, message="", offline_after=3, now=None):
+        """Store one check result; returns the consecutive failure count.
+        A success sets ACTIVE and last_seen; offline_after failures in a row set OFFLINE."""
+        now = time.time() if now is None else now
+        conn = self._conn()
+        if ok:
+            conn.execute(
+                "INSERT INTO cam_health (cam_id, status, last_seen, last_checked, fails, message, updated) "
+                "VALUES (?, 'ACTIVE', ?, ?, 0, ?, ?) "
+                "ON CONFLICT(cam_id) DO UPDATE SET status = 'ACTIVE', last_seen = excluded.last_seen, "
+                "last_checked = excluded.last_checked, fails = 0, message = excluded.message, updated = excluded.updated",
+                (cam_id, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)), now, message, now))
+            return 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO cam_health (cam_id, status, last_checked, fails, message, updated) "
+                "VALUES (?, CASE WHEN ? <= 1 THEN 'OFFLINE' END, ?, 1, ?, ?) "
+                "ON CONFLICT(cam_id) DO UPDATE SET fails = fails + 1, "
+                "status = CASE WHEN fails + 1 >= ? THEN 'OFFLINE' ELSE status END, "
+                "last_checked = excluded.last_checked, message = excluded.message, updated = excluded.updated",
+                (cam_id, offline_after, now, message, now, offline_after))
+            fails = conn.execute("SELECT fails FROM cam_health WHERE cam_id = ?", (cam_id,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return fails
+
+    def hint(self, cam_ids, now=None):
+        """Mark cams as about to be shown (the monitor checks them next)."""
+        now = time.time() if now is None else now
+        self._conn().executemany(
+            "INSERT INTO cam_health (cam_id, hinted, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(cam_id) DO UPDATE SET hinted = excluded.hinted, updated = excluded.updated",
+            [(str(c), now, now) for c in cam_ids])
+
+    def status(self, cam_ids):
+        """{cam_id: (status, last_seen)} for the cams that have a health row."""
+        out = {}
+        cam_ids = [str(c) for c in cam_ids]
+        conn = self._conn()
+        for start in range(0, len(cam_ids), 500):
+            chunk = cam_ids[start : start + 500]
+            rows = conn.execute("SELECT cam_id, status, last_seen FROM cam_health WHERE cam_id IN (%s)"
+                                % ",".join("?" * len(chunk)), chunk).fetchall()
+            out.update((row[0], (row[1], row[2])) for row in rows)
+        return out
+
+    def rows(self, updated_after=None, cam_ids=None):
+        """{cam_id: {"status", "last_seen", "last_checked", "fails", "message", "hinted", "updated"}}.
+
+        cam_ids limits the result to those cams (looked up by key, not by scanning the table).
+        """
+        sql = "SELECT cam_id, status, last_seen, last_checked, fails, message, hinted, updated FROM cam_health"
+        keys = ("status", "last_seen", "last_checked", "fails", "message", "hinted", "updated")
+        conn = self._conn()
+        if cam_ids is None:
+            args = ()
+            if updated_after is not None:
+                sql += " WHERE updated > ?"
+                args = (updated_after,)
+            return {row[0]: dict(zip(keys, row[1:])) for row in conn.execute(sql, args).fetchall()}
+        out = {}
+        cam_ids = [str(c) for c in cam_ids]
+        for start in range(0, len(cam_ids), 500):
+            chunk = cam_ids[start : start + 500]
+            args = list(chunk)
+            where = "cam_id IN (%s)" % ",".join("?" * len(chunk))
+            if updated_after is not None:
+                where += " AND updated > ?"
+                args.append(updated_after)
+            rows = conn.execute(sql + " WHERE " + where, args).fetchall()
+            out.update((row[0], dict(zip(keys, row[1:]))) for row in rows)
+        return out
+
+    def version(self):
+        """Latest update time (changes whenever any row changes)."""
+        return self._conn().execute("SELECT MAX(updated) FROM cam_health").fetchone()[0] or 0
+
+
+class CatalogLog(_SQLiteStore):
+    """Versioned changelog of cams.json: the last synced copy of every cam plus numbered changes.
+
+    version is bumped once per changed cam. floor is the oldest version a client can sync from;
+    it rises on the first sync (the existing catalog is a baseline, not a burst of adds) and
+    when old changes are compacted away.
+    """
+
+    def init(self):
+        self._conn().executescript(_CATALOG_SCHEMA)
+
+    def _meta(self, conn, key, default=None):
+        row = conn.execute("SELECT value FROM catalog_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, conn, key, value):
+        conn.execute("INSERT INTO catalog_meta (key, value) VALUES (?, ?) "
+                     "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, str(value)))
+
+    def version(self):
+        """(version, floor)."""
+        conn = self._conn()
+        return (int(self._meta(conn, "version", 0)), int(self._meta(conn, "floor", 0)))
+
+    def sync(self, cams, keep=5000, now=None):
+        """Record the differences between cams (parsed cams.json) and the last synced copy; returns the version.
+
+        Safe to call from several processes: the first one to see a new file records it, the
+        others find the digest unchanged. Only the newest `keep` changes are kept.
+        """
+        now = time.time() if now is None else now
+        new = {}
+        for cam in cams:
+            if isinstance(cam, dict) and cam.get("id") is not None:
+                new[str(cam["id"])] = json.dumps(cam, sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha1("\n".join(k + "\t" + new[k] for k in sorted(new)).encode("utf-8")).hexdigest()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = int(self._meta(conn, "version", 0))
+            if self._meta(conn, "digest") == digest:
+                conn.execute("COMMIT")
+                return version
+            old = dict(conn.execute("SELECT cam_id, data FROM catalog_cams").fetchall())
+            baseline = not old and not version
+            changes = [(cam_id, "remove", None) for cam_id in old if cam_id not in new]
+            changes += [(cam_id, "add" if cam_id not in old else "update", data)
+                        for cam_id, data in new.items() if old.get(cam_id) != data]
+            if baseline:
+                version += 1
+                self._set_meta(conn, "floor", version)
+            else:
+                rows = []
+                for cam_id, op, data in changes:
+                    version += 1
+                    rows.append((version, cam_id, op, data, now))
+                conn.executemany("INSERT INTO catalog_changes (version, cam_id, op, data, ts) VALUES (?, ?, ?, ?, ?)", rows)
+            conn.executemany("DELETE FROM catalog_cams WHERE cam_id = ?", [(c,) for c, op, _ in changes if op == "remove"])
+            conn.executemany("INSERT INTO catalog_cams (cam_id, data) VALUES (?, ?) "
+                             "ON CONFLICT(cam_id) DO UPDATE SET data = excluded.data",
+                             [(c, d) for c, op, d in changes if op != "remove"])
+            if version - keep > int(self._meta(conn, "floor", 0)):
+                conn.execute("DELETE FROM catalog_changes WHERE version <= ?", (version - keep,))
+                self._set_meta(conn, "floor", version - keep)
+            self._set_meta(conn, "version", version)
+            self._set_meta(conn, "digest", digest)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return version
+
+    def changes(self, since, limit=1000):
+        """Delta after version `since`: {"version", "changes": [{"op", "id", "cam"}], "more"}, or
+        {"version", "resync": True} when since is older than the floor (or newer than the log)."""
+        conn = self._conn()
+        version, floor = self.version()
+        if since < floor or since > version:
+            return {"version": version, "resync": True}
+        rows = conn.execute("SELECT version, cam_id, op, data FROM catalog_changes WHERE version > ? "
+                            "ORDER BY version LIMIT ?", (since, limit + 1)).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        latest = {}  # one entry per cam: its last change in the range
+        for v, cam_id, op, data in rows:
+            latest.pop(cam_id, None)
+            latest[cam_id] = (op, data)
+        out = []
+        for cam_id, (op, data) in latest.items():
+            change = {"op": op, "id": cam_id}
+            if data is not None:
+                change["cam"] = json.loads(data)
+            out.append(change)
+        return {"version": rows[-1][0] if more else version, "changes": out, "more": more}
+
+
+class ThumbnailIndex(_SQLiteStore):
+    """cam_id -> blob (offset, length, content type) in the current pack file generation, plus capture time.
+
+    Blobs are keyed by content digest, so identical thumbnails (e.g. the same "no signal" image)
+    are stored once. Writers serialize on thumb_pack's lock file; this only keeps the rows.
+    """
+
+    def init(self):
+        self._conn().executescript(_THUMB_SCHEMA)
+
+    def _meta(self, conn, key, default=0):
+        row = conn.execute("SELECT value FROM thumb_meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else default
+
+    def _set_meta(self, conn, key, value):
+        conn.execute("INSERT INTO thumb_meta (key, value) VALUES (?, ?) "
+                     "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, str(value)))
+
+    def generation(self):
+        return self._meta(self._conn(), "generation")
+
+    def lookup(self, cam_id):
+        """(generation, digest, offset, length, ctype, captured) for a cam, or None; one consistent read."""
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(
+                "SELECT i.digest, b.offset, b.length, b.ctype, i.captured FROM thumb_index i "
+                "JOIN thumb_blobs b ON b.digest = i.digest WHERE i.cam_id = ?", (str(cam_id),)).fetchone()
+            generation = self._meta(conn, "generation")
+        finally:
+            conn.execute("COMMIT")
+        return (generation,) + tuple(row) if row else None
+
+    def blob(self, digest):
+        """(offset, length, ctype) of a stored blob, or None."""
+        return self._conn().execute("SELECT offset, length, ctype FROM thumb_blobs WHERE digest = ?", (digest,)).fetchone()
+
+    def put(self, cam_id, digest, offset, length, ctype, captured):
+        """Point cam_id at a blob (added if new). A blob no cam uses any more is dropped and counted as dead bytes."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO thumb_blobs (digest, offset, length, ctype) VALUES (?, ?, ?, ?)",
+                         (digest, offset, length, ctype))
+            row = conn.execute("SELECT digest FROM thumb_index WHERE cam_id = ?", (str(cam_id),)).fetchone()
+            conn.execute("INSERT INTO thumb_index (cam_id, digest, captured) VALUES (?, ?, ?) "
+                         "ON CONFLICT(cam_id) DO UPDATE SET digest = excluded.digest, captured = excluded.captured",
+                         (str(cam_id), digest, captured))
+            if row and row[0] != digest:
+                self._release(conn, row[0])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def remove(self, cam_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT digest FROM thumb_index WHERE cam_id = ?", (str(cam_id),)).fetchone()
+            if row:
+                conn.execute("DELETE FROM thumb_index WHERE cam_id = ?", (str(cam_id),))
+                self._release(conn, row[0])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _release(self, conn, digest):
+        if conn.execute("SELECT 1 FROM thumb_index WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+            return
+        row = conn.execute("SELECT length FROM thumb_blobs WHERE digest = ?", (digest,)).fetchone()
+        if row:
+            conn.execute("DELETE FROM thumb_blobs WHERE digest = ?", (digest,))
+            self._set_meta(conn, "dead_bytes", self._meta(conn, "dead_bytes") + row[0])
+
+    def captured(self):
+        """{cam_id: capture time} for every indexed thumbnail."""
+        return dict(self._conn().execute("SELECT cam_id, captured FROM thumb_index").fetchall())
+
+    def blobs(self):
+        """[(digest, offset, length)] of every live blob, in pack order."""
+        return self._conn().execute("SELECT digest, offset, length FROM thumb_blobs ORDER BY offset").fetchall()
+
+    def swap_generation(self, generation, offsets):
+        """After compaction: blobs moved to {digest: offset} in pack `generation`, nothing dead."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("UPDATE thumb_blobs SET offset = ? WHERE digest = ?", [(o, d) for d, o in offsets.items()])
+            self._set_meta(conn, "generation", generation)
+            self._set_meta(conn, "dead_bytes", 0)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self):
+        conn = self._conn()
+        cams, blobs, live = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM thumb_index), COUNT(*), COALESCE(SUM(length), 0) FROM thumb_blobs").fetchone()
+        return {"cams": cams, "blobs": blobs, "live_bytes": live, "dead_bytes": self._meta(conn, "dead_bytes"),
+                "generation": self._meta(conn, "generation")}
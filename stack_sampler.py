@@ -0,0 +1,73 @@
+"""
+Low-overhead sampling profiler for the running server.
+
+A background thread snapshots every thread's stack (sys._current_frames) HZ times a second
+and keeps the last WINDOW seconds of samples in a ring, so /debug/profile can answer
+immediately with what the process was doing, even while the request thread itself is busy
+relaying a stream. Output is collapsed stacks ("thread;outer;...;inner count" per line),
+ready for flamegraph.pl, speedscope or inferno.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+
+
+class StackSampler:
+    def __init__(self, hz=50, window=60):
+        self.hz = max(1, int(hz))
+        self.window = max(1, int(window))
+        self._samples = collections.deque(maxlen=self.hz * self.window)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        interval = 1.0 / self.hz
+        me = threading.get_ident()
+        while not self._stop.wait(interval):
+            now = time.monotonic()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stacks.append(self._collapse(names.get(ident, "thread-%d" % ident), frame))
+            with self._lock:
+                self._samples.append((now, stacks))
+
+    @staticmethod
+    def _collapse(thread_name, frame):
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append("%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), frame.f_lineno))
+            frame = frame.f_back
+        parts.append(thread_name)
+        parts.reverse()
+        return ";".join(p.replace(";", ":") for p in parts)
+
+    def collapsed(self, seconds):
+        """Collapsed-stack text for samples taken in the last `seconds` (at most WINDOW)."""
+        cutoff = time.monotonic() - min(float(seconds), self.window)
+        counts = collections.Counter()
+        with self._lock:
+            samples = [s for t, s in self._samples if t >= cutoff]
+        for stacks in samples:
+            counts.update(stacks)
+        lines = ["%s %d" % (stack, n) for stack, n in counts.most_common()]
+        return "\n".join(lines) + ("\n" if lines else ""), len(samples)
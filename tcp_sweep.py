@@ -0,0 +1,189 @@
+"""
+Fast TCP-connect pre-sweep for camera hosts.
+
+Most dead cameras never answer at all, and each one costs the full HTTP timeout
+in check_streams.py / ghost_verify.py. This opens non-blocking connects to every
+host:port at once (bounded by MAX_IN_FLIGHT) with a short timeout, so only hosts
+that accept a connection go on to the full HTTP/frame check.
+
+Usage (standalone):
+  python3 tcp_sweep.py                  # sweep every cam in cams.json, print refused/timed-out ids
+  python3 tcp_sweep.py --timeout 1.5 --concurrency 2000
+"""
+import collections
+import concurrent.futures
+import errno
+import json
+import os
+import selectors
+import socket
+import sys
+import time
+from urllib.parse import urlsplit
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMS_JSON = os.path.join(SCRIPT_DIR, "cams.json")
+CONNECT_TIMEOUT = 2.0
+# Each in-flight probe holds one file descriptor; keep under the usual 1024/4096 soft limits.
+MAX_IN_FLIGHT = 900
+DNS_WORKERS = 32
+
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, getattr(errno, "WSAEWOULDBLOCK", -1))
+
+
+def cam_address(url):
+    """Return (host, port) for a camera URL, or None if the URL has no usable host."""
+    if not url or not isinstance(url, str):
+        return None
+    try:
+        parsed = urlsplit(url.strip().replace("&amp;", "&"))
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            return None
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    except ValueError:
+        return None
+    return (parsed.hostname, port)
+
+
+def _resolve(address):
+    host, port = address
+    try:
+        family, _, _, _, sockaddr = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0]
+        return family, sockaddr
+    except (socket.gaierror, UnicodeError, OSError) as e:
+        return None, "dns: %s" % e
+
+
+def _resolve_all(addresses):
+    """Map address -> (family, sockaddr) or (None, error). Literal IPs skip the thread pool."""
+    resolved = {}
+    names = []
+    for addr in addresses:
+        host, port = addr
+        try:
+            socket.inet_pton(socket.AF_INET, host)
+            resolved[addr] = (socket.AF_INET, (host, port))
+            continue
+        except OSError:
+            pass
+        names.append(addr)
+    if names:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=DNS_WORKERS) as ex:
+            for addr, res in zip(names, ex.map(_resolve, names)):
+                resolved[addr] = res
+    return resolved
+
+
+def sweep(addresses, timeout=CONNECT_TIMEOUT, concurrency=MAX_IN_FLIGHT):
+    """
+    Probe every (host, port) with a non-blocking connect.
+    Returns {(host, port): (ok, message)}; ok means the host accepted the TCP connection.
+    """
+    unique = list(dict.fromkeys(a for a in addresses if a))
+    results = {}
+    resolved = _resolve_all(unique)
+    pending = collections.deque()
+    for addr in unique:
+        family, sockaddr = resolved[addr]
+        if family is None:
+            results[addr] = (False, sockaddr)
+        else:
+            pending.append((addr, family, sockaddr))
+
+    sel = selectors.DefaultSelector()
+    # Timeout is the same for every probe, so insertion order is deadline order.
+    in_flight = collections.OrderedDict()
+    try:
+        while pending or in_flight:
+            while pending and len(in_flight) < concurrency:
+                addr, family, sockaddr = pending.popleft()
+                try:
+                    sock = socket.socket(family, socket.SOCK_STREAM)
+                except OSError as e:
+                    # Out of descriptors: retry once some probes finish.
+                    if in_flight:
+                        pending.appendleft((addr, family, sockaddr))
+                        break
+                    results[addr] = (False, str(e))
+                    continue
+                sock.setblocking(False)
+                err = sock.connect_ex(sockaddr)
+                if err == 0:
+                    results[addr] = (True, "connected")
+                    sock.close()
+                elif err in _IN_PROGRESS:
+                    sel.register(sock, selectors.EVENT_WRITE, addr)
+                    in_flight[sock] = (addr, time.monotonic() + timeout)
+                else:
+                    results[addr] = (False, os.strerror(err))
+                    sock.close()
+            if not in_flight:
+                continue
+            first_deadline = next(iter(in_flight.values()))[1]
+            wait = max(0.0, first_deadline - time.monotonic())
+            for key, _ in sel.select(timeout=wait):
+                sock = key.fileobj
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                results[key.data] = (True, "connected") if err == 0 else (False, os.strerror(err))
+                sel.unregister(sock)
+                del in_flight[sock]
+                sock.close()
+            now = time.monotonic()
+            while in_flight:
+                sock, (addr, deadline) = next(iter(in_flight.items()))
+                if deadline > now:
+                    break
+                results[addr] = (False, "connect timeout")
+                sel.unregister(sock)
+                del in_flight[sock]
+                sock.close()
+    finally:
+        for sock in in_flight:
+            sock.close()
+        sel.close()
+    return results
+
+
+def sweep_cams(cams, timeout=CONNECT_TIMEOUT, concurrency=MAX_IN_FLIGHT, url_for=None):
+    """
+    Sweep the hosts of a cams.json list. url_for(cam) picks the URL to probe (default: cam url).
+    Returns {cam_id: (ok, message)}; cams without a usable URL get (False, "invalid URL").
+    """
+    if url_for is None:
+        url_for = lambda c: c.get("url") or c.get("embed_url") or ""
+    cam_addrs = [(cam.get("id"), cam_address(url_for(cam))) for cam in cams]
+    by_addr = sweep([a for _, a in cam_addrs if a], timeout=timeout, concurrency=concurrency)
+    return {cam_id: by_addr[a] if a else (False, "invalid URL") for cam_id, a in cam_addrs}
+
+
+def main():
+    timeout = CONNECT_TIMEOUT
+    concurrency = MAX_IN_FLIGHT
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        if args[i] == "--timeout" and i + 1 < len(args):
+            timeout = float(args[i + 1])
+            i += 1
+        elif args[i] == "--concurrency" and i + 1 < len(args):
+            concurrency = int(args[i + 1])
+            i += 1
+        i += 1
+
+    with open(CAMS_JSON, "r", encoding="utf-8") as f:
+        cams = json.load(f)
+    start = time.monotonic()
+    results = sweep_cams(cams, timeout=timeout, concurrency=concurrency)
+    elapsed = time.monotonic() - start
+    up = 0
+    for cam_id, (ok, msg) in results.items():
+        if ok:
+            up += 1
+        else:
+            print("[NO CONNECT] id=%s %s" % (cam_id, msg))
+    print()
+    print("Swept %d cams in %.1fs: %d accept connections, %d do not." % (len(results), elapsed, up, len(results) - up))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Packed thumbnail store: every thumbnail in one append-only pack file instead of one file per cam.
+
+thumbnail_pack/<generation>.pack holds the image bytes, each distinct image once (keyed by its
+SHA-1). thumbnail_pack/index.db (shared_state.ThumbnailIndex) maps cam id -> (offset, length,
+content type, capture time). server.py answers /thumbnails/{id}.jpg from the pack with
+os.sendfile and the stored content type, so a PNG thumbnail no longer costs a 404 on .jpg first.
+Listing the thumbnails is one index query instead of a directory scan.
+
+Replacing a thumbnail leaves its old bytes in the pack as dead bytes. Once dead bytes exceed
+both COMPACT_MIN_BYTES and the live bytes, the live blobs are copied into the next
+generation's pack file and the index is switched to it. Writers (scraper, refresh, compaction)
+serialize on thumbnail_pack/lock. Readers need no lock: a reader holding the old generation
+keeps reading its file until the file is closed.
+
+A new index imports the thumbnails/ files once, and the server still serves files that are not
+in the pack. The pack is not committed (.gitignore), so a deploy gets its thumbnails from the
+thumbnails/ files: run --export after scraping and commit those (scripts/add_new_cams.sh does).
+THUMB_STORE=files keeps the old thumbnails/{id}.jpg|png layout (e.g. for static hosting).
+
+Usage:
+  python3 thumb_pack.py --import     # add thumbnails/*.jpg|png to the pack (--remove deletes the files)
+  python3 thumb_pack.py --export     # write thumbnails/{id}.jpg|png from the pack (static hosting)
+  python3 thumb_pack.py --compact    # compact now
+  python3 thumb_pack.py              # print index stats
+"""
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+
+import shared_state
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+THUMBNAILS_DIR = os.path.join(SCRIPT_DIR, "thumbnails")
+PACK_DIR = os.environ.get("THUMB_PACK_DIR") or os.path.join(SCRIPT_DIR, "thumbnail_pack")
+# "pack" (default) or "files" (one thumbnails/{id}.jpg|png per cam).
+THUMB_STORE = os.environ.get("THUMB_STORE", "pack")
+# Compact once dead bytes exceed this and the live bytes.
+COMPACT_MIN_BYTES = 16 * 1024 * 1024
+EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png"}
+
+
+class ThumbnailPack:
+    def __init__(self, directory=PACK_DIR):
+        self.directory = directory
+        self.index = shared_state.ThumbnailIndex(os.path.join(directory, "index.db"))
+        self.ready = False
+        self.init_lock = threading.RLock()  # _init imports through put(), which calls _init
+        self.lock_path = os.path.join(directory, "lock")
+        self.maps = {}  # generation -> mmap of its pack file (read-only)
+        self.maps_lock = threading.Lock()
+
+    def _init(self):
+        with self.init_lock:
+            if not self.ready:
+                os.makedirs(self.directory, exist_ok=True)
+                new = not os.path.exists(self.index.path)
+                self.index.init()
+                self.ready = True
+                if new:
+                    # Fresh checkout or deploy: build the pack from the thumbnails/ files in the repo.
+                    self.import_files(THUMBNAILS_DIR)
+
+    def import_files(self, directory, remove=False):
+        """Add every {id}.jpg|png in directory (oldest first, capture time = mtime); returns the count."""
+        files = []
+        for entry in os.scandir(directory) if os.path.isdir(directory) else ():
+            base, ext = os.path.splitext(entry.name)
+            if ext.lower() in (".jpg", ".jpeg", ".png") and base.isdigit():
+                files.append((entry.stat().st_mtime, base, entry.path))
+        for mtime, cam_id, path in sorted(files):
+            with open(path, "rb") as f:
+                self.put(cam_id, "image/png" if path.endswith(".png") else "image/jpeg", f.read(), captured=mtime)
+            if remove:
+                os.remove(path)
+        return len(files)
+
+    def pack_path(self, generation):
+        return os.path.join(self.directory, "%d.pack" % generation)
+
+    def _locked(self):
+        """Context manager holding the writers' lock file."""
+        self._init()
+        return _FileLock(self.lock_path)
+
+    def put(self, cam_id, ctype, data, captured=None):
+        """Store a thumbnail for cam_id (replacing the previous one); compacts when enough bytes are dead."""
+        captured = time.time() if captured is None else captured
+        digest = hashlib.sha1(data).hexdigest()
+        with self._locked():
+            blob = self.index.blob(digest)
+            if blob is None:
+                with open(self.pack_path(self.index.generation()), "ab") as f:
+                    offset = f.tell()
+                    f.write(data)
+                blob = (offset, len(data), ctype)
+            self.index.put(cam_id, digest, blob[0], blob[1], blob[2], captured)
+            stats = self.index.stats()
+            if stats["dead_bytes"] > max(COMPACT_MIN_BYTES, stats["live_bytes"]):
+                self._compact()
+
+    def remove(self, cam_id):
+        with self._locked():
+            self.index.remove(cam_id)
+
+    def locate(self, cam_id):
+        """(pack path, offset, length, ctype, captured, digest) for serving a cam's thumbnail, or None."""
+        self._init()
+        row = self.index.lookup(cam_id)
+        if row is None:
+            return None
+        generation, digest, offset, length, ctype, captured = row
+        return (self.pack_path(generation), offset, length, ctype, captured, digest)
+
+    def get(self, cam_id):
+        """(ctype, bytes, captured) for a cam, read as an mmap slice, or None."""
+        self._init()
+        for _ in range(2):  # a compaction between index read and mmap: look up again
+            row = self.index.lookup(cam_id)
+            if row is None:
+                return None
+            generation, digest, offset, length, ctype, captured = row
+            m = self._map(generation)
+            if m is not None and offset + length <= len(m):
+                return (ctype, m[offset : offset + length], captured)
+        return None
+
+    def _map(self, generation):
+        """mmap of a generation's pack, remapped after appends. Replaced maps are not closed here:
+        another thread may still be slicing one, and it closes itself once unreferenced."""
+        with self.maps_lock:
+            m = self.maps.get(generation)
+            try:
+                if m is not None and len(m) >= os.path.getsize(self.pack_path(generation)):
+                    return m
+                with open(self.pack_path(generation), "rb") as f:
+                    m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):  # gone (compacted away) or empty
+                return None
+            self.maps = {generation: m}
+            return m
+
+    def ids(self):
+        self._init()
+        return set(self.index.captured())
+
+    def captured(self):
+        """{cam_id: capture time}."""
+        self._init()
+        return self.index.captured()
+
+    def compact(self):
+        with self._locked():
+            return self._compact()
+
+    def _compact(self):
+        """Copy live blobs into the next generation's pack; returns bytes reclaimed. Caller holds the lock."""
+        generation = self.index.generation()
+        old_path = self.pack_path(generation)
+        if not os.path.exists(old_path):
+            return 0
+        new_path = self.pack_path(generation + 1)
+        offsets = {}
+        with open(old_path, "rb") as src, open(new_path, "wb") as dst:
+            for digest, offset, length in self.index.blobs():
+                src.seek(offset)
+                offsets[digest] = dst.tell()
+                dst.write(src.read(length))
+            dst.flush()
+            os.fsync(dst.fileno())
+            reclaimed = os.fstat(src.fileno()).st_size - dst.tell()
+        self.index.swap_generation(generation + 1, offsets)
+        os.remove(old_path)
+        print("[thumb_pack] compacted generation %d -> %d, reclaimed %d bytes" % (generation, generation + 1, reclaimed))
+        return reclaimed
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.f = open(self.path, "a")
+        fcntl.flock(self.f.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
+        self.f.close()
+
+
+PACK = ThumbnailPack()
+
+
+def _file_path(cam_id):
+    for ext in ("jpg", "png"):
+        path = os.path.join(THUMBNAILS_DIR, "%s.%s" % (cam_id, ext))
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def save_thumbnail(cam_id, ctype, data):
+    """Store a cam's thumbnail in the configured store (THUMB_STORE)."""
+    if THUMB_STORE == "pack":
+        PACK.put(cam_id, ctype, data)
+        return
+    _write_file(cam_id, ctype, data)
+
+
+def _write_file(cam_id, ctype, data):
+    """Write thumbnails/{cam_id}.jpg|png and remove the file with the other extension; returns the path."""
+    ext = EXTENSIONS.get(ctype, "jpg")
+    path = os.path.join(THUMBNAILS_DIR, "%s.%s" % (cam_id, ext))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)  # readers never see a partial file
+    other = os.path.join(THUMBNAILS_DIR, "%s.%s" % (cam_id, "jpg" if ext == "png" else "png"))
+    if os.path.exists(other):
+        os.remove(other)
+    return path
+
+
+def load_thumbnail(cam_id):
+    """(ctype, bytes, version) of a cam's thumbnail, or None. version (capture time or file mtime)
+    changes with every new capture. The pack is checked first, then thumbnails/ files."""
+    if THUMB_STORE == "pack":
+        hit = PACK.get(cam_id)
+        if hit is not None:
+            return hit
+    path = _file_path(cam_id)
+    if path is None:
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+    return ("image/png" if path.endswith(".png") else "image/jpeg", data, os.path.getmtime(path))
+
+
+def thumbnail_times():
+    """{cam_id: capture time} for every thumbnail (pack index, or file mtimes with THUMB_STORE=files)."""
+    if THUMB_STORE == "pack":
+        return PACK.captured()
+    out = {}
+    if not os.path.isdir(THUMBNAILS_DIR):
+        return out
+    for entry in os.scandir(THUMBNAILS_DIR):
+        base, ext = os.path.splitext(entry.name)
+        if ext.lower() in (".jpg", ".jpeg", ".png") and base.isdigit():
+            out[base] = max(out.get(base, 0.0), entry.stat().st_mtime)
+    return out
+
+
+def main():
+    args = sys.argv[1:]
+    if "--import" in args:
+        PACK._init()
+        count = PACK.import_files(THUMBNAILS_DIR, remove="--remove" in args)
+        print("Imported %d thumbnails into %s." % (count, PACK.directory))
+    elif "--export" in args:
+        captured = PACK.captured()
+        for cam_id in captured:
+            ctype, data, when = PACK.get(cam_id)
+            os.utime(_write_file(cam_id, ctype, data), (when, when))
+        print("Exported %d thumbnails to %s." % (len(captured), THUMBNAILS_DIR))
+    elif "--compact" in args:
+        PACK.compact()
+    PACK._init()
+    print(json.dumps(PACK.index.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Staleness-driven thumbnail refresh: re-captures the thumbnails that are oldest and most viewed,
+within a rate budget, instead of re-downloading everything with thumbnail_scraper.py --all.
+
+Each cam's priority is age * (1 + log2(1 + visits)), where age is the time since its thumbnail
+was captured (thumbnail_state.json, or the file's mtime for older thumbnails) and visits come
+from cam_visits.json (or the shared STATE_DB). Cams without a thumbnail come first. Only cams
+older than --max-age are due. A failed cam waits 30 min, 1 h, 2 h ... (up to a day) before its
+next try. After FAIL_LIMIT failures in a row it drops out of list.json, so the matrix and
+carousel stop showing it, until a capture succeeds again. Files are replaced atomically.
+
+Usage:
+  python3 thumbnail_refresh.py                       # one pass: up to --limit due thumbnails
+  python3 thumbnail_refresh.py --daemon              # keep refreshing (a pass every --interval seconds)
+  python3 thumbnail_refresh.py --rate 30 --workers 4 --max-age 21600 --limit 200
+  python3 thumbnail_refresh.py --dry-run             # print the due list with priorities
+"""
+import concurrent.futures
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+import frame_quality
+import shared_state
+import thumb_pack
+import thumbnail_scraper
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMS_PATH = os.path.join(SCRIPT_DIR, "cams.json")
+CAM_VISITS_PATH = os.path.join(SCRIPT_DIR, "cam_visits.json")
+DEFAULT_MAX_AGE = 6 * 3600
+DEFAULT_RATE = 30  # captures per minute
+DEFAULT_WORKERS = 4
+DEFAULT_LIMIT = 200
+DEFAULT_INTERVAL = 300
+FAIL_BACKOFF = 1800.0
+MAX_FAIL_BACKOFF = 86400.0
+SAVE_EVERY = 20  # captures between state saves
+
+
+class RateLimiter:
+    """Spaces acquire() calls at least 60/per_minute seconds apart across threads."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def load_visits():
+    """{cam_id: visits} from the shared SQLite store (STATE_DB) if set, else cam_visits.json."""
+    db = os.environ.get("STATE_DB")
+    if db and os.path.exists(db):
+        store = shared_state.SharedCounters(db)
+        try:
+            return store.all_visits()
+        finally:
+            store.close()
+    try:
+        with open(CAM_VISITS_PATH, "r", encoding="utf-8") as f:
+            visits = json.load(f)
+        return visits if isinstance(visits, dict) else {}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def thumbnail_mtimes():
+    """{cam_id: capture time} for every thumbnail."""
+    return thumb_pack.thumbnail_times()
+
+
+def due_cams(cams, state, visits, now, max_age):
+    """[(priority, cam_id, url)] of cams due for a refresh, highest priority first."""
+    mtimes = thumbnail_mtimes()
+    due = []
+    for cam in cams:
+        cam_id = str(cam.get("id"))
+        url = cam.get("url") or cam.get("embed_url")
+        if not url or cam.get("id") is None or cam.get("duplicate_of"):
+            continue
+        entry = state.get(cam_id, {})
+        fails = entry.get("fails", 0)
+        if fails and now - entry.get("last_try", 0) < min(FAIL_BACKOFF * 2 ** (fails - 1), MAX_FAIL_BACKOFF):
+            continue
+        captured = entry.get("captured") or mtimes.get(cam_id)
+        if captured is None:
+            age = float("inf")  # no thumbnail yet
+        else:
+            age = now - captured
+            if age < max_age:
+                continue
+        priority = age * (1.0 + math.log2(1.0 + int(visits.get(cam_id, 0))))
+        due.append((priority, cam_id, url))
+    due.sort(key=lambda d: -d[0])
+    return due
+
+
+def refresh_pass(cams, state, rate, workers, limit, max_age, dry_run=False):
+    """Refresh up to limit due thumbnails; returns (attempted, succeeded)."""
+    now = time.time()
+    due = due_cams(cams, state, load_visits(), now, max_age)[:limit]
+    if dry_run:
+        for priority, cam_id, url in due:
+            print("%12s  %s  %s" % ("new" if priority == float("inf") else "%.0f" % priority, cam_id, url))
+        return (len(due), 0)
+    limiter = RateLimiter(rate)
+    lock = threading.Lock()
+    done = [0, 0]
+    captured = []
+
+    def refresh(job):
+        _, cam_id, url = job
+        limiter.acquire()
+        ok = thumbnail_scraper.capture_snippet(url, cam_id)
+        with lock:
+            thumbnail_scraper.record_capture(state, cam_id, ok)
+            done[0] += 1
+            if ok:
+                done[1] += 1
+                captured.append(cam_id)
+            if done[0] % SAVE_EVERY == 0:
+                thumbnail_scraper.save_state(state)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        list(ex.map(refresh, due))
+    frame_quality.score_cams(state, captured)
+    thumbnail_scraper.save_state(state)
+    listed = thumbnail_scraper.write_list_json(exclude=thumbnail_scraper.hidden_ids(state))
+    print("Refreshed %d/%d due thumbnails; list.json has %d cams (%d failing, %d low quality left out)." % (
+        done[1], done[0], len(listed), len(thumbnail_scraper.failing_ids(state)), len(frame_quality.low_quality_ids(state))))
+    return tuple(done)
+
+
+def main():
+    args = sys.argv[1:]
+    opts = {"rate": DEFAULT_RATE, "workers": DEFAULT_WORKERS, "limit": DEFAULT_LIMIT,
+            "max_age": DEFAULT_MAX_AGE, "interval": DEFAULT_INTERVAL}
+    daemon = "--daemon" in args
+    dry_run = "--dry-run" in args
+    i = 0
+    while i < len(args):
+        key = args[i][2:].replace("-", "_") if args[i].startswith("--") else None
+        if key in opts and i + 1 < len(args):
+            opts[key] = float(args[i + 1])
+            i += 1
+        i += 1
+
+    os.makedirs(thumbnail_scraper.THUMBNAILS_DIR, exist_ok=True)
+    while True:
+        try:
+            with open(CAMS_PATH, "r", encoding="utf-8") as f:
+                cams = json.load(f)
+        except (OSError, ValueError) as e:
+            print("Cannot read %s: %s" % (CAMS_PATH, e), file=sys.stderr)
+            sys.exit(1)
+        state = thumbnail_scraper.load_state()
+        refresh_pass(cams, state, opts["rate"], int(opts["workers"]), int(opts["limit"]), opts["max_age"], dry_run)
+        if not daemon or dry_run:
+            return
+        try:
+            time.sleep(opts["interval"])
+        except KeyboardInterrupt:
+            return
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,88 @@
 """
-UPLINK_SITE thumbnail cache: grab one frame per camera and save to thumbnails/.
-Each thumbnails/{id}.jpg is a snapshot from the stream at the cam with that id in
+UPLINK_SITE thumbnail cache: grab one frame per camera and save it to the thumbnail pack
+(thumb_pack.py; served as /thumbnails/{id}.jpg), or to thumbnails/{id}.jpg|png with THUMB_STORE=files.
+Each thumbnail is a snapshot from the stream at the cam with that id in
 cams.json. Matrix shows these; click loads that cam's stream.
 By default only scrapes cams that don't already have a thumbnail file.
 Usage: python3 thumbnail_scraper.py [--limit 500] [--delay 0.5] [--all]
   --all   scrape from the top of cams list (ignore existing thumbnails)
+Capture times and consecutive failures per cam are kept in thumbnail_state.json (see
+thumbnail_refresh.py); cams that failed FAIL_LIMIT times in a row are left out of list.json, as are
+cams whose thumbnail scores too low in frame_quality.py (black, placeholder, frozen).
 """
 import json
 import os
 import sys
 import time
-import urllib.request
+
+import frame_quality
+import http_pool
+import thumb_pack
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 THUMBNAILS_DIR = os.path.join(SCRIPT_DIR, "thumbnails")
 MAX_READ = 200 * 1024  # 200KB enough for one frame
 TIMEOUT = 8
 USER_AGENT = "Mozilla/5.0 (compatible; UPLINK_SITE/1.0)"
+# Per-cam {"captured": ts, "last_try": ts, "fails": n, "quality": score, ...}; not under thumbnails/ so it is not served.
+STATE_PATH = os.path.join(SCRIPT_DIR, "thumbnail_state.json")
+# Consecutive failed captures after which a cam drops out of list.json (until a capture succeeds again).
+FAIL_LIMIT = 3
 
 
 def existing_thumbnail_ids():
-    """Set of cam ids that already have a file in thumbnails/ (any extension)."""
-    ids = set()
-    if not os.path.isdir(THUMBNAILS_DIR):
-        return ids
-    for name in os.listdir(THUMBNAILS_DIR):
-        base, ext = os.path.splitext(name)
-        if ext.lower() in (".jpg", ".jpeg", ".png") and base.isdigit():
-            ids.add(base)
-    return ids
+    """Set of cam ids that already have a thumbnail (pack index, or thumbnails/ files)."""
+    return set(thumb_pack.thumbnail_times())
+
+
+def load_state():
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state):
+    _write_json_atomic(STATE_PATH, state)
+
+
+def record_capture(state, cam_id, ok, now=None):
+    """Update state for one capture attempt of cam_id."""
+    now = time.time() if now is None else now
+    entry = state.setdefault(str(cam_id), {})
+    entry["last_try"] = now
+    if ok:
+        entry["captured"] = now
+        entry["fails"] = 0
+    else:
+        entry["fails"] = entry.get("fails", 0) + 1
+
+
+def failing_ids(state):
+    """Cam ids whose last FAIL_LIMIT (or more) captures all failed."""
+    return {cam_id for cam_id, e in state.items() if e.get("fails", 0) >= FAIL_LIMIT}
+
+
+def hidden_ids(state):
+    """Cam ids to leave out of list.json: failing captures or a low-quality thumbnail."""
+    return failing_ids(state) | frame_quality.low_quality_ids(state)
+
+
+def _write_json_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def write_list_json(exclude=()):
+    """list.json = every cam id with a thumbnail, minus exclude (see hidden_ids). Returns the ids."""
+    exclude = set(exclude)
+    all_ids = sorted(i for i in existing_thumbnail_ids() if i not in exclude)
+    _write_json_atomic(os.path.join(THUMBNAILS_DIR, "list.json"), all_ids)
+    return all_ids
 
 
 def normalize_url(url):
@@ -49,16 +103,23 @@ def extract_one_image(body):
 
 
 def capture_snippet(cam_url, cam_id):
-    """Fetch one frame from cam_url and save to thumbnails/{cam_id}.jpg (or .png)."""
+    """Fetch one frame from cam_url and save it as cam_id's thumbnail."""
     if cam_id is None:
         return False
     url = normalize_url(cam_url)
     if not url.startswith(("http://", "https://")):
         return False
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
-        with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
-            body = resp.read(MAX_READ)
+        with http_pool.urlopen(url, headers={"User-Agent": USER_AGENT}, timeout=TIMEOUT) as resp:
+            body = b""
+            while len(body) < MAX_READ:
+                # read1: stop at the first complete JPEG instead of waiting for MAX_READ of an MJPEG stream
+                chunk = resp.read1(MAX_READ - len(body))
+                if not chunk:
+                    break
+                body += chunk
+                if body[:8] != b"\x89PNG\r\n\x1a\n" and extract_one_image(body)[0]:
+                    break
     except Exception as e:
         print(f"FAILED: Node_{cam_id} unreachable ({e})")
         return False
@@ -66,14 +127,15 @@ def capture_snippet(cam_url, cam_id):
     if not ct or not data:
         print(f"FAILED: Node_{cam_id} no image frame")
         return False
-    ext = "png" if ct == "image/png" else "jpg"
-    path = os.path.join(THUMBNAILS_DIR, f"{cam_id}.{ext}")
-    with open(path, "wb") as f:
-        f.write(data)
+    save_thumbnail(cam_id, ct, data)
     print(f"SUCCESS: Node_{cam_id} snippet captured.")
     return True
 
 
+def save_thumbnail(cam_id, ct, data):
+    thumb_pack.save_thumbnail(cam_id, ct, data)
+
+
 def main():
     os.chdir(SCRIPT_DIR)
     limit = 500
@@ -106,10 +168,7 @@ def main():
     if not cams:
         print("No cams left to scrape (all have thumbnails or list empty).")
         # Keep list.json in sync with disk
-        list_path = os.path.join(THUMBNAILS_DIR, "list.json")
-        all_ids = sorted(existing_thumbnail_ids())
-        with open(list_path, "w", encoding="utf-8") as f:
-            json.dump(all_ids, f)
+        write_list_json(exclude=hidden_ids(load_state()))
         sys.exit(0)
 
     # Prefer snapshot-style URLs so we get more successes
@@ -127,20 +186,26 @@ def main():
     print(f"Capturing snippets for {len(to_fetch)} nodes (limit={limit})...")
     ok = 0
     saved_ids = []
+    state = load_state()
     for c in to_fetch:
         cam_id = c.get("id")
         url = c.get("url") or c.get("embed_url")
-        if capture_snippet(url, cam_id):
+        captured = capture_snippet(url, cam_id)
+        if cam_id is not None:
+            record_capture(state, cam_id, captured)
+        if captured:
             ok += 1
             saved_ids.append(str(cam_id))
         time.sleep(delay)
+    frame_quality.score_cams(state, saved_ids)
+    save_state(state)
 
     # Merge with existing: list.json = all ids that have a thumbnail file (so incremental runs don't lose previous)
-    all_ids = sorted(existing_thumbnail_ids())
-    list_path = os.path.join(THUMBNAILS_DIR, "list.json")
-    with open(list_path, "w", encoding="utf-8") as f:
-        json.dump(all_ids, f)
-    print(f"Done: {ok}/{len(to_fetch)} thumbnails saved to {THUMBNAILS_DIR}/ ({len(all_ids)} total, list.json updated)")
+    all_ids = write_list_json(exclude=hidden_ids(state))
+    store = thumb_pack.PACK.directory if thumb_pack.THUMB_STORE == "pack" else THUMBNAILS_DIR
+    print(f"Done: {ok}/{len(to_fetch)} thumbnails saved to {store}/ ({len(all_ids)} total, list.json updated)")
+    if thumb_pack.THUMB_STORE == "pack":
+        print("Run `python3 thumb_pack.py --export` to write them to thumbnails/ for committing.")
 
 
 if __name__ == "__main__":
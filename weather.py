@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Current weather for cameras, fetched from Open-Meteo by server.py instead of by every browser.
+
+Coordinates: a camera's "lat"/"lon" in cams.json (written by --geocode), else a geocoding
+lookup of its location. Lookups are cached in geocode_cache.json, failures included, so
+each place is resolved once. Weather is cached per grid cell (coordinates rounded to
+WEATHER_GRID degrees) for WEATHER_TTL seconds. Concurrent requests for the same cell wait
+for one upstream fetch instead of making their own. Cells missing from a batch go to
+Open-Meteo in one request with comma-separated coordinates.
+
+WEATHER_API_URL and GEOCODE_API_URL point the module at a local stub instead of Open-Meteo.
+
+Usage:
+  python3 weather.py --geocode [--delay 0.2]   # store lat/lon for every cam in cams.json
+  python3 weather.py --cam ID                  # print the current weather for one cam
+"""
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+import http_pool
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMS_PATH = os.path.join(SCRIPT_DIR, "cams.json")
+GEOCODE_CACHE_PATH = os.path.join(SCRIPT_DIR, "geocode_cache.json")
+WEATHER_API_URL = os.environ.get("WEATHER_API_URL", "https://api.open-meteo.com/v1/forecast")
+GEOCODE_API_URL = os.environ.get("GEOCODE_API_URL", "https://geocoding-api.open-meteo.com/v1/search")
+WEATHER_TTL = float(os.environ.get("WEATHER_TTL", "900"))
+# Cell size in degrees (0.25 ~ 25 km): cameras in one cell share a fetch.
+WEATHER_GRID = 0.25
+# Failed fetches are remembered this long so a dead upstream is not hammered.
+WEATHER_ERROR_TTL = 60.0
+# Cells per upstream request (Open-Meteo accepts comma-separated coordinate lists).
+WEATHER_BATCH = 50
+TIMEOUT = 8
+USER_AGENT = "Mozilla/5.0 (compatible; UPLINK_SITE/1.0)"
+CURRENT_FIELDS = "temperature_2m,relative_humidity_2m,weather_code,wind_speed_10m"
+
+
+def grid_cell(lat, lon):
+    """Rounded (lat, lon) of the grid cell containing a point."""
+    return (round(round(lat / WEATHER_GRID) * WEATHER_GRID, 4), round(round(lon / WEATHER_GRID) * WEATHER_GRID, 4))
+
+
+def _get_json(url):
+    with http_pool.urlopen(url, headers={"User-Agent": USER_AGENT, "Accept": "application/json"}, timeout=TIMEOUT) as resp:
+        if resp.status != 200:
+            raise IOError("HTTP %d" % resp.status)
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def fetch_current(cells):
+    """{cell: current-weather dict} for a list of cells, in one Open-Meteo request."""
+    query = urllib.parse.urlencode({
+        "latitude": ",".join(str(c[0]) for c in cells),
+        "longitude": ",".join(str(c[1]) for c in cells),
+        "current": CURRENT_FIELDS,
+        "temperature_unit": "fahrenheit",
+        "wind_speed_unit": "mph",
+    })
+    data = _get_json(WEATHER_API_URL + "?" + query)
+    results = data if isinstance(data, list) else [data]
+    if len(results) != len(cells):
+        raise ValueError("expected %d locations, got %d" % (len(cells), len(results)))
+    out = {}
+    for cell, result in zip(cells, results):
+        current = result.get("current") if isinstance(result, dict) else None
+        if current:
+            out[cell] = {k: current.get(k) for k in CURRENT_FIELDS.split(",")}
+    return out
+
+
+class WeatherCache:
+    """Current weather per grid cell with a TTL; one upstream fetch per cell at a time."""
+
+    def __init__(self, ttl=WEATHER_TTL, fetch=fetch_current):
+        self.ttl = ttl
+        self.fetch = fetch
+        self.lock = threading.Lock()
+        self.entries = {}  # cell -> (expires, weather or None)
+        self.pending = {}  # cell -> Event set when its fetch finishes
+        self.fetches = 0
+
+    def get_many(self, points):
+        """{point: weather dict or None} for (lat, lon) points."""
+        cells = {p: grid_cell(*p) for p in points}
+        now = time.time()
+        mine, waits = [], []
+        with self.lock:
+            for cell in set(cells.values()):
+                entry = self.entries.get(cell)
+                if entry and entry[0] > now:
+                    continue
+                event = self.pending.get(cell)
+                if event is None:
+                    self.pending[cell] = threading.Event()
+                    mine.append(cell)
+                else:
+                    waits.append(event)
+        for start in range(0, len(mine), WEATHER_BATCH):
+            self._fetch(mine[start : start + WEATHER_BATCH])
+        for event in waits:
+            event.wait(TIMEOUT * 2)
+        with self.lock:
+            return {p: (self.entries.get(c) or (0, None))[1] for p, c in cells.items()}
+
+    def get(self, lat, lon):
+        return self.get_many([(lat, lon)])[(lat, lon)]
+
+    def _fetch(self, cells):
+        try:
+            self.fetches += 1
+            result = self.fetch(cells)
+            error = None
+        except Exception as e:
+            result, error = {}, e
+        now = time.time()
+        with self.lock:
+            for cell in cells:
+                weather = result.get(cell)
+                self.entries[cell] = (now + (self.ttl if weather else WEATHER_ERROR_TTL), weather)
+                self.pending.pop(cell).set()
+            if len(self.entries) > 10000:
+                for cell in [c for c, e in self.entries.items() if e[0] <= now]:
+                    del self.entries[cell]
+        if error is not None:
+            print("[weather] fetch of %d cells failed: %s" % (len(cells), error))
+
+
+class Geocoder:
+    """Location string -> (lat, lon) through Open-Meteo geocoding, cached (failures too) in a JSON file."""
+
+    def __init__(self, path=GEOCODE_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.cache = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.cache = {}
+
+    def lookup(self, location, country=""):
+        key = "%s|%s" % (location, country)
+        with self.lock:
+            if key in self.cache:
+                hit = self.cache[key]
+                return tuple(hit) if hit else None
+            event = self.pending.get(key)
+            if event is None:
+                self.pending[key] = threading.Event()
+        if event is not None:
+            event.wait(TIMEOUT * 2)
+            hit = self.cache.get(key)
+            return tuple(hit) if hit else None
+        coords = None
+        try:
+            coords = self._search(location, country)
+            failed = False
+        except Exception as e:
+            print("[weather] geocoding %r failed: %s" % (location, e))
+            failed = True  # transient: not cached
+        with self.lock:
+            if not failed:
+                self.cache[key] = list(coords) if coords else None
+                self._save()
+            self.pending.pop(key).set()
+        return coords
+
+    def _search(self, location, country):
+        """First result for the city part of "City, Region, Country", preferring the camera's country."""
+        name = location.split(",")[0].strip()
+        if not name or name == "Unknown":
+            return None
+        data = _get_json(GEOCODE_API_URL + "?" + urllib.parse.urlencode({"name": name, "count": 10}))
+        results = data.get("results") or []
+        for r in results:
+            if country and r.get("country_code") == country:
+                return (r["latitude"], r["longitude"])
+        return (results[0]["latitude"], results[0]["longitude"]) if results else None
+
+    def _save(self):
+        tmp = self.path + ".tmp.%d" % os.getpid()
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print("[weather] cannot save %s: %s" % (self.path, e))
+
+
+def cam_coordinates(cam, geocoder):
+    """(lat, lon) of a catalog cam (dict with location, and country/lat/lon when known), or None."""
+    if cam.get("lat") is not None and cam.get("lon") is not None:
+        return (float(cam["lat"]), float(cam["lon"]))
+    location = cam.get("location_short") or cam.get("location") or ""
+    return geocoder.lookup(location, cam.get("country") or "")
+
+
+def main():
+    import cam_catalog
+
+    args = sys.argv[1:]
+    delay = 0.2
+    for i, arg in enumerate(args):
+        if arg == "--delay" and i + 1 < len(args):
+            delay = float(args[i + 1])
+    with open(CAMS_PATH, "r", encoding="utf-8") as f:
+        cams = json.load(f)
+    geocoder = Geocoder()
+
+    if "--cam" in args:
+        cam_id = args[args.index("--cam") + 1]
+        cam = next((c for c in cams if str(c.get("id")) == cam_id), None)
+        if cam is None:
+            print("No cam %s in cams.json." % cam_id, file=sys.stderr)
+            sys.exit(1)
+        coords = cam_coordinates(dict(cam, country=cam_catalog.country_of(cam.get("location"))), geocoder)
+        print(json.dumps({"coords": coords, "weather": WeatherCache().get(*coords) if coords else None}))
+        return
+
+    if "--geocode" in args:
+        done = missing = 0
+        for cam in cams:
+            if cam.get("lat") is not None:
+                continue
+            location = cam_catalog.short_location(cam.get("location"))
+            key = "%s|%s" % (location, cam_catalog.country_of(cam.get("location")))
+            cached = key in geocoder.cache
+            coords = geocoder.lookup(location, cam_catalog.country_of(cam.get("location")))
+            if coords:
+                cam["lat"], cam["lon"] = round(coords[0], 4), round(coords[1], 4)
+                done += 1
+            else:
+                missing += 1
+            if not cached:
+                time.sleep(delay)
+        tmp = CAMS_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cams, f, indent=4, ensure_ascii=False)
+        os.replace(tmp, CAMS_PATH)
+        print("Stored coordinates for %d cams (%d could not be geocoded)." % (done, missing))
+        return
+    print(__doc__.strip())
+
+
+if __name__ == "__main__":
+    main()